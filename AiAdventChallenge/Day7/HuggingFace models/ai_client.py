@@ -1,30 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import copy
+import functools
+import hashlib
 import json
 import logging
-from openai import OpenAI
-
-try:
-    import anthropic
-except ImportError:  # pragma: no cover - optional dependency
-    anthropic = None
-
-try:
-    from huggingface_hub import InferenceClient
-except ImportError:  # pragma: no cover - optional dependency
-    InferenceClient = None
-
-from config import (
-    CLAUDE_API_KEY,
-    CLAUDE_MODEL,
-    DEEPSEEK_API_KEY,
-    HF_MODEL_ID,
-    HF_MODEL_MAGNUM_ID,
-    HF_MODEL_TLAMA_ID,
-    HF_TOKEN,
-    YANDEX_CLOUD_API_KEY,
-    YANDEX_PROJECT_ID,
-    YANDEX_PROMPT_ID,
-    YANDEX_MODEL_ID,
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from config import settings
+from batch import BatchItem, arun_batch, batch_stats, run_batch, total_usage
+from cassette import Cassette, CassetteMiss
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from deadline import DeadlineExceeded, check_deadline, deadline_expired, hop_timeout
+from fake_provider import FAKE_MODEL, FakeBackend, fake_client, parse_faults
+from hedging import Hedger, parse_backup_providers
+from http_transport import (
+    configure_transport,
+    LoopLocal,
+    get_async_http_client,
+    get_http_client,
+    install_huggingface_transport,
+    transport_stats,
 )
+from raw_log import capture as capture_raw_result, configure_raw_log, raw_log_stats
+from rate_limiter import ProviderRateLimiter, RateLimitExceeded, parse_rate_limits
+from response_cache import ResponseCache, canonical_key
+from retry import RetryBudget, RetryPolicy, is_retryable, parse_attempts, status_code
+from single_flight import SingleFlight
+from speculation import speculation_stats
+from tier_cache import TierCapabilityCache
+from token_estimator import TokenEstimator
+
+if TYPE_CHECKING:
+    import anthropic
+    from huggingface_hub import AsyncInferenceClient, InferenceClient
+    from openai import AsyncOpenAI, OpenAI
 
 DEFAULT_PROVIDER = "deepseek"
 AVAILABLE_PROVIDERS = (
@@ -34,33 +50,329 @@ AVAILABLE_PROVIDERS = (
     "huggingface",
     "huggingface-magnum",
     "huggingface-tinyllama",
+    "fake",
 )
 DEEPSEEK_MODEL = "deepseek-chat"
-TINYLLAMA_MODEL_ID = HF_MODEL_TLAMA_ID
 
-readonly_client = OpenAI(
-    api_key=DEEPSEEK_API_KEY,
-    base_url="https://api.deepseek.com",
-)
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+YANDEX_BASE_URL = "https://rest-assistant.api.cloud.yandex.net/v1"
+HF_ROUTER_BASE_URL = "https://router.huggingface.co/v1"
+
 _log = logging.getLogger(__name__)
 
-_claude_client: "anthropic.Anthropic | None" = None
+_client_lock = threading.Lock()
+_transport_lock = threading.Lock()
+_transport_configured = False
+_hf_transport_installed = False
+_deepseek_client: OpenAI | None = None
+_claude_client: anthropic.Anthropic | None = None
 _yandex_client: OpenAI | None = None
 _hf_client: OpenAI | None = None
-_hf_inference_client: "InferenceClient | None" = None
-_hf_inference_featherless_client: "InferenceClient | None" = None
+_hf_inference_client: InferenceClient | None = None
+_hf_inference_featherless_client: InferenceClient | None = None
 
-def _log_raw_result(provider: str, model: str | None, result: object) -> None:
-    model_label = model or "-"
+# Async SDK clients sit on the loop-bound async HTTP client, so they are per loop too.
+_async_deepseek_clients: LoopLocal[AsyncOpenAI] = LoopLocal()
+_async_claude_clients: LoopLocal[anthropic.AsyncAnthropic] = LoopLocal()
+_async_yandex_clients: LoopLocal[AsyncOpenAI] = LoopLocal()
+_async_hf_clients: LoopLocal[AsyncOpenAI] = LoopLocal()
+_async_hf_inference_clients: LoopLocal[dict[str, AsyncInferenceClient]] = LoopLocal()
+
+_FLIGHTS = SingleFlight()
+
+_response_chain: contextvars.ContextVar[dict | None] = contextvars.ContextVar(
+    "response_chain", default=None
+)
+_generation_limits: contextvars.ContextVar[tuple[int | None, tuple[str, ...]]] = (
+    contextvars.ContextVar("generation_limits", default=(None, ()))
+)
+_chain_lock = threading.Lock()
+_chain_counters = {"continued": 0, "full": 0, "resent": 0}
+_MAX_CHAINED_THREADS = 8
+
+
+def __getattr__(name: str):
+    # Old module-level names, now built on first use.
+    if name == "readonly_client":
+        return _get_deepseek_client()
+    if name == "TINYLLAMA_MODEL_ID":
+        return settings.HF_MODEL_TLAMA_ID
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _once(factory):
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    return get
+
+
+@_once
+def _tier_cache() -> TierCapabilityCache:
+    return TierCapabilityCache(ttl_seconds=settings.HF_TIER_CACHE_TTL_SECONDS)
+
+
+@_once
+def _token_estimator() -> TokenEstimator:
+    return TokenEstimator()
+
+
+@_once
+def _response_cache() -> ResponseCache:
+    return ResponseCache(
+        max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+        disk_path=settings.RESPONSE_CACHE_PATH,
+    )
+
+
+@_once
+def _hedger() -> Hedger:
+    return Hedger(
+        percentile=settings.HEDGE_PERCENTILE,
+        min_samples=settings.HEDGE_MIN_SAMPLES,
+        backups=parse_backup_providers(settings.HEDGE_BACKUP_PROVIDERS),
+    )
+
+
+@_once
+def _retry_policy() -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=settings.RETRY_MAX_ATTEMPTS,
+        base_delay=settings.RETRY_BASE_DELAY_SECONDS,
+        max_delay=settings.RETRY_MAX_DELAY_SECONDS,
+        budget=RetryBudget(ratio=settings.RETRY_BUDGET_RATIO),
+        provider_attempts=parse_attempts(settings.RETRY_PROVIDER_ATTEMPTS),
+    )
+
+
+@_once
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        window=settings.CIRCUIT_BREAKER_WINDOW,
+        min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+        error_rate=settings.CIRCUIT_BREAKER_ERROR_RATE,
+        slow_call_seconds=settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS,
+        open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+    )
+
+
+@_once
+def _rate_limiter() -> ProviderRateLimiter:
+    return ProviderRateLimiter(
+        parse_rate_limits(settings.RATE_LIMITS),
+        max_wait_seconds=settings.RATE_LIMIT_MAX_WAIT_SECONDS,
+    )
+
+
+@_once
+def _cassette() -> Cassette | None:
+    if not settings.CASSETTE_MODE:
+        return None
+    return Cassette(
+        settings.CASSETTE_PATH,
+        settings.CASSETTE_MODE,
+        latency_scale=settings.CASSETTE_LATENCY_SCALE,
+    )
+
+
+@_once
+def _fake_backend() -> FakeBackend:
+    return FakeBackend(
+        latency=settings.FAKE_LATENCY,
+        tokens_per_second=settings.FAKE_TOKENS_PER_SECOND,
+        completion_tokens=settings.FAKE_COMPLETION_TOKENS,
+        faults=parse_faults(settings.FAKE_ERRORS),
+        seed=settings.FAKE_SEED,
+        reply=settings.FAKE_REPLY,
+    )
+
+
+@_once
+def _faked_providers() -> frozenset[str]:
+    raw = settings.FAKE_PROVIDERS or ""
+    return frozenset(name.strip() for name in raw.split(",") if name.strip())
+
+
+def _fakeable(group: str, kind: str, is_async: bool = False):
+    # FAKE_PROVIDERS swaps the SDK client for a local stand-in, so adapters,
+    # HF tier chains, retries and breakers above it run unchanged.
+    def decorate(getter):
+        fakes: dict[str, object] = {}
+
+        @functools.wraps(getter)
+        def get(*args):
+            faked = _faked_providers()
+            if group not in faked and "*" not in faked:
+                return getter(*args)
+            key = args[0] if args else "auto"
+            client = fakes.get(key)
+            if client is None:
+                with _client_lock:
+                    client = fakes.get(key)
+                    if client is None:
+                        client = fake_client(_fake_backend(), kind, group, is_async, key)
+                        fakes[key] = client
+            return client
+
+        return get
+
+    return decorate
+
+
+def _configure_transport() -> None:
+    global _transport_configured
+    if _transport_configured:
+        return
+    with _transport_lock:
+        if not _transport_configured:
+            configure_transport(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                http2=settings.HTTP2_ENABLED,
+            )
+            _transport_configured = True
+
+
+def _http_client():
+    _configure_transport()
+    return get_http_client()
+
+
+def _async_http_client():
+    _configure_transport()
+    return get_async_http_client()
+
+
+def _install_hf_transport() -> None:
+    global _hf_transport_installed
+    if _hf_transport_installed:
+        return
+    _configure_transport()
+    with _transport_lock:
+        if not _hf_transport_installed:
+            install_huggingface_transport()
+            _hf_transport_installed = True
+
+
+def _inference_classes():
     try:
-        _log.info("%s/%s raw result: %r", provider, model_label, result)
-    except Exception:
-        _log.info("%s/%s raw result: <unprintable>", provider, model_label)
+        from huggingface_hub import AsyncInferenceClient, InferenceClient
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise RuntimeError(
+            "Hugging Face InferenceClient requires huggingface_hub. "
+            "Install it with: pip install huggingface_hub"
+        ) from exc
+    _install_hf_transport()
+    return InferenceClient, AsyncInferenceClient
+
+
+@contextmanager
+def generation_limits(max_tokens: int | None = None, stop: list[str] | tuple[str, ...] = ()):
+    # Caps the output of every call made inside the block, whatever the provider.
+    token = _generation_limits.set((max_tokens, tuple(stop)))
+    try:
+        yield
+    finally:
+        try:
+            _generation_limits.reset(token)
+        except ValueError:
+            # Same as deadline_scope: a generator closed from another task cannot
+            # reset its token, and that task's context is discarded anyway.
+            pass
+
+
+def _limit_kwargs(
+    default_max: int | None = None,
+    max_key: str = "max_tokens",
+    stop_key: str | None = "stop",
+) -> dict:
+    max_tokens, stop = _generation_limits.get()
+    # Built-in caps reflect model limits, so a profile can only lower them.
+    if max_tokens and default_max:
+        max_tokens = min(max_tokens, default_max)
+    kwargs = {}
+    if max_tokens or default_max:
+        kwargs[max_key] = max_tokens or default_max
+    if stop and stop_key:
+        kwargs[stop_key] = list(stop)
+    return kwargs
+
+
+def _limit_params() -> dict:
+    max_tokens, stop = _generation_limits.get()
+    return {"max_tokens": max_tokens, "stop": list(stop) or None}
+
+
+async def _limited_stream(
+    stream: AsyncIterator[tuple[str, dict[str, int] | None]],
+    limits: tuple[int | None, tuple[str, ...]],
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    # Applies the limits to each step of `stream` only, so they are never held
+    # across a yield to the caller.
+    try:
+        while True:
+            with generation_limits(*limits):
+                try:
+                    item = await anext(stream)
+                except StopAsyncIteration:
+                    return
+            yield item
+    finally:
+        await stream.aclose()
+
+
+def _timeout_kwargs() -> dict:
+    timeout = hop_timeout(label="provider call")
+    return {} if timeout is None else {"timeout": timeout}
+
+
+def _with_timeout(client):
+    # InferenceClient only takes a timeout in its constructor, so a shallow copy
+    # carries the remaining budget for one hop without touching the shared client.
+    timeout = hop_timeout(label="provider call")
+    if timeout is None:
+        return client
+    scoped = copy.copy(client)
+    scoped.timeout = timeout
+    return scoped
+
+
+def _raise_if_deadline(exc: Exception, label: str) -> None:
+    if isinstance(exc, DeadlineExceeded):
+        raise exc
+    if deadline_expired():
+        raise DeadlineExceeded(f"Deadline exceeded during {label}") from exc
+
+
+@_once
+def _raw_log_configured() -> bool:
+    configure_raw_log(
+        sample_rate=settings.RAW_LOG_SAMPLE_RATE,
+        max_chars=settings.RAW_LOG_MAX_CHARS,
+        path=settings.RAW_LOG_PATH,
+    )
+    return True
+
+
+def _log_raw_result(provider: str, model: str | None, result: object) -> None:
+    _raw_log_configured()
+    capture_raw_result(provider, model, result)
 
 def _normalize_usage(
     prompt_tokens: int | None,
     completion_tokens: int | None,
     total_tokens: int | None,
+    cached_tokens: int | None = None,
 ) -> dict[str, int]:
     prompt = int(prompt_tokens) if isinstance(prompt_tokens, (int, float)) else 0
     completion = (
@@ -69,32 +381,67 @@ def _normalize_usage(
     total = int(total_tokens) if isinstance(total_tokens, (int, float)) else prompt + completion
     if total == 0 and (prompt or completion):
         total = prompt + completion
+    cached = int(cached_tokens) if isinstance(cached_tokens, (int, float)) else 0
+    cached = min(max(cached, 0), max(prompt, 0))
     return {
         "prompt_tokens": max(prompt, 0),
         "completion_tokens": max(completion, 0),
         "total_tokens": max(total, 0),
+        "cached_prompt_tokens": cached,
+        "uncached_prompt_tokens": max(prompt, 0) - cached,
     }
 
 
+def _usage_field(usage: object, *keys: str) -> int | None:
+    for key in keys:
+        if isinstance(usage, dict):
+            if key in usage:
+                return usage.get(key)
+        else:
+            value = getattr(usage, key, None)
+            if value is not None:
+                return value
+    return None
+
+
 def _extract_usage_tokens(usage: object) -> tuple[int | None, int | None, int | None]:
     if usage is None:
         return None, None, None
+    prompt = _usage_field(usage, "prompt_tokens", "input_tokens")
+    completion = _usage_field(usage, "completion_tokens", "output_tokens")
+    total = _usage_field(usage, "total_tokens", "total")
+    return prompt, completion, total
 
-    def _get(*keys: str) -> int | None:
-        for key in keys:
-            if isinstance(usage, dict):
-                if key in usage:
-                    return usage.get(key)
-            else:
-                value = getattr(usage, key, None)
-                if value is not None:
-                    return value
-        return None
 
-    prompt = _get("prompt_tokens", "input_tokens")
-    completion = _get("completion_tokens", "output_tokens")
-    total = _get("total_tokens", "total")
-    return prompt, completion, total
+def _extract_cached_tokens(usage: object) -> tuple[int | None, int]:
+    # Returns the prompt tokens served from the provider's prefix cache, and the
+    # cache tokens the provider left out of its own prompt count.
+    if usage is None:
+        return None, 0
+    # Anthropic: input_tokens excludes both cache reads and cache writes.
+    read = _usage_field(usage, "cache_read_input_tokens")
+    written = _usage_field(usage, "cache_creation_input_tokens")
+    if read is not None or written is not None:
+        read, written = read or 0, written or 0
+        return read, read + written
+    # DeepSeek reports hits next to prompt_tokens, which already includes them.
+    hit = _usage_field(usage, "prompt_cache_hit_tokens")
+    if hit is not None:
+        return hit, 0
+    details = _usage_field(usage, "prompt_tokens_details", "input_tokens_details")
+    if details is not None:
+        return _usage_field(details, "cached_tokens"), 0
+    return None, 0
+
+
+def _usage_from(usage: object) -> dict[str, int]:
+    prompt, completion, total = _extract_usage_tokens(usage)
+    cached, uncounted = _extract_cached_tokens(usage)
+    if uncounted:
+        prompt = (prompt or 0) + uncounted
+        total = None
+    return _normalize_usage(prompt, completion, total, cached)
+
 
 def _extract_text_generation_result(
     result: object,
@@ -148,14 +495,21 @@ def _plain_text_from_messages(messages: list[dict[str, str]]) -> str:
     return "\n".join(parts).strip()
 
 
+@_fakeable("yandex", "openai")
 def _get_yandex_client() -> OpenAI:
     global _yandex_client
     if _yandex_client is None:
-        _yandex_client = OpenAI(
-            api_key=YANDEX_CLOUD_API_KEY,
-            base_url="https://rest-assistant.api.cloud.yandex.net/v1",
-            project=YANDEX_PROJECT_ID,
-        )
+        with _client_lock:
+            if _yandex_client is None:
+                from openai import OpenAI
+
+                _yandex_client = OpenAI(
+                    api_key=settings.YANDEX_CLOUD_API_KEY,
+                    base_url=YANDEX_BASE_URL,
+                    project=settings.YANDEX_PROJECT_ID,
+                    http_client=_http_client(),
+                    max_retries=0,
+                )
     return _yandex_client
 
 
@@ -235,13 +589,35 @@ def _response_debug_snapshot(response: object) -> dict:
     }
 
 
-def _yandex_completion(
+@_fakeable("yandex", "openai", is_async=True)
+def _get_async_yandex_client() -> AsyncOpenAI:
+    def _create() -> AsyncOpenAI:
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            api_key=settings.YANDEX_CLOUD_API_KEY,
+            base_url=YANDEX_BASE_URL,
+            project=settings.YANDEX_PROJECT_ID,
+            http_client=_async_http_client(),
+            max_retries=0,
+        )
+
+    return _async_yandex_clients.get(_create)
+
+
+def _yandex_model_label() -> str | None:
+    if settings.YANDEX_MODEL_ID:
+        return settings.YANDEX_MODEL_ID
+    return f"prompt:{settings.YANDEX_PROMPT_ID}" if settings.YANDEX_PROMPT_ID else None
+
+
+def _yandex_payload(
     messages: list[dict[str, str]],
     temperature: float,
-) -> tuple[str, dict[str, int]]:
-    if not YANDEX_CLOUD_API_KEY or not YANDEX_PROJECT_ID:
+) -> dict:
+    if not settings.YANDEX_CLOUD_API_KEY or not settings.YANDEX_PROJECT_ID:
         raise RuntimeError("YANDEX_CLOUD_API_KEY/YANDEX_PROJECT_ID is not configured")
-    if not (YANDEX_PROMPT_ID or YANDEX_MODEL_ID):
+    if not (settings.YANDEX_PROMPT_ID or settings.YANDEX_MODEL_ID):
         raise RuntimeError("YANDEX_PROMPT_ID or YANDEX_MODEL_ID is not configured")
 
     input_text = _plain_text_from_messages(messages)
@@ -251,73 +627,250 @@ def _yandex_completion(
     payload = {
         "input": input_text,
         "temperature": temperature,
+        **_limit_kwargs(max_key="max_output_tokens", stop_key=None),
     }
-    if YANDEX_PROMPT_ID:
-        payload["prompt"] = {"id": YANDEX_PROMPT_ID}
-    if YANDEX_MODEL_ID:
-        payload["model"] = YANDEX_MODEL_ID
+    if settings.YANDEX_PROMPT_ID:
+        payload["prompt"] = {"id": settings.YANDEX_PROMPT_ID}
+    if settings.YANDEX_MODEL_ID:
+        payload["model"] = settings.YANDEX_MODEL_ID
+    return payload
 
-    client = _get_yandex_client()
-    response = client.responses.create(**payload)
-    model_label = YANDEX_MODEL_ID or (f"prompt:{YANDEX_PROMPT_ID}" if YANDEX_PROMPT_ID else None)
-    _log_raw_result("yandex", model_label, response)
+
+def chains_responses(provider: str) -> bool:
+    return provider == "yandex" and settings.YANDEX_RESPONSE_CHAIN
+
+
+@contextmanager
+def response_chain(state: dict | None):
+    # `state` lives in the caller's session; it maps each conversation (keyed by
+    # its system prompt) to the last Yandex response id and what it already holds.
+    token = _response_chain.set(state)
+    try:
+        yield
+    finally:
+        _response_chain.reset(token)
+
+
+def _message_fingerprints(messages: list[dict[str, str]]) -> list[str]:
+    fingerprints = []
+    for message in messages:
+        role = message.get("role", "user")
+        if role == "assistant":
+            # The server keeps its own reply; ours may be a cleaned-up copy of it.
+            fingerprints.append(role)
+            continue
+        content = message.get("content", "")
+        text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+        fingerprints.append(hashlib.sha1(f"{role}:{text}".encode("utf-8")).hexdigest()[:16])
+    return fingerprints
+
+
+def _yandex_request(
+    messages: list[dict[str, str]],
+    temperature: float,
+    chained: bool = True,
+) -> tuple[dict, Callable[[object], None]]:
+    state = _response_chain.get() if chained else None
+    if state is None or not settings.YANDEX_RESPONSE_CHAIN or not messages:
+        return _yandex_payload(messages, temperature), lambda response: None
+
+    fingerprints = _message_fingerprints(messages)
+    thread = state.get(fingerprints[0]) or {}
+    sent = thread.get("sent") or []
+    if thread.get("id") and len(sent) < len(fingerprints) and fingerprints[: len(sent)] == sent:
+        payload = _yandex_payload(messages[len(sent):], temperature)
+        payload["previous_response_id"] = thread["id"]
+        _count_chain("continued")
+    else:
+        payload = _yandex_payload(messages, temperature)
+        _count_chain("full")
+
+    def _commit(response: object) -> None:
+        response_id = getattr(response, "id", None)
+        state.pop(fingerprints[0], None)
+        if response_id:
+            state[fingerprints[0]] = {"id": response_id, "sent": fingerprints + ["assistant"]}
+        while len(state) > _MAX_CHAINED_THREADS:
+            state.pop(next(iter(state)))
+
+    return payload, _commit
+
+
+def _stale_chain(payload: dict, exc: Exception) -> bool:
+    # An expired or unknown previous response; the turn is resent in full.
+    if "previous_response_id" not in payload or status_code(exc) not in (400, 404):
+        return False
+    _log.info("Yandex previous response is gone (%s), resending the conversation", exc)
+    _count_chain("resent")
+    return True
+
+
+def _count_chain(name: str) -> None:
+    with _chain_lock:
+        _chain_counters[name] += 1
+
+
+def _yandex_result(response: object) -> tuple[str, dict[str, int]]:
+    _log_raw_result("yandex", _yandex_model_label(), response)
     text = _extract_yandex_response_text(response)
-    prompt, completion, total = _extract_usage_tokens(getattr(response, "usage", None))
-    return text, _normalize_usage(prompt, completion, total)
+    return text, _usage_from(getattr(response, "usage", None))
+
+
+def _yandex_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    payload, commit = _yandex_request(messages, temperature)
+    client = _get_yandex_client()
+    try:
+        response = client.responses.create(**payload, **_timeout_kwargs())
+    except Exception as exc:
+        if not _stale_chain(payload, exc):
+            raise
+        payload, _ = _yandex_request(messages, temperature, chained=False)
+        response = client.responses.create(**payload, **_timeout_kwargs())
+    commit(response)
+    return _yandex_result(response)
+
+
+async def _ayandex_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    payload, commit = _yandex_request(messages, temperature)
+    client = _get_async_yandex_client()
+    try:
+        response = await client.responses.create(**payload, **_timeout_kwargs())
+    except Exception as exc:
+        if not _stale_chain(payload, exc):
+            raise
+        payload, _ = _yandex_request(messages, temperature, chained=False)
+        response = await client.responses.create(**payload, **_timeout_kwargs())
+    commit(response)
+    return _yandex_result(response)
 
 
-def _get_claude_client() -> "anthropic.Anthropic":
-    if anthropic is None:
+def _require_anthropic():
+    try:
+        import anthropic
+    except ImportError as exc:  # pragma: no cover - optional dependency
         raise RuntimeError(
             "Claude client requires the anthropic package. "
             "Install it with: pip install anthropic"
-        )
+        ) from exc
+    return anthropic
+
+
+@_fakeable("claude", "anthropic")
+def _get_claude_client() -> anthropic.Anthropic:
     global _claude_client
     if _claude_client is None:
-        _claude_client = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+        with _client_lock:
+            if _claude_client is None:
+                sdk = _require_anthropic()
+                _claude_client = sdk.Anthropic(
+                    api_key=settings.CLAUDE_API_KEY,
+                    http_client=_http_client(),
+                    max_retries=0,
+                )
     return _claude_client
 
 
+@_fakeable("claude", "anthropic", is_async=True)
+def _get_async_claude_client() -> anthropic.AsyncAnthropic:
+    def _create() -> anthropic.AsyncAnthropic:
+        return _require_anthropic().AsyncAnthropic(
+            api_key=settings.CLAUDE_API_KEY,
+            http_client=_async_http_client(),
+            max_retries=0,
+        )
+
+    return _async_claude_clients.get(_create)
+
+
+@_fakeable("huggingface", "openai")
 def _get_hf_client() -> OpenAI:
     global _hf_client
     if _hf_client is None:
-        _hf_client = OpenAI(
-            api_key=HF_TOKEN,
-            base_url="https://router.huggingface.co/v1",
-        )
+        with _client_lock:
+            if _hf_client is None:
+                from openai import OpenAI
+
+                _hf_client = OpenAI(
+                    api_key=settings.HF_TOKEN,
+                    base_url=HF_ROUTER_BASE_URL,
+                    http_client=_http_client(),
+                    max_retries=0,
+                )
     return _hf_client
 
 
-def _get_hf_inference_client() -> "InferenceClient":
-    if InferenceClient is None:
-        raise RuntimeError(
-            "Hugging Face InferenceClient requires huggingface_hub. "
-            "Install it with: pip install huggingface_hub"
+@_fakeable("huggingface", "openai", is_async=True)
+def _get_async_hf_client() -> AsyncOpenAI:
+    def _create() -> AsyncOpenAI:
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            api_key=settings.HF_TOKEN,
+            base_url=HF_ROUTER_BASE_URL,
+            http_client=_async_http_client(),
+            max_retries=0,
         )
+
+    return _async_hf_clients.get(_create)
+
+
+@_fakeable("huggingface", "inference")
+def _get_hf_inference_client() -> InferenceClient:
     global _hf_inference_client
     if _hf_inference_client is None:
-        _hf_inference_client = InferenceClient(
-            provider="auto",
-            api_key=HF_TOKEN,
-        )
+        with _client_lock:
+            if _hf_inference_client is None:
+                InferenceClient, _ = _inference_classes()
+                _hf_inference_client = InferenceClient(
+                    provider="auto",
+                    api_key=settings.HF_TOKEN,
+                )
     return _hf_inference_client
 
 
-def _get_hf_inference_featherless_client() -> "InferenceClient":
-    if InferenceClient is None:
-        raise RuntimeError(
-            "Hugging Face InferenceClient requires huggingface_hub. "
-            "Install it with: pip install huggingface_hub"
-        )
+@_fakeable("huggingface", "inference")
+def _get_hf_inference_featherless_client() -> InferenceClient:
     global _hf_inference_featherless_client
     if _hf_inference_featherless_client is None:
-        _hf_inference_featherless_client = InferenceClient(
-            provider="featherless-ai",
-            api_key=HF_TOKEN,
-        )
+        with _client_lock:
+            if _hf_inference_featherless_client is None:
+                InferenceClient, _ = _inference_classes()
+                _hf_inference_featherless_client = InferenceClient(
+                    provider="featherless-ai",
+                    api_key=settings.HF_TOKEN,
+                )
     return _hf_inference_featherless_client
 
 
+@_fakeable("huggingface", "inference", is_async=True)
+def _get_async_hf_inference_client(provider: str = "auto") -> AsyncInferenceClient:
+    # Each client opens its own HTTP session on first use, bound to the running loop.
+    clients = _async_hf_inference_clients.get(dict)
+    client = clients.get(provider)
+    if client is None:
+        _, AsyncInferenceClient = _inference_classes()
+        client = clients.setdefault(
+            provider, AsyncInferenceClient(provider=provider, api_key=settings.HF_TOKEN)
+        )
+    return client
+
+
+async def _ahf_inference_client(provider: str = "auto") -> AsyncInferenceClient:
+    client = _get_async_hf_inference_client(provider)
+    open_session = getattr(client, "_get_async_client", None)
+    if open_session is not None:
+        # Opened on the shared client first, so the per-hop copies from
+        # _with_timeout reuse its session instead of each opening another one.
+        await open_session()
+    return _with_timeout(client)
+
+
 def _claude_messages(
     messages: list[dict[str, str]],
 ) -> tuple[list[dict[str, str]], str | None]:
@@ -341,11 +894,11 @@ def _claude_messages(
     return conversation, system_text
 
 
-def _claude_completion(
+def _claude_payload(
     messages: list[dict[str, str]],
     temperature: float,
-) -> tuple[str, dict[str, int]]:
-    if not CLAUDE_API_KEY:
+) -> dict:
+    if not settings.CLAUDE_API_KEY:
         raise RuntimeError("CLAUDE_API_KEY is not configured")
 
     conversation, system_text = _claude_messages(messages)
@@ -353,17 +906,23 @@ def _claude_completion(
         raise RuntimeError("No content to send to Claude")
 
     payload = {
-        "model": CLAUDE_MODEL,
+        "model": settings.CLAUDE_MODEL,
         "messages": conversation,
         "temperature": temperature,
-        "max_tokens": 2048,
+        **_limit_kwargs(2048, stop_key="stop_sequences"),
     }
-    if system_text:
+    if system_text and settings.CLAUDE_PROMPT_CACHE:
+        # The system prompts are static, so they are the cacheable prefix of every request.
+        payload["system"] = [
+            {"type": "text", "text": system_text, "cache_control": {"type": "ephemeral"}}
+        ]
+    elif system_text:
         payload["system"] = system_text
+    return payload
 
-    client = _get_claude_client()
-    response = client.messages.create(**payload)
-    _log_raw_result("claude", CLAUDE_MODEL, response)
+
+def _claude_result(response: object) -> tuple[str, dict[str, int]]:
+    _log_raw_result("claude", settings.CLAUDE_MODEL, response)
 
     texts: list[str] = []
     for block in response.content:
@@ -375,260 +934,1251 @@ def _claude_completion(
             texts.append(block.get("text", ""))
 
     text = "".join(texts).strip()
-    prompt, completion, total = _extract_usage_tokens(getattr(response, "usage", None))
-    return text, _normalize_usage(prompt, completion, total)
+    return text, _usage_from(getattr(response, "usage", None))
 
-def _huggingface_completion(
+
+def _claude_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    payload = _claude_payload(messages, temperature)
+    client = _get_claude_client()
+    response = client.messages.create(**payload, **_timeout_kwargs())
+    return _claude_result(response)
+
+
+async def _aclaude_completion(
     messages: list[dict[str, str]],
     temperature: float,
 ) -> tuple[str, dict[str, int]]:
-    if not HF_TOKEN:
+    payload = _claude_payload(messages, temperature)
+    client = _get_async_claude_client()
+    response = await client.messages.create(**payload, **_timeout_kwargs())
+    return _claude_result(response)
+
+
+def _chat_completion_result(
+    provider_label: str,
+    model: str | None,
+    response: object,
+) -> tuple[str, dict[str, int]]:
+    _log_raw_result(provider_label, model, response)
+    text = response.choices[0].message.content.strip()
+    return text, _usage_from(getattr(response, "usage", None))
+
+
+def _inference_chat_completion_text(response: object) -> tuple[str, dict[str, int]]:
+    content = response.choices[0].message.get("content", "")
+    text = (content or "").strip()
+    return text, _usage_from(getattr(response, "usage", None))
+
+
+def _text_generation_kwargs(temperature: float) -> dict:
+    return {
+        **_limit_kwargs(512, "max_new_tokens"),
+        "temperature": temperature,
+        "top_p": 0.9,
+        "repetition_penalty": 1.1,
+        "do_sample": True,
+        "return_full_text": False,
+    }
+
+
+def _is_model_not_supported(exc: Exception) -> bool:
+    error_text = str(exc).lower()
+    return "model_not_supported" in error_text or "not supported" in error_text
+
+
+def _is_task_not_supported(exc: Exception) -> bool:
+    error_text = str(exc).lower()
+    return (
+        "not supported for task text-generation" in error_text
+        or "supported task: conversational" in error_text
+    )
+
+
+def _require_hf_token() -> None:
+    if not settings.HF_TOKEN:
         raise RuntimeError("HF_TOKEN (Hugging Face token) is not configured")
 
+
+def _huggingface_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    _require_hf_token()
+
     client = _get_hf_client()
     response = client.chat.completions.create(
-        model=HF_MODEL_ID,
+        model=settings.HF_MODEL_ID,
         messages=messages,
         temperature=temperature,
+        **_limit_kwargs(),
+        **_timeout_kwargs(),
     )
-    _log_raw_result("huggingface", HF_MODEL_ID, response)
-    text = response.choices[0].message.content.strip()
-    prompt, completion, total = _extract_usage_tokens(getattr(response, "usage", None))
-    return text, _normalize_usage(prompt, completion, total)
+    return _chat_completion_result("huggingface", settings.HF_MODEL_ID, response)
+
+
+async def _ahuggingface_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    _require_hf_token()
+
+    client = _get_async_hf_client()
+    response = await client.chat.completions.create(
+        model=settings.HF_MODEL_ID,
+        messages=messages,
+        temperature=temperature,
+        **_limit_kwargs(),
+        **_timeout_kwargs(),
+    )
+    return _chat_completion_result("huggingface", settings.HF_MODEL_ID, response)
+
+
+def _tier_not_supported(exc: Exception) -> bool:
+    return _is_model_not_supported(exc) or _is_task_not_supported(exc)
+
+
+def _run_tiers(
+    model: str,
+    tiers: list[tuple[str, Callable[[], tuple[str, dict[str, int]]], Callable[[Exception], bool]]],
+) -> tuple[str, dict[str, int]]:
+    by_name = {name: (call, falls_through) for name, call, falls_through in tiers}
+    last_error: Exception | None = None
+    for name in _tier_cache().order(model, [name for name, _, _ in tiers]):
+        call, falls_through = by_name[name]
+        label = f"{model} {name}"
+        check_deadline(label)
+        if not _breaker().allow(label):
+            last_error = CircuitOpen(f"Circuit for {label} is open, skipping the call")
+            continue
+        started = time.monotonic()
+        try:
+            result = call()
+        except Exception as exc:
+            _record_circuit(label, started, exc)
+            _raise_if_deadline(exc, label)
+            if _tier_not_supported(exc):
+                _tier_cache().record_unsupported(model, name)
+            if not falls_through(exc):
+                raise
+            _log.debug("%s tier %s failed: %s", model, name, exc)
+            last_error = exc
+            continue
+        _record_circuit(label, started)
+        _tier_cache().record_success(model, name)
+        return result
+    raise last_error or RuntimeError(f"No tiers available for {model}")
+
+
+async def _arun_tiers(
+    model: str,
+    tiers: list[
+        tuple[
+            str,
+            Callable[[], Awaitable[tuple[str, dict[str, int]]]],
+            Callable[[Exception], bool],
+        ]
+    ],
+) -> tuple[str, dict[str, int]]:
+    by_name = {name: (call, falls_through) for name, call, falls_through in tiers}
+    last_error: Exception | None = None
+    for name in _tier_cache().order(model, [name for name, _, _ in tiers]):
+        call, falls_through = by_name[name]
+        label = f"{model} {name}"
+        check_deadline(label)
+        if not _breaker().allow(label):
+            last_error = CircuitOpen(f"Circuit for {label} is open, skipping the call")
+            continue
+        started = time.monotonic()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            _breaker().record(label, None, 0.0)
+            raise
+        except Exception as exc:
+            _record_circuit(label, started, exc)
+            _raise_if_deadline(exc, label)
+            if _tier_not_supported(exc):
+                _tier_cache().record_unsupported(model, name)
+            if not falls_through(exc):
+                raise
+            _log.debug("%s tier %s failed: %s", model, name, exc)
+            last_error = exc
+            continue
+        _record_circuit(label, started)
+        _tier_cache().record_success(model, name)
+        return result
+    raise last_error or RuntimeError(f"No tiers available for {model}")
+
+
+def _any_error(exc: Exception) -> bool:
+    return True
+
+
+def _attribute_error(exc: Exception) -> bool:
+    return isinstance(exc, AttributeError)
+
+
+def _magnum_text_generation_result(result: object) -> tuple[str, dict[str, int]]:
+    _log_raw_result("huggingface-magnum-text_generation", settings.HF_MODEL_MAGNUM_ID, result)
+    text, prompt_tokens, completion, total = _extract_text_generation_result(result)
+    if prompt_tokens is not None or completion is not None or total is not None:
+        return text, _normalize_usage(prompt_tokens, completion, total)
+    if text:
+        return text, _normalize_usage(0, 0, 0)
+
+    return str(result).strip(), _normalize_usage(0, 0, 0)
+
 
 def _huggingface_magnum_completion(
     messages: list[dict[str, str]],
     temperature: float,
 ) -> tuple[str, dict[str, int]]:
-    if not HF_TOKEN:
-        raise RuntimeError("HF_TOKEN (Hugging Face token) is not configured")
+    _require_hf_token()
 
-    try:
-        client = _get_hf_client()
-        response = client.chat.completions.create(
-            model=HF_MODEL_MAGNUM_ID,
+    def _router_chat() -> tuple[str, dict[str, int]]:
+        response = _get_hf_client().chat.completions.create(
+            model=settings.HF_MODEL_MAGNUM_ID,
             messages=messages,
             temperature=temperature,
+            **_limit_kwargs(),
+            **_timeout_kwargs(),
         )
-        _log_raw_result("huggingface-magnum", HF_MODEL_MAGNUM_ID, response)
-        text = response.choices[0].message.content.strip()
-        prompt, completion, total = _extract_usage_tokens(getattr(response, "usage", None))
-        return text, _normalize_usage(prompt, completion, total)
-    except Exception as exc:
-        error_text = str(exc).lower()
-        if "model_not_supported" not in error_text and "not supported" not in error_text:
-            raise
+        return _chat_completion_result("huggingface-magnum", settings.HF_MODEL_MAGNUM_ID, response)
 
-    client = _get_hf_inference_client()
-    try:
-        response = client.chat_completion(
-            model=HF_MODEL_MAGNUM_ID,
+    def _inference_chat() -> tuple[str, dict[str, int]]:
+        response = _with_timeout(_get_hf_inference_client()).chat_completion(
+            model=settings.HF_MODEL_MAGNUM_ID,
             messages=messages,
             temperature=temperature,
-            max_tokens=1024,
+            **_limit_kwargs(1024),
         )
-        _log_raw_result("huggingface-magnum-inference", HF_MODEL_MAGNUM_ID, response)
-        content = response.choices[0].message.get("content", "")
-        text = (content or "").strip()
-        prompt, completion, total = _extract_usage_tokens(getattr(response, "usage", None))
-        return text, _normalize_usage(prompt, completion, total)
-    except AttributeError:
+        _log_raw_result("huggingface-magnum-inference", settings.HF_MODEL_MAGNUM_ID, response)
+        return _inference_chat_completion_text(response)
+
+    def _inference_text_generation() -> tuple[str, dict[str, int]]:
+        client = _with_timeout(_get_hf_inference_client())
         prompt = _plain_text_from_messages(messages)
         if not prompt:
             raise RuntimeError("No content to send to Hugging Face model")
+        kwargs = _text_generation_kwargs(temperature)
         try:
             result = client.text_generation(
-                prompt,
-                model=HF_MODEL_MAGNUM_ID,
-                max_new_tokens=512,
-                temperature=temperature,
-                top_p=0.9,
-                repetition_penalty=1.1,
-                do_sample=True,
-                return_full_text=False,
-                details=True,
-            )
-        except Exception:
-            result = client.text_generation(
-                prompt,
-                model=HF_MODEL_MAGNUM_ID,
-                max_new_tokens=512,
-                temperature=temperature,
-                top_p=0.9,
-                repetition_penalty=1.1,
-                do_sample=True,
-                return_full_text=False,
+                prompt, model=settings.HF_MODEL_MAGNUM_ID, details=True, **kwargs
             )
-
-        _log_raw_result("huggingface-magnum-text_generation", HF_MODEL_MAGNUM_ID, result)
-        text, prompt_tokens, completion, total = _extract_text_generation_result(result)
-        if prompt_tokens is not None or completion is not None or total is not None:
-            return text, _normalize_usage(prompt_tokens, completion, total)
-        if text:
-            return text, _normalize_usage(0, 0, 0)
-
-        return str(result).strip(), _normalize_usage(0, 0, 0)
+        except Exception as exc:
+            if is_retryable(exc):
+                raise
+            result = client.text_generation(prompt, model=settings.HF_MODEL_MAGNUM_ID, **kwargs)
+        return _magnum_text_generation_result(result)
+
+    return _run_tiers(
+        settings.HF_MODEL_MAGNUM_ID,
+        [
+            ("router:chat", _router_chat, _is_model_not_supported),
+            ("auto:chat_completion", _inference_chat, _attribute_error),
+            ("auto:text_generation", _inference_text_generation, _any_error),
+        ],
+    )
 
 
-def _huggingface_tinyllama_completion(
+async def _ahuggingface_magnum_completion(
     messages: list[dict[str, str]],
     temperature: float,
 ) -> tuple[str, dict[str, int]]:
-    if not HF_TOKEN:
-        raise RuntimeError("HF_TOKEN (Hugging Face token) is not configured")
+    _require_hf_token()
 
-    try:
-        client = _get_hf_client()
+    async def _router_chat() -> tuple[str, dict[str, int]]:
+        response = await _get_async_hf_client().chat.completions.create(
+            model=settings.HF_MODEL_MAGNUM_ID,
+            messages=messages,
+            temperature=temperature,
+            **_limit_kwargs(),
+            **_timeout_kwargs(),
+        )
+        return _chat_completion_result("huggingface-magnum", settings.HF_MODEL_MAGNUM_ID, response)
+
+    async def _inference_chat() -> tuple[str, dict[str, int]]:
+        client = await _ahf_inference_client("auto")
+        response = await client.chat_completion(
+            model=settings.HF_MODEL_MAGNUM_ID,
+            messages=messages,
+            temperature=temperature,
+            **_limit_kwargs(1024),
+        )
+        _log_raw_result("huggingface-magnum-inference", settings.HF_MODEL_MAGNUM_ID, response)
+        return _inference_chat_completion_text(response)
+
+    async def _inference_text_generation() -> tuple[str, dict[str, int]]:
+        client = await _ahf_inference_client("auto")
         prompt = _plain_text_from_messages(messages)
         if not prompt:
             raise RuntimeError("No content to send to Hugging Face model")
-        response = client.responses.create(
-            model=TINYLLAMA_MODEL_ID,
-            input=prompt,
+        kwargs = _text_generation_kwargs(temperature)
+        try:
+            result = await client.text_generation(
+                prompt, model=settings.HF_MODEL_MAGNUM_ID, details=True, **kwargs
+            )
+        except Exception as exc:
+            if is_retryable(exc):
+                raise
+            result = await client.text_generation(
+                prompt, model=settings.HF_MODEL_MAGNUM_ID, **kwargs
+            )
+        return _magnum_text_generation_result(result)
+
+    return await _arun_tiers(
+        settings.HF_MODEL_MAGNUM_ID,
+        [
+            ("router:chat", _router_chat, _is_model_not_supported),
+            ("auto:chat_completion", _inference_chat, _attribute_error),
+            ("auto:text_generation", _inference_text_generation, _any_error),
+        ],
+    )
+
+
+def _tinyllama_prompt(messages: list[dict[str, str]]) -> str:
+    prompt = _plain_text_from_messages(messages)
+    if not prompt:
+        raise RuntimeError("No content to send to Hugging Face model")
+    return prompt
+
+
+def _tinyllama_responses_result(response: object) -> tuple[str, dict[str, int]]:
+    _log_raw_result("huggingface-tinyllama-responses", settings.HF_MODEL_TLAMA_ID, response)
+    _log.debug("TinyLlama via HF router responses.create")
+    _log.debug("TinyLlama responses meta: %s", _response_debug_snapshot(response))
+    _log.debug(
+        "TinyLlama responses output_text len=%s usage=%s",
+        len(getattr(response, "output_text", "") or ""),
+        getattr(response, "usage", None),
+    )
+    text = _extract_responses_text(response)
+    if not text.strip():
+        raise RuntimeError(
+            "TinyLlama недоступна в HF Router (пустой ответ). "
+            "Попробуйте позже или выберите другую модель."
+        )
+    return text, _usage_from(getattr(response, "usage", None))
+
+
+def _tinyllama_inference_chat_result(
+    client_label: str,
+    response: object,
+) -> tuple[str, dict[str, int]]:
+    _log_raw_result(
+        f"tinyllama-chat_completion-{client_label}", settings.HF_MODEL_TLAMA_ID, response
+    )
+    text, usage = _inference_chat_completion_text(response)
+    if not text:
+        raise RuntimeError(
+            "TinyLlama недоступна в HF Inference (пустой ответ). "
+            "Попробуйте позже или выберите другую модель."
+        )
+    return text, usage
+
+
+def _tinyllama_text_generation_result(
+    client_label: str,
+    result: object,
+) -> tuple[str, dict[str, int]]:
+    _log_raw_result(f"tinyllama-text_generation-{client_label}", settings.HF_MODEL_TLAMA_ID, result)
+    text, prompt_tokens, completion, total = _extract_text_generation_result(result)
+    if not text:
+        raise RuntimeError(
+            "TinyLlama недоступна в HF Inference text_generation (пустой ответ)."
+        )
+    if prompt_tokens is not None or completion is not None or total is not None:
+        return text, _normalize_usage(prompt_tokens, completion, total)
+    return text, _normalize_usage(0, 0, 0)
+
+
+def _huggingface_tinyllama_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    _require_hf_token()
+
+    def _router_responses() -> tuple[str, dict[str, int]]:
+        response = _get_hf_client().responses.create(
+            model=settings.HF_MODEL_TLAMA_ID,
+            input=_tinyllama_prompt(messages),
+            temperature=temperature,
+            **_limit_kwargs(512, "max_output_tokens", None),
+            **_timeout_kwargs(),
+        )
+        return _tinyllama_responses_result(response)
+
+    def _router_chat() -> tuple[str, dict[str, int]]:
+        response = _get_hf_client().chat.completions.create(
+            model=settings.HF_MODEL_TLAMA_ID,
+            messages=messages,
             temperature=temperature,
-            max_output_tokens=512,
+            **_limit_kwargs(),
+            **_timeout_kwargs(),
         )
-        _log_raw_result("huggingface-tinyllama-responses", TINYLLAMA_MODEL_ID, response)
-        _log.debug("TinyLlama via HF router responses.create")
-        _log.debug("TinyLlama responses meta: %s", _response_debug_snapshot(response))
-        _log.debug(
-            "TinyLlama responses output_text len=%s usage=%s",
-            len(getattr(response, "output_text", "") or ""),
-            getattr(response, "usage", None),
+        _log.debug("TinyLlama via HF router chat.completions")
+        return _chat_completion_result(
+            "huggingface-tinyllama-chat", settings.HF_MODEL_TLAMA_ID, response
         )
-        text = _extract_responses_text(response)
-        if not text.strip():
-            raise RuntimeError(
-                "TinyLlama недоступна в HF Router (пустой ответ). "
-                "Попробуйте позже или выберите другую модель."
+
+    def _text_generation(client_getter, client_label: str):
+        def _call() -> tuple[str, dict[str, int]]:
+            prompt = _tinyllama_prompt(messages)
+            client = _with_timeout(client_getter())
+            _log.debug("TinyLlama via HF Inference fallback (%s)", client_label)
+            kwargs = _text_generation_kwargs(temperature)
+            try:
+                result = client.text_generation(
+                    prompt,
+                    model=settings.HF_MODEL_TLAMA_ID,
+                    details=True,
+                    decoder_input_details=True,
+                    **kwargs,
+                )
+            except Exception as exc:
+                if _is_task_not_supported(exc) or is_retryable(exc):
+                    raise
+                result = client.text_generation(prompt, model=settings.HF_MODEL_TLAMA_ID, **kwargs)
+            return _tinyllama_text_generation_result(client_label, result)
+
+        return _call
+
+    def _chat_completion(client_getter, client_label: str):
+        def _call() -> tuple[str, dict[str, int]]:
+            response = _with_timeout(client_getter()).chat_completion(
+                model=settings.HF_MODEL_TLAMA_ID,
+                messages=messages,
+                temperature=temperature,
+                **_limit_kwargs(512),
             )
-        prompt_tokens, completion_tokens, total_tokens = _extract_usage_tokens(
-            getattr(response, "usage", None)
+            return _tinyllama_inference_chat_result(client_label, response)
+
+        return _call
+
+    featherless = _get_hf_inference_featherless_client
+    return _run_tiers(
+        settings.HF_MODEL_TLAMA_ID,
+        [
+            ("router:responses", _router_responses, _any_error),
+            ("router:chat", _router_chat, _any_error),
+            (
+                "auto:text_generation",
+                _text_generation(_get_hf_inference_client, "auto"),
+                _any_error,
+            ),
+            (
+                "auto:chat_completion",
+                _chat_completion(_get_hf_inference_client, "auto"),
+                _any_error,
+            ),
+            (
+                "featherless-ai:text_generation",
+                _text_generation(featherless, "featherless-ai"),
+                _any_error,
+            ),
+            (
+                "featherless-ai:chat_completion",
+                _chat_completion(featherless, "featherless-ai"),
+                _any_error,
+            ),
+        ],
+    )
+
+
+async def _ahuggingface_tinyllama_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    _require_hf_token()
+
+    async def _router_responses() -> tuple[str, dict[str, int]]:
+        response = await _get_async_hf_client().responses.create(
+            model=settings.HF_MODEL_TLAMA_ID,
+            input=_tinyllama_prompt(messages),
+            temperature=temperature,
+            **_limit_kwargs(512, "max_output_tokens", None),
+            **_timeout_kwargs(),
         )
-        return text, _normalize_usage(prompt_tokens, completion_tokens, total_tokens)
-    except Exception:
-        pass
+        return _tinyllama_responses_result(response)
 
-    try:
-        client = _get_hf_client()
-        response = client.chat.completions.create(
-            model=TINYLLAMA_MODEL_ID,
+    async def _router_chat() -> tuple[str, dict[str, int]]:
+        response = await _get_async_hf_client().chat.completions.create(
+            model=settings.HF_MODEL_TLAMA_ID,
             messages=messages,
             temperature=temperature,
+            **_limit_kwargs(),
+            **_timeout_kwargs(),
         )
-        _log_raw_result("huggingface-tinyllama-chat", TINYLLAMA_MODEL_ID, response)
         _log.debug("TinyLlama via HF router chat.completions")
-        text = response.choices[0].message.content.strip()
-        prompt_tokens, completion_tokens, total_tokens = _extract_usage_tokens(
-            getattr(response, "usage", None)
+        return _chat_completion_result(
+            "huggingface-tinyllama-chat", settings.HF_MODEL_TLAMA_ID, response
         )
-        return text, _normalize_usage(prompt_tokens, completion_tokens, total_tokens)
-    except Exception:
-        prompt = _plain_text_from_messages(messages)
-        if not prompt:
-            raise RuntimeError("No content to send to Hugging Face model")
 
-    def _text_generation_with_client(
-        client: "InferenceClient",
-        client_label: str,
-    ) -> tuple[str, dict[str, int]]:
-        _log.debug("TinyLlama via HF Inference fallback (%s)", client_label)
+    def _text_generation(client_label: str):
+        async def _call() -> tuple[str, dict[str, int]]:
+            prompt = _tinyllama_prompt(messages)
+            client = await _ahf_inference_client(client_label)
+            _log.debug("TinyLlama via HF Inference fallback (%s)", client_label)
+            kwargs = _text_generation_kwargs(temperature)
+            try:
+                result = await client.text_generation(
+                    prompt,
+                    model=settings.HF_MODEL_TLAMA_ID,
+                    details=True,
+                    decoder_input_details=True,
+                    **kwargs,
+                )
+            except Exception as exc:
+                if _is_task_not_supported(exc) or is_retryable(exc):
+                    raise
+                result = await client.text_generation(
+                    prompt, model=settings.HF_MODEL_TLAMA_ID, **kwargs
+                )
+            return _tinyllama_text_generation_result(client_label, result)
+
+        return _call
 
-        def _chat_completion_fallback() -> tuple[str, dict[str, int]]:
-            response = client.chat_completion(
-                model=TINYLLAMA_MODEL_ID,
+    def _chat_completion(client_label: str):
+        async def _call() -> tuple[str, dict[str, int]]:
+            client = await _ahf_inference_client(client_label)
+            response = await client.chat_completion(
+                model=settings.HF_MODEL_TLAMA_ID,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=512,
-            )
-            _log_raw_result(
-                f"tinyllama-chat_completion-{client_label}", TINYLLAMA_MODEL_ID, response
-            )
-            content = response.choices[0].message.get("content", "")
-            text = (content or "").strip()
-            prompt_tokens, completion, total = _extract_usage_tokens(
-                getattr(response, "usage", None)
+                **_limit_kwargs(512),
             )
-            if not text:
-                raise RuntimeError(
-                    "TinyLlama недоступна в HF Inference (пустой ответ). "
-                    "Попробуйте позже или выберите другую модель."
+            return _tinyllama_inference_chat_result(client_label, response)
+
+        return _call
+
+    return await _arun_tiers(
+        settings.HF_MODEL_TLAMA_ID,
+        [
+            ("router:responses", _router_responses, _any_error),
+            ("router:chat", _router_chat, _any_error),
+            ("auto:text_generation", _text_generation("auto"), _any_error),
+            ("auto:chat_completion", _chat_completion("auto"), _any_error),
+            ("featherless-ai:text_generation", _text_generation("featherless-ai"), _any_error),
+            ("featherless-ai:chat_completion", _chat_completion("featherless-ai"), _any_error),
+        ],
+    )
+
+
+@_fakeable("deepseek", "openai")
+def _get_deepseek_client() -> OpenAI:
+    global _deepseek_client
+    if _deepseek_client is None:
+        with _client_lock:
+            if _deepseek_client is None:
+                from openai import OpenAI
+
+                _deepseek_client = OpenAI(
+                    api_key=settings.DEEPSEEK_API_KEY,
+                    base_url=DEEPSEEK_BASE_URL,
+                    http_client=_http_client(),
+                    max_retries=0,
                 )
-            return text, _normalize_usage(prompt_tokens, completion, total)
+    return _deepseek_client
 
-        try:
-            result = client.text_generation(
-                prompt,
-                model=TINYLLAMA_MODEL_ID,
-                max_new_tokens=512,
-                temperature=temperature,
-                top_p=0.9,
-                repetition_penalty=1.1,
-                do_sample=True,
-                return_full_text=False,
-                details=True,
-                decoder_input_details=True,
-            )
-        except Exception as exc:
-            error_text = str(exc).lower()
-            if "not supported for task text-generation" in error_text or "supported task: conversational" in error_text:
-                return _chat_completion_fallback()
-            result = client.text_generation(
-                prompt,
-                model=TINYLLAMA_MODEL_ID,
-                max_new_tokens=512,
-                temperature=temperature,
-                top_p=0.9,
-                repetition_penalty=1.1,
-                do_sample=True,
-                return_full_text=False,
-            )
 
-        _log_raw_result(f"tinyllama-text_generation-{client_label}", TINYLLAMA_MODEL_ID, result)
-        text, prompt_tokens, completion, total = _extract_text_generation_result(result)
-        if not text:
-            return _chat_completion_fallback()
-        if prompt_tokens is not None or completion is not None or total is not None:
-            return text, _normalize_usage(prompt_tokens, completion, total)
-        return text, _normalize_usage(0, 0, 0)
+@_fakeable("deepseek", "openai", is_async=True)
+def _get_async_deepseek_client() -> AsyncOpenAI:
+    def _create() -> AsyncOpenAI:
+        from openai import AsyncOpenAI
 
-    try:
-        return _text_generation_with_client(_get_hf_inference_client(), "auto")
-    except Exception:
-        return _text_generation_with_client(_get_hf_inference_featherless_client(), "featherless-ai")
+        return AsyncOpenAI(
+            api_key=settings.DEEPSEEK_API_KEY,
+            base_url=DEEPSEEK_BASE_URL,
+            http_client=_async_http_client(),
+            max_retries=0,
+        )
+
+    return _async_deepseek_clients.get(_create)
 
 
 def _deepseek_completion(
     messages: list[dict[str, str]],
     temperature: float,
 ) -> tuple[str, dict[str, int]]:
-    response = readonly_client.chat.completions.create(
+    response = _get_deepseek_client().chat.completions.create(
         model=DEEPSEEK_MODEL,
         messages=messages,
         temperature=temperature,
+        **_limit_kwargs(),
+        **_timeout_kwargs(),
     )
-    _log_raw_result("deepseek", DEEPSEEK_MODEL, response)
-    text = response.choices[0].message.content.strip()
-    prompt, completion, total = _extract_usage_tokens(getattr(response, "usage", None))
-    return text, _normalize_usage(prompt, completion, total)
+    return _chat_completion_result("deepseek", DEEPSEEK_MODEL, response)
 
 
-def chat_completion(
+async def _adeepseek_completion(
     messages: list[dict[str, str]],
-    provider: str | None = None,
-    temperature: float = 0.6,
+    temperature: float,
 ) -> tuple[str, dict[str, int]]:
-    provider = provider or DEFAULT_PROVIDER
+    client = _get_async_deepseek_client()
+    response = await client.chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=messages,
+        temperature=temperature,
+        **_limit_kwargs(),
+        **_timeout_kwargs(),
+    )
+    return _chat_completion_result("deepseek", DEEPSEEK_MODEL, response)
+
+
+@_once
+def _get_fake_client():
+    return fake_client(_fake_backend(), "openai", "fake")
+
+
+@_once
+def _get_async_fake_client():
+    return fake_client(_fake_backend(), "openai", "fake", is_async=True)
+
+
+def _fake_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    response = _get_fake_client().chat.completions.create(
+        model=FAKE_MODEL,
+        messages=messages,
+        temperature=temperature,
+        **_limit_kwargs(),
+        **_timeout_kwargs(),
+    )
+    return _chat_completion_result("fake", FAKE_MODEL, response)
+
+
+async def _afake_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    response = await _get_async_fake_client().chat.completions.create(
+        model=FAKE_MODEL,
+        messages=messages,
+        temperature=temperature,
+        **_limit_kwargs(),
+        **_timeout_kwargs(),
+    )
+    return _chat_completion_result("fake", FAKE_MODEL, response)
+
+
+async def _astream_openai_chat(
+    client: AsyncOpenAI,
+    provider_label: str,
+    model: str | None,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True},
+        **_limit_kwargs(),
+        **_timeout_kwargs(),
+    )
+    usage = None
+    async for chunk in stream:
+        choices = getattr(chunk, "choices", None) or []
+        if choices:
+            delta = getattr(choices[0], "delta", None)
+            text = getattr(delta, "content", None)
+            if text:
+                yield text, None
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+    _log_raw_result(f"{provider_label}-stream", model, usage)
+    yield "", _usage_from(usage)
+
+
+async def _astream_deepseek_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    async for chunk in _astream_openai_chat(
+        _get_async_deepseek_client(), "deepseek", DEEPSEEK_MODEL, messages, temperature
+    ):
+        yield chunk
+
+
+async def _astream_huggingface_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    _require_hf_token()
+    async for chunk in _astream_openai_chat(
+        _get_async_hf_client(), "huggingface", settings.HF_MODEL_ID, messages, temperature
+    ):
+        yield chunk
+
+
+async def _astream_fake_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    async for chunk in _astream_openai_chat(
+        _get_async_fake_client(), "fake", FAKE_MODEL, messages, temperature
+    ):
+        yield chunk
+
+
+async def _astream_claude_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    payload = _claude_payload(messages, temperature)
+    client = _get_async_claude_client()
+    async with client.messages.stream(**payload, **_timeout_kwargs()) as stream:
+        async for text in stream.text_stream:
+            if text:
+                yield text, None
+        response = await stream.get_final_message()
+    _log_raw_result("claude-stream", settings.CLAUDE_MODEL, response)
+    yield "", _usage_from(getattr(response, "usage", None))
+
+
+async def _astream_yandex_completion(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    payload, commit = _yandex_request(messages, temperature)
+    client = _get_async_yandex_client()
+    try:
+        stream = await client.responses.create(stream=True, **payload, **_timeout_kwargs())
+    except Exception as exc:
+        if not _stale_chain(payload, exc):
+            raise
+        payload, _ = _yandex_request(messages, temperature, chained=False)
+        stream = await client.responses.create(stream=True, **payload, **_timeout_kwargs())
+    usage = None
+    async for event in stream:
+        event_type = getattr(event, "type", "")
+        if event_type == "response.output_text.delta":
+            delta = getattr(event, "delta", None)
+            if delta:
+                yield delta, None
+        elif event_type == "response.completed":
+            response = getattr(event, "response", None)
+            _log_raw_result("yandex-stream", _yandex_model_label(), response)
+            commit(response)
+            usage = getattr(response, "usage", None)
+    yield "", _usage_from(usage)
+
+
+def _astream_whole_completion(adapter):
+    # Fallback chains switch endpoints mid-flight, so they are not streamed:
+    # the finished text is emitted as a single delta.
+    async def _stream(
+        messages: list[dict[str, str]],
+        temperature: float,
+    ) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+        text, usage = await adapter(messages, temperature)
+        if text:
+            yield text, None
+        yield "", usage
+
+    return _stream
+
+
+_COMPLETION_ADAPTERS = {
+    "deepseek": _deepseek_completion,
+    "yandex": _yandex_completion,
+    "claude": _claude_completion,
+    "huggingface": _huggingface_completion,
+    "huggingface-magnum": _huggingface_magnum_completion,
+    "huggingface-tinyllama": _huggingface_tinyllama_completion,
+    "fake": _fake_completion,
+}
+
+_ASYNC_COMPLETION_ADAPTERS = {
+    "deepseek": _adeepseek_completion,
+    "yandex": _ayandex_completion,
+    "claude": _aclaude_completion,
+    "huggingface": _ahuggingface_completion,
+    "huggingface-magnum": _ahuggingface_magnum_completion,
+    "huggingface-tinyllama": _ahuggingface_tinyllama_completion,
+    "fake": _afake_completion,
+}
+
+
+def _provider_model(provider: str) -> str | None:
     if provider == "deepseek":
-        return _deepseek_completion(messages, temperature)
+        return DEEPSEEK_MODEL
     if provider == "yandex":
-        return _yandex_completion(messages, temperature)
+        return _yandex_model_label()
     if provider == "claude":
-        return _claude_completion(messages, temperature)
+        return settings.CLAUDE_MODEL
     if provider == "huggingface":
-        return _huggingface_completion(messages, temperature)
+        return settings.HF_MODEL_ID
     if provider == "huggingface-magnum":
-        return _huggingface_magnum_completion(messages, temperature)
+        return settings.HF_MODEL_MAGNUM_ID
     if provider == "huggingface-tinyllama":
-        return _huggingface_tinyllama_completion(messages, temperature)
-    raise RuntimeError(f"Unknown provider: {provider}")
+        return settings.HF_MODEL_TLAMA_ID
+    if provider == "fake":
+        return FAKE_MODEL
+    return None
+
+
+def _request_key(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> str:
+    return canonical_key(
+        provider, _provider_model(provider), messages, temperature, **_limit_params()
+    )
+
+
+def _response_cache_key(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> str | None:
+    if not _response_cache().enabled or temperature > settings.RESPONSE_CACHE_MAX_TEMPERATURE:
+        return None
+    return _request_key(provider, messages, temperature)
+
+
+def _cached_response(cache_key: str | None) -> tuple[str, dict[str, int]] | None:
+    if cache_key is None:
+        return None
+    cached = _response_cache().get(cache_key)
+    if cached is None:
+        return None
+    # A cache hit costs no tokens, so the caller sees zero usage.
+    return cached[0], _normalize_usage(0, 0, 0)
+
+
+def estimate_prompt_tokens(
+    messages: list[dict[str, str]],
+    provider: str = DEFAULT_PROVIDER,
+) -> int:
+    return _token_estimator().estimate(provider, _provider_model(provider), messages)
+
+
+def estimate_text_tokens(text: str, provider: str = DEFAULT_PROVIDER) -> int:
+    return _token_estimator().estimate_text(provider, _provider_model(provider), text)
+
+
+def _calibrate_estimate(
+    provider: str,
+    messages: list[dict[str, str]],
+    usage: dict[str, int] | None,
+) -> None:
+    if usage:
+        _token_estimator().observe(
+            provider, _provider_model(provider), messages, usage.get("prompt_tokens", 0)
+        )
+
+
+def _is_rate_limited(exc: BaseException) -> bool:
+    return status_code(exc) == 429
+
+
+def _circuit_outcome(exc: BaseException | None, latency: float) -> bool | None:
+    if exc is None:
+        return True
+    if isinstance(
+        exc,
+        (CircuitOpen, RateLimitExceeded, CassetteMiss, asyncio.CancelledError, GeneratorExit),
+    ):
+        return None
+    if isinstance(exc, Exception) and _tier_not_supported(exc):
+        return None
+    if isinstance(exc, (DeadlineExceeded, asyncio.TimeoutError)) or deadline_expired():
+        # Our own budget ran out; it only counts against the upstream if the call was already slow.
+        slow = _breaker().slow_call_seconds
+        return False if slow > 0 and latency >= slow else None
+    status = status_code(exc)
+    if status is not None and 400 <= status < 500 and status != 408:
+        return None
+    return False
+
+
+def _record_circuit(key: str, started: float, exc: BaseException | None = None) -> None:
+    latency = time.monotonic() - started
+    _breaker().record(key, _circuit_outcome(exc, latency), latency)
+
+
+def _reserve_capacity(provider: str, estimate: int) -> float:
+    remaining = hop_timeout(label=provider)
+    try:
+        return _rate_limiter().reserve(
+            provider,
+            _provider_model(provider),
+            estimate,
+            max_wait=remaining,
+        )
+    except RateLimitExceeded as exc:
+        if remaining is not None and remaining < _rate_limiter().max_wait_seconds:
+            raise DeadlineExceeded(f"Deadline exceeded while queued for {provider} capacity") from exc
+        raise
+
+
+def _admit(provider: str, estimate: int) -> float:
+    _breaker().check(provider)
+    try:
+        return _reserve_capacity(provider, estimate)
+    except Exception:
+        _breaker().record(provider, None, 0.0)
+        raise
+
+
+def _settle_capacity(provider: str, estimate: int, usage: dict[str, int]) -> None:
+    _rate_limiter().settle(
+        provider, _provider_model(provider), estimate, usage.get("total_tokens", 0)
+    )
+
+
+def _release_capacity(provider: str, estimate: int, exc: BaseException) -> None:
+    model = _provider_model(provider)
+    # A failed call keeps its request slot but gives its reserved tokens back.
+    _rate_limiter().settle(provider, model, estimate, 0)
+    if _is_rate_limited(exc):
+        _rate_limiter().throttled(provider, model)
+
+
+def _call_adapter(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    adapter = _COMPLETION_ADAPTERS.get(provider)
+    if adapter is None:
+        raise RuntimeError(f"Unknown provider: {provider}")
+    if _cassette() is not None:
+        adapter = _cassette().wrap(
+            provider, _provider_model(provider), adapter, _limit_params()
+        )
+    check_deadline(provider)
+    estimate = estimate_prompt_tokens(messages, provider)
+    wait = _admit(provider, estimate)
+    if wait > 0:
+        time.sleep(wait)
+    started = time.monotonic()
+    try:
+        text, usage = adapter(messages, temperature)
+    except Exception as exc:
+        _record_circuit(provider, started, exc)
+        _release_capacity(provider, estimate, exc)
+        _raise_if_deadline(exc, provider)
+        raise
+    _record_circuit(provider, started)
+    _calibrate_estimate(provider, messages, usage)
+    _settle_capacity(provider, estimate, usage)
+    return text, usage
+
+
+async def _acall_adapter(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    adapter = _ASYNC_COMPLETION_ADAPTERS.get(provider)
+    if adapter is None:
+        raise RuntimeError(f"Unknown provider: {provider}")
+    if _cassette() is not None:
+        adapter = _cassette().awrap(
+            provider, _provider_model(provider), adapter, _limit_params()
+        )
+    estimate = estimate_prompt_tokens(messages, provider)
+    wait = _admit(provider, estimate)
+    started = time.monotonic()
+    try:
+        if wait > 0:
+            await asyncio.sleep(wait)
+            started = time.monotonic()
+        timeout = hop_timeout(label=provider)
+        if timeout is None:
+            text, usage = await adapter(messages, temperature)
+        else:
+            text, usage = await asyncio.wait_for(adapter(messages, temperature), timeout)
+    except asyncio.CancelledError as exc:
+        _record_circuit(provider, started, exc)
+        _release_capacity(provider, estimate, exc)
+        raise
+    except asyncio.TimeoutError as exc:
+        _record_circuit(provider, started, exc)
+        _release_capacity(provider, estimate, exc)
+        raise DeadlineExceeded(f"{provider} did not answer within the request deadline") from exc
+    except Exception as exc:
+        _record_circuit(provider, started, exc)
+        _release_capacity(provider, estimate, exc)
+        _raise_if_deadline(exc, provider)
+        raise
+    _record_circuit(provider, started)
+    _calibrate_estimate(provider, messages, usage)
+    _settle_capacity(provider, estimate, usage)
+    return text, usage
+
+
+def _call_with_retries(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    return _retry_policy().call(provider, lambda: _call_adapter(provider, messages, temperature))
+
+
+async def _acall_with_retries(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    return await _retry_policy().acall(
+        provider, lambda: _acall_adapter(provider, messages, temperature)
+    )
+
+
+def _hedgeable(provider: str, backup: str) -> bool:
+    # A chained Yandex call commits its response id as soon as it returns, and the
+    # losing call of a race cannot be stopped, so the session could end up chained
+    # to a reply the user never saw.
+    if not settings.HEDGE_ENABLED:
+        return False
+    return _response_chain.get() is None or not (
+        chains_responses(provider) or chains_responses(backup)
+    )
+
+
+def _hedged_call(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    backup = _hedger().backup_for(provider)
+    if not _hedgeable(provider, backup):
+        return _call_with_retries(provider, messages, temperature)
+    return _hedger().run(
+        provider,
+        lambda: _call_with_retries(provider, messages, temperature),
+        lambda: _call_with_retries(backup, messages, temperature),
+    )
+
+
+async def _ahedged_call(
+    provider: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    backup = _hedger().backup_for(provider)
+    if not _hedgeable(provider, backup):
+        return await _acall_with_retries(provider, messages, temperature)
+    return await _hedger().arun(
+        provider,
+        lambda: _acall_with_retries(provider, messages, temperature),
+        lambda: _acall_with_retries(backup, messages, temperature),
+    )
+
+
+def chat_completion(
+    messages: list[dict[str, str]],
+    provider: str | None = None,
+    temperature: float = 0.6,
+) -> tuple[str, dict[str, int]]:
+    provider = provider or DEFAULT_PROVIDER
+    cache_key = _response_cache_key(provider, messages, temperature)
+    cached = _cached_response(cache_key)
+    if cached is not None:
+        return cached
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        text, usage = _hedged_call(provider, messages, temperature)
+    else:
+        (text, usage), leader = _FLIGHTS.do(
+            cache_key or _request_key(provider, messages, temperature),
+            lambda: _hedged_call(provider, messages, temperature),
+            timeout=hop_timeout(label=provider),
+        )
+        if not leader:
+            return text, _normalize_usage(0, 0, 0)
+    if cache_key is not None:
+        _response_cache().put(cache_key, text, usage)
+    return text, usage
+
+
+async def achat_completion(
+    messages: list[dict[str, str]],
+    provider: str | None = None,
+    temperature: float = 0.6,
+) -> tuple[str, dict[str, int]]:
+    provider = provider or DEFAULT_PROVIDER
+    cache_key = _response_cache_key(provider, messages, temperature)
+    cached = _cached_response(cache_key)
+    if cached is not None:
+        return cached
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        text, usage = await _ahedged_call(provider, messages, temperature)
+    else:
+        (text, usage), leader = await _FLIGHTS.ado(
+            cache_key or _request_key(provider, messages, temperature),
+            lambda: _ahedged_call(provider, messages, temperature),
+            timeout=hop_timeout(label=provider),
+        )
+        if not leader:
+            return text, _normalize_usage(0, 0, 0)
+    if cache_key is not None:
+        _response_cache().put(cache_key, text, usage)
+    return text, usage
+
+
+def _batch_requests(
+    requests: list,
+    provider: str | None,
+    temperature: float,
+) -> list[tuple[str, list[dict[str, str]], float]]:
+    # Each request is a message list or a dict with "messages" and optional
+    # "provider" / "temperature" overriding the batch defaults.
+    normalized = []
+    for request in requests:
+        if isinstance(request, dict):
+            normalized.append(
+                (
+                    request.get("provider") or provider or DEFAULT_PROVIDER,
+                    request["messages"],
+                    request.get("temperature", temperature),
+                )
+            )
+        else:
+            normalized.append((provider or DEFAULT_PROVIDER, request, temperature))
+    return normalized
+
+
+def chat_completion_batch(
+    requests: list,
+    provider: str | None = None,
+    temperature: float = 0.6,
+    max_concurrency: int | None = None,
+    per_provider_limits: dict[str, int] | None = None,
+) -> tuple[list[BatchItem], dict[str, int]]:
+    jobs = [
+        (name, functools.partial(chat_completion, messages, name, temp))
+        for name, messages, temp in _batch_requests(requests, provider, temperature)
+    ]
+    items = run_batch(
+        jobs,
+        max_concurrency or settings.BATCH_MAX_CONCURRENCY,
+        per_provider_limits,
+    )
+    return items, total_usage(items)
+
+
+async def achat_completion_batch(
+    requests: list,
+    provider: str | None = None,
+    temperature: float = 0.6,
+    max_concurrency: int | None = None,
+    per_provider_limits: dict[str, int] | None = None,
+) -> tuple[list[BatchItem], dict[str, int]]:
+    jobs = [
+        (name, functools.partial(achat_completion, messages, name, temp))
+        for name, messages, temp in _batch_requests(requests, provider, temperature)
+    ]
+    items = await arun_batch(
+        jobs,
+        max_concurrency or settings.BATCH_MAX_CONCURRENCY,
+        per_provider_limits,
+    )
+    return items, total_usage(items)
+
+
+_ASYNC_STREAM_ADAPTERS = {
+    "deepseek": _astream_deepseek_completion,
+    "yandex": _astream_yandex_completion,
+    "claude": _astream_claude_completion,
+    "huggingface": _astream_huggingface_completion,
+    "huggingface-magnum": _astream_whole_completion(_ahuggingface_magnum_completion),
+    "huggingface-tinyllama": _astream_whole_completion(_ahuggingface_tinyllama_completion),
+    "fake": _astream_fake_completion,
+}
+
+
+async def astream_chat_completion(
+    messages: list[dict[str, str]],
+    provider: str | None = None,
+    temperature: float = 0.6,
+    max_tokens: int | None = None,
+    stop: list[str] | tuple[str, ...] = (),
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    # Limits are taken as arguments: a generation_limits block around a generator
+    # would stay set across its yields and could not be reset from another task.
+    provider = provider or DEFAULT_PROVIDER
+    adapter = _ASYNC_STREAM_ADAPTERS.get(provider)
+    if adapter is None:
+        raise RuntimeError(f"Unknown provider: {provider}")
+    limits = (max_tokens, tuple(stop)) if max_tokens or stop else _generation_limits.get()
+    with generation_limits(*limits):
+        if _cassette() is not None:
+            adapter = _cassette().wrap_stream(
+                provider, _provider_model(provider), adapter, _limit_params()
+            )
+        cache_key = _response_cache_key(provider, messages, temperature)
+    cached = _cached_response(cache_key)
+    if cached is not None:
+        yield cached[0], None
+        yield "", cached[1]
+        return
+    check_deadline(provider)
+    estimate = estimate_prompt_tokens(messages, provider)
+    wait = _admit(provider, estimate)
+    started = time.monotonic()
+    parts: list[str] = []
+    usage = None
+    settled = False
+    try:
+        if wait > 0:
+            await asyncio.sleep(wait)
+            started = time.monotonic()
+        stream = _limited_stream(adapter(messages, temperature), limits)
+        async for delta, chunk_usage in stream:
+            if delta:
+                parts.append(delta)
+            if chunk_usage is not None:
+                usage = chunk_usage
+            yield delta, chunk_usage
+            check_deadline(f"{provider} stream")
+    except (asyncio.CancelledError, GeneratorExit) as exc:
+        _record_circuit(provider, started, exc)
+        raise
+    except Exception as exc:
+        settled = True
+        _record_circuit(provider, started, exc)
+        _release_capacity(provider, estimate, exc)
+        _raise_if_deadline(exc, provider)
+        raise
+    else:
+        settled = True
+        _record_circuit(provider, started)
+        _calibrate_estimate(provider, messages, usage)
+        _settle_capacity(provider, estimate, usage or _normalize_usage(estimate, 0, None))
+        if cache_key is not None and usage is not None:
+            _response_cache().put(cache_key, "".join(parts).strip(), usage)
+    finally:
+        if not settled:
+            # The client went away mid-stream: charge the prompt and what was generated.
+            streamed = estimate_text_tokens("".join(parts), provider)
+            _settle_capacity(provider, estimate, usage or _normalize_usage(estimate, streamed, None))
+
+
+def provider_stats() -> dict:
+    return {
+        "batch": batch_stats(),
+        "cassette": _cassette().stats() if _cassette() is not None else {"mode": None},
+        "circuit_breakers": _breaker().stats(),
+        "fake": _fake_backend().stats(),
+        "hedging": {"enabled": settings.HEDGE_ENABLED, **_hedger().stats()},
+        "hf_tiers": _tier_cache().stats(),
+        "http_transport": transport_stats(),
+        "rate_limits": _rate_limiter().stats(),
+        "raw_log": raw_log_stats(),
+        "response_cache": _response_cache().stats(),
+        "response_chain": {"enabled": settings.YANDEX_RESPONSE_CHAIN, **_chain_counters},
+        "retries": _retry_policy().stats(),
+        "single_flight": _FLIGHTS.stats(),
+        "speculation": {"enabled": settings.SPECULATIVE_SUMMARY, **speculation_stats()},
+        "token_estimator": _token_estimator().stats(),
+    }
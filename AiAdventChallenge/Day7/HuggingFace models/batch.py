@@ -0,0 +1,218 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from deadline import remaining_budget
+from rate_limiter import RateLimitExceeded
+
+_log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = {"batches": 0, "items": 0, "failed": 0, "rate_limit_waits": 0}
+
+Job = tuple[str, Callable[[], tuple[str, dict[str, int]]]]
+AsyncJob = tuple[str, Callable[[], Awaitable[tuple[str, dict[str, int]]]]]
+
+
+class BatchItem:
+    __slots__ = ("index", "provider", "text", "usage", "error", "latency")
+
+    def __init__(self, index: int, provider: str) -> None:
+        self.index = index
+        self.provider = provider
+        self.text: str | None = None
+        self.usage: dict[str, int] = {}
+        self.error: Exception | None = None
+        self.latency = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        state = "ok" if self.ok else f"error={self.error!r}"
+        return f"BatchItem(index={self.index}, provider={self.provider!r}, {state})"
+
+
+def total_usage(items: list[BatchItem]) -> dict[str, int]:
+    totals: Counter[str] = Counter()
+    for item in items:
+        for key, value in item.usage.items():
+            if isinstance(value, int):
+                totals[key] += value
+    return dict(totals)
+
+
+def _queue_wait(exc: RateLimitExceeded) -> float:
+    # The limiter refused to queue this long; a batch has no user waiting, so it
+    # sleeps until capacity frees up instead of failing the item.
+    delay = exc.wait if exc.wait is not None else 1.0
+    remaining = remaining_budget()
+    if remaining is not None and delay >= remaining:
+        raise exc
+    _count("rate_limit_waits")
+    return delay
+
+
+def _finish(
+    item: BatchItem,
+    started: float,
+    result: tuple[str, dict[str, int]] | None = None,
+    error: Exception | None = None,
+) -> BatchItem:
+    item.latency = time.monotonic() - started
+    if error is not None:
+        item.error = error
+        _count("failed")
+        _log.warning("Batch item %d (%s) failed: %s", item.index, item.provider, error)
+    else:
+        item.text, item.usage = result
+    return item
+
+
+def _run_item(index: int, provider: str, fn: Callable[[], tuple[str, dict[str, int]]]) -> BatchItem:
+    item = BatchItem(index, provider)
+    started = time.monotonic()
+    while True:
+        try:
+            return _finish(item, started, fn())
+        except RateLimitExceeded as exc:
+            try:
+                delay = _queue_wait(exc)
+            except RateLimitExceeded as final:
+                return _finish(item, started, error=final)
+        except Exception as exc:
+            return _finish(item, started, error=exc)
+        time.sleep(delay)
+
+
+async def _arun_item(
+    index: int,
+    provider: str,
+    factory: Callable[[], Awaitable[tuple[str, dict[str, int]]]],
+) -> BatchItem:
+    item = BatchItem(index, provider)
+    started = time.monotonic()
+    while True:
+        try:
+            return _finish(item, started, await factory())
+        except RateLimitExceeded as exc:
+            try:
+                delay = _queue_wait(exc)
+            except RateLimitExceeded as final:
+                return _finish(item, started, error=final)
+        except Exception as exc:
+            return _finish(item, started, error=exc)
+        await asyncio.sleep(delay)
+
+
+class _Scheduler:
+    # Hands out job indexes so that no provider exceeds its own limit and a
+    # provider at its limit never holds a slot another provider could use.
+    def __init__(self, providers: list[str], limits: dict[str, int]) -> None:
+        self.limits = {key: max(1, int(value)) for key, value in limits.items()}
+        self.queues: dict[str, deque[int]] = {}
+        for index, provider in enumerate(providers):
+            self.queues.setdefault(provider, deque()).append(index)
+        self.active: Counter[str] = Counter()
+
+    def next(self) -> int | None:
+        ready = [
+            queue for provider, queue in self.queues.items() if queue and self._has_room(provider)
+        ]
+        if not ready:
+            return None
+        # Oldest waiting job first, so results arrive roughly in input order.
+        return min(ready, key=lambda queue: queue[0]).popleft()
+
+    def _has_room(self, provider: str) -> bool:
+        limit = self.limits.get(provider)
+        return limit is None or self.active[provider] < limit
+
+    def started(self, provider: str) -> None:
+        self.active[provider] += 1
+
+    def finished(self, provider: str) -> None:
+        self.active[provider] -= 1
+
+
+def run_batch(
+    jobs: list[Job],
+    max_concurrency: int,
+    limits: dict[str, int] | None = None,
+) -> list[BatchItem]:
+    _start_batch(len(jobs))
+    items: list[BatchItem | None] = [None] * len(jobs)
+    if not jobs:
+        return []
+    scheduler = _Scheduler([provider for provider, _ in jobs], limits or {})
+    workers = max(1, min(int(max_concurrency), len(jobs)))
+    running: dict[Future, int] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+        while True:
+            while len(running) < workers and (index := scheduler.next()) is not None:
+                provider, fn = jobs[index]
+                scheduler.started(provider)
+                running[
+                    executor.submit(contextvars.copy_context().run, _run_item, index, provider, fn)
+                ] = index
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                scheduler.finished(jobs[index][0])
+                items[index] = future.result()
+    return items
+
+
+async def arun_batch(
+    jobs: list[AsyncJob],
+    max_concurrency: int,
+    limits: dict[str, int] | None = None,
+) -> list[BatchItem]:
+    _start_batch(len(jobs))
+    items: list[BatchItem | None] = [None] * len(jobs)
+    if not jobs:
+        return []
+    scheduler = _Scheduler([provider for provider, _ in jobs], limits or {})
+    workers = max(1, min(int(max_concurrency), len(jobs)))
+    running: dict[asyncio.Task, int] = {}
+    try:
+        while True:
+            while len(running) < workers and (index := scheduler.next()) is not None:
+                provider, factory = jobs[index]
+                scheduler.started(provider)
+                running[asyncio.ensure_future(_arun_item(index, provider, factory))] = index
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = running.pop(task)
+                scheduler.finished(jobs[index][0])
+                items[index] = task.result()
+    finally:
+        for task in running:
+            task.cancel()
+    return items
+
+
+def batch_stats() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def _start_batch(size: int) -> None:
+    with _lock:
+        _counters["batches"] += 1
+        _counters["items"] += size
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _counters[name] += 1
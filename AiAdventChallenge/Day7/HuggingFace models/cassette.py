@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from response_cache import canonical_key
+from retry import status_code
+
+_log = logging.getLogger(__name__)
+
+MODES = ("record", "replay")
+
+Completion = Callable[[list[dict[str, str]], float], tuple[str, dict[str, int]]]
+AsyncCompletion = Callable[[list[dict[str, str]], float], Awaitable[tuple[str, dict[str, int]]]]
+StreamCompletion = Callable[
+    [list[dict[str, str]], float], AsyncIterator[tuple[str, dict[str, int] | None]]
+]
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+class ReplayedError(RuntimeError):
+    # Carries the recorded status so retries and breakers react as they did live.
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status_code = status
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0) -> None:
+        if mode not in MODES:
+            raise RuntimeError(
+                f"❌ Неверное значение CASSETTE_MODE: {mode} (ожидается record или replay)"
+            )
+        self.path = path
+        self.mode = mode
+        self.latency_scale = max(0.0, float(latency_scale))
+        self._lock = threading.Lock()
+        self._interactions: dict[str, list[dict]] = {}
+        self._cursors: dict[str, int] = {}
+        self._recorded = 0
+        self._replayed = 0
+        self._rewound = 0
+        self._misses = 0
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise RuntimeError(f"❌ Кассета {self.path} не найдена (CASSETTE_MODE=replay)")
+        with open(self.path, encoding="utf-8") as handle:
+            for number, line in enumerate(handle, 1):
+                if not line.strip():
+                    continue
+                try:
+                    interaction = json.loads(line)
+                except json.JSONDecodeError:
+                    _log.warning("Skipping malformed cassette line %s:%d", self.path, number)
+                    continue
+                self._interactions.setdefault(interaction["key"], []).append(interaction)
+        _log.info(
+            "Loaded %d recorded interactions from %s",
+            sum(len(items) for items in self._interactions.values()),
+            self.path,
+        )
+
+    def _next(self, key: str, provider: str) -> dict:
+        with self._lock:
+            recorded = self._interactions.get(key)
+            if not recorded:
+                self._misses += 1
+                raise CassetteMiss(
+                    f"No recorded {provider} response for this request in {self.path}"
+                )
+            # Repeated identical requests replay in recorded order, then start over.
+            cursor = self._cursors.get(key, 0)
+            if cursor >= len(recorded):
+                cursor = 0
+                self._rewound += 1
+            self._cursors[key] = cursor + 1
+            self._replayed += 1
+            return recorded[cursor]
+
+    def _write(self, interaction: dict) -> None:
+        line = json.dumps(interaction, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(line + "\n")
+            self._recorded += 1
+
+    def _interaction(
+        self,
+        key: str,
+        provider: str,
+        model: str | None,
+        request: dict,
+        started: float,
+        text: str | None = None,
+        usage: dict[str, int] | None = None,
+        error: Exception | None = None,
+        chunks: list[tuple[float, str]] | None = None,
+    ) -> dict:
+        interaction = {
+            "key": key,
+            "provider": provider,
+            "model": model,
+            "recorded_at": round(time.time(), 3),
+            "request": request,
+            "latency": round(time.monotonic() - started, 4),
+        }
+        if error is not None:
+            interaction["error"] = {
+                "type": type(error).__name__,
+                "message": str(error),
+                "status": status_code(error),
+            }
+        else:
+            interaction["text"] = text
+            interaction["usage"] = usage
+        if chunks is not None:
+            interaction["chunks"] = [[round(offset, 4), delta] for offset, delta in chunks]
+        return interaction
+
+    async def _awrite(self, interaction: dict) -> None:
+        # The file write and its lock stay off the event loop.
+        await asyncio.to_thread(self._write, interaction)
+
+    def _replay_result(self, interaction: dict) -> tuple[str, dict[str, int]]:
+        error = interaction.get("error")
+        if error is not None:
+            raise ReplayedError(f"{error['type']}: {error['message']}", error.get("status"))
+        return interaction.get("text") or "", dict(interaction.get("usage") or {})
+
+    def _delay(self, interaction: dict) -> float:
+        return float(interaction.get("latency") or 0.0) * self.latency_scale
+
+    def wrap(
+        self,
+        provider: str,
+        model: str | None,
+        adapter: Completion,
+        params: dict | None = None,
+    ) -> Completion:
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+
+        def _call(messages: list[dict[str, str]], temperature: float) -> tuple[str, dict[str, int]]:
+            key = canonical_key(provider, model, messages, temperature, **params)
+            request = {"messages": messages, "temperature": temperature, **params}
+            if self.mode == "replay":
+                interaction = self._next(key, provider)
+                time.sleep(self._delay(interaction))
+                return self._replay_result(interaction)
+            started = time.monotonic()
+            try:
+                text, usage = adapter(messages, temperature)
+            except Exception as exc:
+                self._write(self._interaction(key, provider, model, request, started, error=exc))
+                raise
+            self._write(self._interaction(key, provider, model, request, started, text, usage))
+            return text, usage
+
+        return _call
+
+    def awrap(
+        self,
+        provider: str,
+        model: str | None,
+        adapter: AsyncCompletion,
+        params: dict | None = None,
+    ) -> AsyncCompletion:
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+
+        async def _call(
+            messages: list[dict[str, str]],
+            temperature: float,
+        ) -> tuple[str, dict[str, int]]:
+            key = canonical_key(provider, model, messages, temperature, **params)
+            request = {"messages": messages, "temperature": temperature, **params}
+            if self.mode == "replay":
+                interaction = self._next(key, provider)
+                await asyncio.sleep(self._delay(interaction))
+                return self._replay_result(interaction)
+            started = time.monotonic()
+            try:
+                text, usage = await adapter(messages, temperature)
+            except Exception as exc:
+                interaction = self._interaction(key, provider, model, request, started, error=exc)
+                await self._awrite(interaction)
+                raise
+            interaction = self._interaction(key, provider, model, request, started, text, usage)
+            await self._awrite(interaction)
+            return text, usage
+
+        return _call
+
+    def wrap_stream(
+        self,
+        provider: str,
+        model: str | None,
+        adapter: StreamCompletion,
+        params: dict | None = None,
+    ) -> StreamCompletion:
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+
+        async def _stream(
+            messages: list[dict[str, str]],
+            temperature: float,
+        ) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+            key = canonical_key(provider, model, messages, temperature, **params)
+            request = {"messages": messages, "temperature": temperature, **params}
+            if self.mode == "replay":
+                async for item in self._replay_stream(self._next(key, provider)):
+                    yield item
+                return
+            started = time.monotonic()
+            chunks: list[tuple[float, str]] = []
+            usage = None
+            try:
+                async for delta, chunk_usage in adapter(messages, temperature):
+                    if delta:
+                        chunks.append((time.monotonic() - started, delta))
+                    if chunk_usage is not None:
+                        usage = chunk_usage
+                    yield delta, chunk_usage
+            except Exception as exc:
+                interaction = self._interaction(
+                    key, provider, model, request, started, error=exc, chunks=chunks
+                )
+                await self._awrite(interaction)
+                raise
+            text = "".join(delta for _, delta in chunks).strip()
+            interaction = self._interaction(
+                key, provider, model, request, started, text, usage, chunks=chunks
+            )
+            await self._awrite(interaction)
+
+        return _stream
+
+    async def _replay_stream(
+        self,
+        interaction: dict,
+    ) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+        # Interactions recorded without streaming replay as a single delta.
+        chunks = interaction.get("chunks")
+        if chunks is None:
+            text = interaction.get("text")
+            chunks = [[interaction.get("latency") or 0.0, text]] if text else []
+        elapsed = 0.0
+        for offset, delta in chunks:
+            await asyncio.sleep(max(0.0, offset * self.latency_scale - elapsed))
+            elapsed = offset * self.latency_scale
+            yield delta, None
+        await asyncio.sleep(max(0.0, self._delay(interaction) - elapsed))
+        _, usage = self._replay_result(interaction)
+        yield "", usage
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "latency_scale": self.latency_scale,
+                "interactions": sum(len(items) for items in self._interactions.values()),
+                "recorded": self._recorded,
+                "replayed": self._replayed,
+                "rewound": self._rewound,
+                "misses": self._misses,
+            }
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+class _Circuit:
+    __slots__ = ("state", "outcomes", "opened_until", "probes", "opened")
+
+    def __init__(self, window: int) -> None:
+        self.state = CLOSED
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.opened_until = 0.0
+        self.probes = 0
+        self.opened = 0
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+        clock=time.monotonic,
+    ) -> None:
+        self.window = max(0, int(window))
+        self.min_calls = max(1, int(min_calls))
+        self.error_rate = float(error_rate)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.open_seconds = float(open_seconds)
+        self.half_open_probes = max(1, int(half_open_probes))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._circuits: dict[str, _Circuit] = {}
+        self._rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def allow(self, key: str) -> bool:
+        if not self.enabled:
+            return True
+        now = self._clock()
+        with self._lock:
+            circuit = self._circuit(key)
+            if circuit.state == OPEN and now >= circuit.opened_until:
+                circuit.state = HALF_OPEN
+                circuit.probes = 0
+            if circuit.state == CLOSED:
+                return True
+            if circuit.state == HALF_OPEN and circuit.probes < self.half_open_probes:
+                circuit.probes += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def check(self, key: str) -> None:
+        if not self.allow(key):
+            raise CircuitOpen(f"Circuit for {key} is open, skipping the call")
+
+    def record(self, key: str, ok: bool | None, latency: float) -> None:
+        # ok=None releases a probe slot without judging the upstream,
+        # e.g. when the call was cut short by our own deadline.
+        if not self.enabled:
+            return
+        if ok and self.slow_call_seconds > 0 and latency >= self.slow_call_seconds:
+            ok = False
+        with self._lock:
+            circuit = self._circuit(key)
+            if circuit.state == HALF_OPEN:
+                circuit.probes = max(0, circuit.probes - 1)
+                if ok is None:
+                    return
+                if ok:
+                    circuit.state = CLOSED
+                    circuit.outcomes.clear()
+                else:
+                    self._open(circuit)
+                return
+            if ok is None or circuit.state != CLOSED:
+                return
+            circuit.outcomes.append(ok)
+            failures = circuit.outcomes.count(False)
+            if (
+                len(circuit.outcomes) >= self.min_calls
+                and failures / len(circuit.outcomes) >= self.error_rate
+            ):
+                self._open(circuit)
+
+    def state(self, key: str) -> str:
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return circuit.state if circuit is not None else CLOSED
+
+    def reset(self) -> None:
+        with self._lock:
+            self._circuits.clear()
+
+    def stats(self) -> dict:
+        now = self._clock()
+        with self._lock:
+            circuits = {}
+            for key, circuit in self._circuits.items():
+                calls = len(circuit.outcomes)
+                circuits[key] = {
+                    "state": circuit.state,
+                    "calls": calls,
+                    "error_rate": round(circuit.outcomes.count(False) / calls, 4) if calls else 0.0,
+                    "opened": circuit.opened,
+                    "retry_in_seconds": (
+                        round(circuit.opened_until - now, 1) if circuit.state == OPEN else 0.0
+                    ),
+                }
+            return {
+                "enabled": self.enabled,
+                "open": sorted(key for key, c in self._circuits.items() if c.state != CLOSED),
+                "rejected": self._rejected,
+                "circuits": circuits,
+            }
+
+    def _circuit(self, key: str) -> _Circuit:
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = _Circuit(self.window)
+            self._circuits[key] = circuit
+        return circuit
+
+    def _open(self, circuit: _Circuit) -> None:
+        circuit.state = OPEN
+        circuit.opened_until = self._clock() + self.open_seconds
+        circuit.outcomes.clear()
+        circuit.probes = 0
+        circuit.opened += 1
@@ -1,5 +1,5 @@
-import logging
 import os
+from functools import cached_property
 from pathlib import Path
 
 
@@ -44,113 +44,423 @@ def _strip_optional_quotes(value: str | None) -> str | None:
     return value
 
 
-# =========================
-# Логи
-# =========================
+_OFF = {"0", "false", "no", "off"}
+_ON = {"1", "true", "yes", "on"}
 
-def configure_logging() -> None:
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(message)s",
-    )
 
+class Settings:
+    # Every value is read from tokens.txt / the environment on first access,
+    # so importing config costs nothing and a missing file only fails when used.
+    def __init__(self, path: str = "tokens.txt") -> None:
+        self.path = path
 
-configure_logging()
-logging.info("🚀 Сервис запускается...")
+    @cached_property
+    def tokens(self) -> dict:
+        return load_tokens(self.path)
 
+    def _setting(self, *keys: str) -> str | None:
+        for key in keys:
+            value = self.tokens.get(key) or os.getenv(key)
+            if value:
+                return _strip_optional_quotes(value.strip())
+        return None
 
-# =========================
-# Токены
-# =========================
+    def _int_setting(self, key: str, default: int) -> int:
+        value = self._setting(key)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise RuntimeError(f"❌ {key} должен быть целым числом, получено: {value}")
+
+    def _float_setting(self, key: str, default: float) -> float:
+        value = self._setting(key)
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            raise RuntimeError(f"❌ {key} должен быть числом, получено: {value}")
+
+    def _flag(self, key: str, default: bool) -> bool:
+        value = (self._setting(key) or "").lower()
+        if not value:
+            return default
+        return value not in _OFF if default else value in _ON
 
-tokens = load_tokens()
-
-DEEPSEEK_API_KEY = tokens.get("DEEPSEEK_API_KEY")
-YANDEX_CLOUD_API_KEY = (
-    tokens.get("YANDEX_CLOUD_API_KEY")
-    or os.getenv("YANDEX_CLOUD_API_KEY")
-)
-YANDEX_PROJECT_ID = (
-    tokens.get("YANDEX_PROJECT_ID")
-    or tokens.get("YANDEX_PROJECT")
-    or os.getenv("YANDEX_PROJECT_ID")
-    or os.getenv("YANDEX_PROJECT")
-)
-YANDEX_PROMPT_ID = (
-    tokens.get("YANDEX_PROMPT_ID")
-    or os.getenv("YANDEX_PROMPT_ID")
-)
-YANDEX_MODEL_ID = (
-    tokens.get("YANDEX_MODEL_ID")
-    or os.getenv("YANDEX_MODEL_ID")
-)
-CLAUDE_API_KEY = (
-    tokens.get("CLAUDE_API_KEY")
-    or tokens.get("CLAUD_API_KEY")
-    or tokens.get("ANTHROPIC_API_KEY")
-    or os.getenv("ANTHROPIC_API_KEY")
-    or os.getenv("CLAUDE_API_KEY")
-)
-CLAUDE_MODEL = tokens.get("CLAUDE_MODEL_ID") or os.getenv("CLAUDE_MODEL") or "claude-3-haiku-20240307"
-CLAUDE_BASE_URL = tokens.get("CLAUDE_BASE_URL") or "https://api.anthropic.com"
-
-HF_MODEL_ID = (
-    tokens.get("HF_MODEL_ID")
-    or tokens.get("HUGGINGFACE_MODEL_ID")
-    or os.getenv("HF_MODEL_ID")
-    or os.getenv("HUGGINGFACE_MODEL_ID")
-    or "MiniMaxAI/MiniMax-M2.1"
-)
-HF_MODEL_TLAMA_ID = _strip_optional_quotes(
-    tokens.get("HF_MODEL_TLAMA_ID")
-    or os.getenv("HF_MODEL_TLAMA_ID")
-    or "Sao10K/L3-8B-Stheno-v3.3-32K:featherless-ai"
-)
-HF_MODEL_MAGNUM_ID = _strip_optional_quotes(
-    tokens.get("HF_MODEL_MAGNUM_ID")
-    or tokens.get("HUGGINGFACE_MODEL_MAGNUM_ID")
-    or os.getenv("HF_MODEL_MAGNUM_ID")
-    or os.getenv("HUGGINGFACE_MODEL_MAGNUM_ID")
-    or "DeepMount00/Llama-3-COT-ITA:featherless-ai"
-)
-HF_TOKEN = (
-    tokens.get("HF_TOKEN")
-    or tokens.get("HUGGINGFACE_TOKEN")
-    or os.getenv("HF_TOKEN")
-    or os.getenv("HUGGINGFACE_TOKEN")
-)
-
-if not DEEPSEEK_API_KEY:
-    raise RuntimeError("❌ DEEPSEEK_API_KEY не найден в tokens.txt")
-
-
-def _validate_yandex_credentials() -> None:
-    provided_any = any(
-        (
-            YANDEX_CLOUD_API_KEY,
-            YANDEX_PROJECT_ID,
-            YANDEX_PROMPT_ID,
-            YANDEX_MODEL_ID,
+    # =========================
+    # Токены
+    # =========================
+
+    @cached_property
+    def DEEPSEEK_API_KEY(self) -> str | None:
+        return self.tokens.get("DEEPSEEK_API_KEY")
+
+    @cached_property
+    def YANDEX_CLOUD_API_KEY(self) -> str | None:
+        return self.tokens.get("YANDEX_CLOUD_API_KEY") or os.getenv("YANDEX_CLOUD_API_KEY")
+
+    @cached_property
+    def YANDEX_PROJECT_ID(self) -> str | None:
+        return (
+            self.tokens.get("YANDEX_PROJECT_ID")
+            or self.tokens.get("YANDEX_PROJECT")
+            or os.getenv("YANDEX_PROJECT_ID")
+            or os.getenv("YANDEX_PROJECT")
         )
-    )
-    if not provided_any:
-        return
-
-    missing = []
-    if not YANDEX_CLOUD_API_KEY:
-        missing.append("YANDEX_CLOUD_API_KEY")
-    if not YANDEX_PROJECT_ID:
-        missing.append("YANDEX_PROJECT_ID/YANDEX_PROJECT")
-    if missing:
-        raise RuntimeError(
-            "❌ Недостаточно данных для Yandex Cloud (REST Assistant API): "
-            f"укажите {', '.join(missing)} в tokens.txt или удалите все YANDEX_* строки."
+
+    @cached_property
+    def YANDEX_PROMPT_ID(self) -> str | None:
+        return self.tokens.get("YANDEX_PROMPT_ID") or os.getenv("YANDEX_PROMPT_ID")
+
+    @cached_property
+    def YANDEX_MODEL_ID(self) -> str | None:
+        return self.tokens.get("YANDEX_MODEL_ID") or os.getenv("YANDEX_MODEL_ID")
+
+    @cached_property
+    def YANDEX_RESPONSE_CHAIN(self) -> bool:
+        return self._flag("YANDEX_RESPONSE_CHAIN", False)
+
+    @cached_property
+    def CLAUDE_API_KEY(self) -> str | None:
+        return (
+            self.tokens.get("CLAUDE_API_KEY")
+            or self.tokens.get("CLAUD_API_KEY")
+            or self.tokens.get("ANTHROPIC_API_KEY")
+            or os.getenv("ANTHROPIC_API_KEY")
+            or os.getenv("CLAUDE_API_KEY")
+        )
+
+    @cached_property
+    def CLAUDE_MODEL(self) -> str:
+        return (
+            self.tokens.get("CLAUDE_MODEL_ID")
+            or os.getenv("CLAUDE_MODEL")
+            or "claude-3-haiku-20240307"
         )
-    if not (YANDEX_PROMPT_ID or YANDEX_MODEL_ID):
-        raise RuntimeError(
-            "❌ Для Yandex Cloud (REST Assistant API) нужно указать "
-            "YANDEX_PROMPT_ID или YANDEX_MODEL_ID в tokens.txt."
+
+    @cached_property
+    def CLAUDE_BASE_URL(self) -> str:
+        return self.tokens.get("CLAUDE_BASE_URL") or "https://api.anthropic.com"
+
+    @cached_property
+    def CLAUDE_PROMPT_CACHE(self) -> bool:
+        return self._flag("CLAUDE_PROMPT_CACHE", True)
+
+    @cached_property
+    def HF_MODEL_ID(self) -> str:
+        return (
+            self.tokens.get("HF_MODEL_ID")
+            or self.tokens.get("HUGGINGFACE_MODEL_ID")
+            or os.getenv("HF_MODEL_ID")
+            or os.getenv("HUGGINGFACE_MODEL_ID")
+            or "MiniMaxAI/MiniMax-M2.1"
         )
 
+    @cached_property
+    def HF_MODEL_TLAMA_ID(self) -> str:
+        return _strip_optional_quotes(
+            self.tokens.get("HF_MODEL_TLAMA_ID")
+            or os.getenv("HF_MODEL_TLAMA_ID")
+            or "Sao10K/L3-8B-Stheno-v3.3-32K:featherless-ai"
+        )
+
+    @cached_property
+    def HF_MODEL_MAGNUM_ID(self) -> str:
+        return _strip_optional_quotes(
+            self.tokens.get("HF_MODEL_MAGNUM_ID")
+            or self.tokens.get("HUGGINGFACE_MODEL_MAGNUM_ID")
+            or os.getenv("HF_MODEL_MAGNUM_ID")
+            or os.getenv("HUGGINGFACE_MODEL_MAGNUM_ID")
+            or "DeepMount00/Llama-3-COT-ITA:featherless-ai"
+        )
+
+    @cached_property
+    def HF_TOKEN(self) -> str | None:
+        return (
+            self.tokens.get("HF_TOKEN")
+            or self.tokens.get("HUGGINGFACE_TOKEN")
+            or os.getenv("HF_TOKEN")
+            or os.getenv("HUGGINGFACE_TOKEN")
+        )
+
+    # =========================
+    # Сессии
+    # =========================
+
+    @cached_property
+    def SESSION_STORE(self) -> str:
+        return self._setting("SESSION_STORE") or "memory"
+
+    @cached_property
+    def SESSION_MAX_ENTRIES(self) -> int:
+        return self._int_setting("SESSION_MAX_ENTRIES", 1000)
+
+    @cached_property
+    def SESSION_MAX_BYTES(self) -> int:
+        return self._int_setting("SESSION_MAX_BYTES", 64 * 1024 * 1024)
+
+    @cached_property
+    def SESSION_IDLE_TTL_SECONDS(self) -> float:
+        return self._float_setting("SESSION_IDLE_TTL_SECONDS", 6 * 3600)
+
+    # =========================
+    # Запросы
+    # =========================
+
+    @cached_property
+    def REQUEST_DEADLINE_SECONDS(self) -> float:
+        return self._float_setting("REQUEST_DEADLINE_SECONDS", 120)
+
+    @cached_property
+    def CLARIFY_DECIDE(self) -> bool:
+        return self._flag("CLARIFY_DECIDE", False)
+
+    @cached_property
+    def CLARIFY_HISTORY_PAIRS(self) -> int:
+        return self._int_setting("CLARIFY_HISTORY_PAIRS", 4)
+
+    @cached_property
+    def CLARIFY_HISTORY_TOKENS(self) -> int:
+        return self._int_setting("CLARIFY_HISTORY_TOKENS", 1000)
+
+    @cached_property
+    def SPECULATIVE_SUMMARY(self) -> bool:
+        return self._flag("SPECULATIVE_SUMMARY", False)
+
+    @cached_property
+    def BATCH_MAX_CONCURRENCY(self) -> int:
+        return self._int_setting("BATCH_MAX_CONCURRENCY", 8)
+
+    # =========================
+    # Лимиты провайдеров
+    # =========================
+
+    @cached_property
+    def RATE_LIMITS(self) -> str | None:
+        return self._setting("RATE_LIMITS")
+
+    @cached_property
+    def RATE_LIMIT_MAX_WAIT_SECONDS(self) -> float:
+        return self._float_setting("RATE_LIMIT_MAX_WAIT_SECONDS", 10)
+
+    @cached_property
+    def CIRCUIT_BREAKER_WINDOW(self) -> int:
+        return self._int_setting("CIRCUIT_BREAKER_WINDOW", 20)
+
+    @cached_property
+    def CIRCUIT_BREAKER_MIN_CALLS(self) -> int:
+        return self._int_setting("CIRCUIT_BREAKER_MIN_CALLS", 5)
+
+    @cached_property
+    def CIRCUIT_BREAKER_ERROR_RATE(self) -> float:
+        return self._float_setting("CIRCUIT_BREAKER_ERROR_RATE", 0.5)
+
+    @cached_property
+    def CIRCUIT_BREAKER_SLOW_CALL_SECONDS(self) -> float:
+        return self._float_setting("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", 30)
+
+    @cached_property
+    def CIRCUIT_BREAKER_OPEN_SECONDS(self) -> float:
+        return self._float_setting("CIRCUIT_BREAKER_OPEN_SECONDS", 30)
+
+    @cached_property
+    def HEDGE_ENABLED(self) -> bool:
+        return self._flag("HEDGE_ENABLED", False)
+
+    @cached_property
+    def HEDGE_PERCENTILE(self) -> float:
+        return self._float_setting("HEDGE_PERCENTILE", 0.95)
+
+    @cached_property
+    def HEDGE_MIN_SAMPLES(self) -> int:
+        return self._int_setting("HEDGE_MIN_SAMPLES", 20)
+
+    @cached_property
+    def HEDGE_BACKUP_PROVIDERS(self) -> str | None:
+        return self._setting("HEDGE_BACKUP_PROVIDERS")
+
+    @cached_property
+    def RETRY_MAX_ATTEMPTS(self) -> int:
+        return self._int_setting("RETRY_MAX_ATTEMPTS", 3)
+
+    @cached_property
+    def RETRY_PROVIDER_ATTEMPTS(self) -> str | None:
+        return self._setting("RETRY_PROVIDER_ATTEMPTS")
+
+    @cached_property
+    def RETRY_BASE_DELAY_SECONDS(self) -> float:
+        return self._float_setting("RETRY_BASE_DELAY_SECONDS", 0.5)
+
+    @cached_property
+    def RETRY_MAX_DELAY_SECONDS(self) -> float:
+        return self._float_setting("RETRY_MAX_DELAY_SECONDS", 8)
+
+    @cached_property
+    def RETRY_BUDGET_RATIO(self) -> float:
+        return self._float_setting("RETRY_BUDGET_RATIO", 0.2)
+
+    # =========================
+    # Кэш ответов
+    # =========================
+
+    @cached_property
+    def RESPONSE_CACHE_MAX_ENTRIES(self) -> int:
+        return self._int_setting("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+
+    @cached_property
+    def RESPONSE_CACHE_TTL_SECONDS(self) -> float:
+        return self._float_setting("RESPONSE_CACHE_TTL_SECONDS", 3600)
+
+    @cached_property
+    def RESPONSE_CACHE_MAX_TEMPERATURE(self) -> float:
+        return self._float_setting("RESPONSE_CACHE_MAX_TEMPERATURE", 0.0)
+
+    @cached_property
+    def RESPONSE_CACHE_PATH(self) -> str | None:
+        return self._setting("RESPONSE_CACHE_PATH")
+
+    @cached_property
+    def SINGLE_FLIGHT_ENABLED(self) -> bool:
+        return self._flag("SINGLE_FLIGHT_ENABLED", True)
+
+    # =========================
+    # Логи ответов моделей
+    # =========================
+
+    @cached_property
+    def RAW_LOG_SAMPLE_RATE(self) -> float:
+        return self._float_setting("RAW_LOG_SAMPLE_RATE", 0.05)
+
+    @cached_property
+    def RAW_LOG_MAX_CHARS(self) -> int:
+        return self._int_setting("RAW_LOG_MAX_CHARS", 4000)
+
+    @cached_property
+    def RAW_LOG_PATH(self) -> str | None:
+        return self._setting("RAW_LOG_PATH")
+
+    # =========================
+    # HTTP
+    # =========================
+
+    @cached_property
+    def HTTP_MAX_CONNECTIONS(self) -> int:
+        return self._int_setting("HTTP_MAX_CONNECTIONS", 100)
+
+    @cached_property
+    def HTTP_MAX_KEEPALIVE_CONNECTIONS(self) -> int:
+        return self._int_setting("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+
+    @cached_property
+    def HTTP_KEEPALIVE_EXPIRY_SECONDS(self) -> float:
+        return self._float_setting("HTTP_KEEPALIVE_EXPIRY_SECONDS", 30)
+
+    @cached_property
+    def HTTP2_ENABLED(self) -> bool:
+        return self._flag("HTTP2_ENABLED", True)
+
+    # =========================
+    # Hugging Face
+    # =========================
+
+    @cached_property
+    def HF_TIER_CACHE_TTL_SECONDS(self) -> float:
+        return self._float_setting("HF_TIER_CACHE_TTL_SECONDS", 900)
+
+    # =========================
+    # Тестовый провайдер
+    # =========================
+
+    @cached_property
+    def FAKE_PROVIDERS(self) -> str | None:
+        return self._setting("FAKE_PROVIDERS")
+
+    @cached_property
+    def FAKE_LATENCY(self) -> str:
+        return self._setting("FAKE_LATENCY") or "lognormal:0.4,0.5"
+
+    @cached_property
+    def FAKE_TOKENS_PER_SECOND(self) -> float:
+        return self._float_setting("FAKE_TOKENS_PER_SECOND", 50)
+
+    @cached_property
+    def FAKE_COMPLETION_TOKENS(self) -> int:
+        return self._int_setting("FAKE_COMPLETION_TOKENS", 80)
+
+    @cached_property
+    def FAKE_ERRORS(self) -> str | None:
+        return self._setting("FAKE_ERRORS")
+
+    @cached_property
+    def FAKE_SEED(self) -> int | None:
+        return self._int_setting("FAKE_SEED", 0) if self._setting("FAKE_SEED") else None
+
+    @cached_property
+    def FAKE_REPLY(self) -> str | None:
+        return self._setting("FAKE_REPLY")
+
+    # =========================
+    # Запись и воспроизведение запросов
+    # =========================
+
+    @cached_property
+    def CASSETTE_MODE(self) -> str | None:
+        value = (self._setting("CASSETTE_MODE") or "").lower()
+        return value if value and value not in _OFF else None
+
+    @cached_property
+    def CASSETTE_PATH(self) -> str:
+        return self._setting("CASSETTE_PATH") or "cassette.jsonl"
+
+    @cached_property
+    def CASSETTE_LATENCY_SCALE(self) -> float:
+        return self._float_setting("CASSETTE_LATENCY_SCALE", 1.0)
+
+    # =========================
+    # Проверка
+    # =========================
+
+    def validate(self) -> None:
+        if not self.DEEPSEEK_API_KEY:
+            raise RuntimeError("❌ DEEPSEEK_API_KEY не найден в tokens.txt")
+        self._validate_yandex_credentials()
+
+    def _validate_yandex_credentials(self) -> None:
+        provided_any = any(
+            (
+                self.YANDEX_CLOUD_API_KEY,
+                self.YANDEX_PROJECT_ID,
+                self.YANDEX_PROMPT_ID,
+                self.YANDEX_MODEL_ID,
+            )
+        )
+        if not provided_any:
+            return
+
+        missing = []
+        if not self.YANDEX_CLOUD_API_KEY:
+            missing.append("YANDEX_CLOUD_API_KEY")
+        if not self.YANDEX_PROJECT_ID:
+            missing.append("YANDEX_PROJECT_ID/YANDEX_PROJECT")
+        if missing:
+            raise RuntimeError(
+                "❌ Недостаточно данных для Yandex Cloud (REST Assistant API): "
+                f"укажите {', '.join(missing)} в tokens.txt или удалите все YANDEX_* строки."
+            )
+        if not (self.YANDEX_PROMPT_ID or self.YANDEX_MODEL_ID):
+            raise RuntimeError(
+                "❌ Для Yandex Cloud (REST Assistant API) нужно указать "
+                "YANDEX_PROMPT_ID или YANDEX_MODEL_ID в tokens.txt."
+            )
+
+
+settings = Settings()
+
 
-_validate_yandex_credentials()
+def __getattr__(name: str):
+    # Keeps `from config import HF_MODEL_ID` working; the value is resolved at that import.
+    if name == "tokens" or isinstance(getattr(Settings, name, None), cached_property):
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
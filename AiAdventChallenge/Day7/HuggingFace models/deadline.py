@@ -0,0 +1,61 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@contextmanager
+def deadline_scope(seconds: float | None):
+    if seconds is None or seconds <= 0:
+        yield
+        return
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        # A nested scope can only shorten the budget of the enclosing request.
+        expires_at = min(expires_at, current)
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            # An async generator closed from another task cannot reset its token;
+            # that task's context is discarded anyway.
+            pass
+
+
+def remaining_budget() -> float | None:
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+def check_deadline(label: str = "request") -> None:
+    remaining = remaining_budget()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {label}")
+
+
+def hop_timeout(limit: float | None = None, label: str = "request") -> float | None:
+    check_deadline(label)
+    remaining = remaining_budget()
+    if remaining is None:
+        return limit
+    if limit is None:
+        return remaining
+    return min(limit, remaining)
+
+
+def deadline_expired() -> bool:
+    remaining = remaining_budget()
+    return remaining is not None and remaining <= 0
@@ -0,0 +1,464 @@
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+FAKE_MODEL = "fake-model"
+
+_LATENCY_ARGS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+_WORDS = (
+    "модель", "ответ", "контекст", "запрос", "уточнение", "данные", "вариант",
+    "решение", "пример", "итог", "вопрос", "задача", "шаг", "проверка",
+)
+
+
+class FakeStatusError(RuntimeError):
+    # Shaped like the SDK errors: retry, breaker and rate limiter read
+    # `status_code` and `response.headers` the same way.
+    def __init__(self, status: int, message: str, retry_after: float | None = None) -> None:
+        super().__init__(f"Error code: {status} - {message}")
+        self.status_code = status
+        headers = {} if retry_after is None else {"retry-after": f"{retry_after:g}"}
+        self.response = SimpleNamespace(status_code=status, headers=headers)
+
+
+class FakeTimeout(TimeoutError):
+    pass
+
+
+def parse_latency(raw: str | None) -> tuple[str, tuple[float, ...]]:
+    name, _, args_text = (raw or "fixed:0").strip().partition(":")
+    name = name.strip().lower()
+    try:
+        args = tuple(float(value) for value in args_text.split(",") if value.strip())
+    except ValueError:
+        args = ()
+    if _LATENCY_ARGS.get(name) != len(args) or any(value < 0 for value in args):
+        raise RuntimeError(
+            f"❌ Неверный формат FAKE_LATENCY: {raw} "
+            "(ожидается fixed:S, uniform:A,B, normal:MEAN,SD или lognormal:MEDIAN,SIGMA)"
+        )
+    return name, args
+
+
+def parse_faults(raw: str | None) -> dict[str, dict[str, float]]:
+    # "429=0.05,500=0.02,huggingface:empty=0.3" -> rates for every group ("*")
+    # plus overrides for one group.
+    faults: dict[str, dict[str, float]] = {}
+    if not raw:
+        return faults
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        group, _, fault = key.strip().rpartition(":")
+        fault = fault.strip().lower()
+        try:
+            rate = float(value)
+        except ValueError:
+            rate = -1.0
+        if not sep or not (fault == "empty" or fault.isdigit()) or not 0 <= rate <= 1:
+            raise RuntimeError(
+                f"❌ Неверный формат FAKE_ERRORS: {item} (ожидается [provider:]429|5xx|empty=доля)"
+            )
+        faults.setdefault(group.strip() or "*", {})[fault] = rate
+    return faults
+
+
+class _Plan:
+    __slots__ = (
+        "delay",
+        "first_token",
+        "token_delay",
+        "error",
+        "text",
+        "prompt_tokens",
+        "completion_tokens",
+    )
+
+    def chunks(self) -> list[str]:
+        if not self.text:
+            return []
+        words = self.text.split(" ")
+        return [" ".join(words[i:i + 4]) + " " for i in range(0, len(words), 4)]
+
+
+class FakeBackend:
+    def __init__(
+        self,
+        latency: str | None = None,
+        tokens_per_second: float = 50.0,
+        completion_tokens: int = 80,
+        faults: dict[str, dict[str, float]] | None = None,
+        seed: int | None = None,
+        reply: str | None = None,
+    ) -> None:
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = max(0.0, float(tokens_per_second))
+        self.completion_tokens = max(1, int(completion_tokens))
+        self.faults = dict(faults or {})
+        self.reply = reply
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls: Counter[str] = Counter()
+        self._faults: Counter[str] = Counter()
+        self._tokens = 0
+
+    def _sample(self) -> tuple[float, float]:
+        name, args = self.latency
+        with self._lock:
+            if name == "fixed":
+                first = args[0]
+            elif name == "uniform":
+                first = self._random.uniform(min(args), max(args))
+            elif name == "normal":
+                first = self._random.gauss(args[0], args[1])
+            else:
+                first = self._random.lognormvariate(math.log(max(args[0], 1e-6)), args[1])
+            roll = self._random.random()
+        return max(0.0, first), roll
+
+    def _fault(self, group: str, roll: float) -> str | None:
+        rates = {**self.faults.get("*", {}), **self.faults.get(group, {})}
+        for fault, rate in rates.items():
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def plan(
+        self,
+        group: str,
+        prompt: str,
+        max_tokens: int | None = None,
+        timeout: float | None = None,
+    ) -> _Plan:
+        first, roll = self._sample()
+        fault = self._fault(group, roll)
+        plan = _Plan()
+        plan.prompt_tokens = max(1, len(prompt) // 4)
+        plan.token_delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        plan.error = None
+        if fault == "empty":
+            plan.text = ""
+        else:
+            plan.text = self._text(max_tokens)
+        plan.completion_tokens = len(plan.text.split()) if plan.text else 0
+        plan.first_token = first
+        plan.delay = first + plan.completion_tokens * plan.token_delay
+        if fault is not None and fault != "empty":
+            status = int(fault)
+            # A throttled request is refused up front; a server error costs the full wait.
+            plan.delay = first * 0.1 if status == 429 else first
+            plan.first_token = plan.delay
+            retry_after = 1.0 if status == 429 else None
+            plan.error = FakeStatusError(status, "fake provider fault", retry_after)
+        if timeout is not None and plan.delay > timeout:
+            plan.delay = plan.first_token = timeout
+            plan.error = FakeTimeout(f"fake {group} call timed out after {timeout:.2f}s")
+        with self._lock:
+            self._calls[group] += 1
+            if plan.error is not None or fault == "empty":
+                self._faults[type(plan.error).__name__ if fault is None else fault] += 1
+            else:
+                self._tokens += plan.prompt_tokens + plan.completion_tokens
+        return plan
+
+    def _text(self, max_tokens: int | None) -> str:
+        if self.reply is not None:
+            return self.reply
+        with self._lock:
+            count = max(1, round(self.completion_tokens * self._random.uniform(0.5, 1.5)))
+            if max_tokens:
+                count = min(count, int(max_tokens))
+            return " ".join(self._random.choice(_WORDS) for _ in range(count)) + "."
+
+    def stats(self) -> dict:
+        name, args = self.latency
+        with self._lock:
+            return {
+                "latency": f"{name}:{','.join(f'{value:g}' for value in args)}",
+                "tokens_per_second": self.tokens_per_second,
+                "calls": dict(self._calls),
+                "faults": dict(self._faults),
+                "tokens": self._tokens,
+            }
+
+
+def _finish(plan: _Plan) -> _Plan:
+    time.sleep(plan.delay)
+    if plan.error is not None:
+        raise plan.error
+    return plan
+
+
+async def _afinish(plan: _Plan) -> _Plan:
+    await asyncio.sleep(plan.delay)
+    if plan.error is not None:
+        raise plan.error
+    return plan
+
+
+def _messages_text(messages) -> str:
+    parts = []
+    for message in messages or []:
+        content = message.get("content", "")
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        parts.append(content)
+    return "\n".join(parts)
+
+
+def _openai_usage(plan: _Plan) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_tokens=plan.prompt_tokens,
+        completion_tokens=plan.completion_tokens,
+        total_tokens=plan.prompt_tokens + plan.completion_tokens,
+    )
+
+
+def _responses_usage(plan: _Plan) -> SimpleNamespace:
+    return SimpleNamespace(
+        input_tokens=plan.prompt_tokens,
+        output_tokens=plan.completion_tokens,
+        total_tokens=plan.prompt_tokens + plan.completion_tokens,
+    )
+
+
+def _chat_response(plan: _Plan, model: str | None) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=f"fake-{id(plan):x}",
+        model=model or FAKE_MODEL,
+        choices=[
+            SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content=plan.text),
+                finish_reason="stop",
+            )
+        ],
+        usage=_openai_usage(plan),
+    )
+
+
+def _responses_response(plan: _Plan, model: str | None) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=f"fake-resp-{id(plan):x}",
+        model=model or FAKE_MODEL,
+        output_text=plan.text,
+        output=[],
+        usage=_responses_usage(plan),
+    )
+
+
+def _chat_chunk(text: str | None, usage: SimpleNamespace | None = None) -> SimpleNamespace:
+    if text is None:
+        return SimpleNamespace(choices=[], usage=usage)
+    delta = SimpleNamespace(content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)], usage=usage)
+
+
+async def _adeltas(plan: _Plan):
+    await asyncio.sleep(plan.first_token)
+    if plan.error is not None:
+        raise plan.error
+    for chunk in plan.chunks():
+        await asyncio.sleep(len(chunk.split()) * plan.token_delay)
+        yield chunk
+
+
+class _ChatCompletions:
+    def __init__(self, owner: "_FakeOpenAI") -> None:
+        self._owner = owner
+
+    def create(self, model=None, messages=None, stream=False, timeout=None, max_tokens=None, **_):
+        prompt = _messages_text(messages)
+        plan = self._owner.backend.plan(self._owner.group, prompt, max_tokens, timeout)
+        if self._owner.is_async:
+            return self._acreate(plan, model, stream)
+        if stream:
+            raise RuntimeError("Fake sync client does not stream")
+        return _chat_response(_finish(plan), model)
+
+    async def _acreate(self, plan: _Plan, model: str | None, stream: bool):
+        if not stream:
+            return _chat_response(await _afinish(plan), model)
+
+        async def _events():
+            async for text in _adeltas(plan):
+                yield _chat_chunk(text)
+            yield _chat_chunk(None, _openai_usage(plan))
+
+        return _events()
+
+
+class _Responses:
+    def __init__(self, owner: "_FakeOpenAI") -> None:
+        self._owner = owner
+
+    def create(self, model=None, input="", stream=False, timeout=None, max_output_tokens=None, **_):
+        prompt = input if isinstance(input, str) else _messages_text(input)
+        plan = self._owner.backend.plan(self._owner.group, prompt, max_output_tokens, timeout)
+        if self._owner.is_async:
+            return self._acreate(plan, model, stream)
+        if stream:
+            raise RuntimeError("Fake sync client does not stream")
+        return _responses_response(_finish(plan), model)
+
+    async def _acreate(self, plan: _Plan, model: str | None, stream: bool):
+        if not stream:
+            return _responses_response(await _afinish(plan), model)
+
+        async def _events():
+            async for text in _adeltas(plan):
+                yield SimpleNamespace(type="response.output_text.delta", delta=text)
+            response = _responses_response(plan, model)
+            yield SimpleNamespace(type="response.completed", response=response)
+
+        return _events()
+
+
+class _FakeOpenAI:
+    def __init__(self, backend: FakeBackend, group: str, is_async: bool) -> None:
+        self.backend = backend
+        self.group = group
+        self.is_async = is_async
+        self.max_retries = 0
+        self.chat = SimpleNamespace(completions=_ChatCompletions(self))
+        self.responses = _Responses(self)
+
+
+def _claude_message(plan: _Plan, model: str | None) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=f"fake-msg-{id(plan):x}",
+        model=model or FAKE_MODEL,
+        content=[SimpleNamespace(type="text", text=plan.text)] if plan.text else [],
+        stop_reason="end_turn",
+        usage=SimpleNamespace(
+            input_tokens=plan.prompt_tokens,
+            output_tokens=plan.completion_tokens,
+        ),
+    )
+
+
+def _claude_prompt(messages, system) -> str:
+    if isinstance(system, list):
+        system_text = "\n".join(block.get("text", "") for block in system)
+    else:
+        system_text = system
+    return "\n".join(filter(None, [system_text, _messages_text(messages)]))
+
+
+class _ClaudeStream:
+    def __init__(self, plan: _Plan, model: str | None) -> None:
+        self._plan = plan
+        self._model = model
+
+    async def __aenter__(self) -> "_ClaudeStream":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+    @property
+    def text_stream(self):
+        return _adeltas(self._plan)
+
+    async def get_final_message(self) -> SimpleNamespace:
+        return _claude_message(self._plan, self._model)
+
+
+class _Messages:
+    def __init__(self, owner: "_FakeAnthropic") -> None:
+        self._owner = owner
+
+    def _plan(self, messages, system, max_tokens, timeout) -> _Plan:
+        return self._owner.backend.plan(
+            self._owner.group, _claude_prompt(messages, system), max_tokens, timeout
+        )
+
+    def create(self, model=None, messages=None, system=None, max_tokens=None, timeout=None, **_):
+        plan = self._plan(messages, system, max_tokens, timeout)
+        if self._owner.is_async:
+            return self._acreate(plan, model)
+        return _claude_message(_finish(plan), model)
+
+    async def _acreate(self, plan: _Plan, model: str | None) -> SimpleNamespace:
+        return _claude_message(await _afinish(plan), model)
+
+    def stream(self, model=None, messages=None, system=None, max_tokens=None, timeout=None, **_):
+        return _ClaudeStream(self._plan(messages, system, max_tokens, timeout), model)
+
+
+class _FakeAnthropic:
+    def __init__(self, backend: FakeBackend, group: str, is_async: bool) -> None:
+        self.backend = backend
+        self.group = group
+        self.is_async = is_async
+        self.max_retries = 0
+        self.messages = _Messages(self)
+
+
+class _FakeInference:
+    # InferenceClient takes its timeout as an attribute; ai_client sets it on a copy.
+    def __init__(self, backend: FakeBackend, group: str, is_async: bool, provider: str) -> None:
+        self.backend = backend
+        self.group = group
+        self.is_async = is_async
+        self.provider = provider
+        self.timeout: float | None = None
+
+    def chat_completion(self, messages=None, model=None, max_tokens=None, **_):
+        plan = self.backend.plan(self.group, _messages_text(messages), max_tokens, self.timeout)
+        if self.is_async:
+            return self._achat(plan, model)
+        return self._chat_result(_finish(plan), model)
+
+    async def _achat(self, plan: _Plan, model: str | None) -> SimpleNamespace:
+        return self._chat_result(await _afinish(plan), model)
+
+    def _chat_result(self, plan: _Plan, model: str | None) -> SimpleNamespace:
+        # huggingface_hub returns dict-like messages, which ai_client reads with .get().
+        response = _chat_response(plan, model)
+        response.choices[0].message = {"role": "assistant", "content": plan.text}
+        return response
+
+    def text_generation(self, prompt="", model=None, details=False, max_new_tokens=None, **_):
+        plan = self.backend.plan(self.group, prompt, max_new_tokens, self.timeout)
+        if self.is_async:
+            return self._agenerate(plan, details)
+        return self._generation_result(_finish(plan), details)
+
+    async def _agenerate(self, plan: _Plan, details: bool):
+        return self._generation_result(await _afinish(plan), details)
+
+    def _generation_result(self, plan: _Plan, details: bool):
+        if not details:
+            return plan.text
+        return SimpleNamespace(
+            generated_text=plan.text,
+            details=SimpleNamespace(
+                generated_tokens=plan.completion_tokens,
+                prefill=[None] * plan.prompt_tokens,
+            ),
+        )
+
+
+def fake_client(
+    backend: FakeBackend,
+    kind: str,
+    group: str,
+    is_async: bool = False,
+    provider: str = "auto",
+):
+    if kind == "openai":
+        return _FakeOpenAI(backend, group, is_async)
+    if kind == "anthropic":
+        return _FakeAnthropic(backend, group, is_async)
+    if kind == "inference":
+        return _FakeInference(backend, group, is_async, provider)
+    raise RuntimeError(f"Unknown fake client kind: {kind}")
@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def parse_backup_providers(raw: str | None) -> dict[str, str]:
+    backups: dict[str, str] = {}
+    if not raw:
+        return backups
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise RuntimeError(
+                f"❌ Неверный формат HEDGE_BACKUP_PROVIDERS: {item} (ожидается provider=backup)"
+            )
+        provider, backup = item.split("=", 1)
+        backups[provider.strip()] = backup.strip()
+    return backups
+
+
+class Hedger:
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+        backups: dict[str, str] | None = None,
+        max_workers: int = 16,
+    ) -> None:
+        self.percentile = min(max(float(percentile), 0.0), 1.0)
+        self.min_samples = max(1, int(min_samples))
+        self.window = max(self.min_samples, int(window))
+        self.backups = dict(backups or {})
+        self._max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque[float]] = {}
+        self._in_flight = 0
+        self._calls = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._saturated = 0
+
+    def backup_for(self, provider: str) -> str:
+        return self.backups.get(provider, provider)
+
+    def delay(self, provider: str) -> float | None:
+        with self._lock:
+            return self._delay_locked(provider)
+
+    def observe(self, provider: str, latency: float) -> None:
+        with self._lock:
+            samples = self._latencies.get(provider)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._latencies[provider] = samples
+            samples.append(latency)
+
+    def run(
+        self,
+        provider: str,
+        primary: Callable[[], T],
+        backup: Callable[[], T],
+    ) -> T:
+        delay = self.delay(provider)
+        self._count_call()
+        started = time.monotonic()
+        if delay is None:
+            result = primary()
+            self.observe(provider, time.monotonic() - started)
+            return result
+
+        # Calls only go to the pool while it has a free worker, so neither the
+        # primary nor its hedge ever waits in the queue behind other calls.
+        first = self._submit(primary)
+        if first is None:
+            result = primary()
+            self.observe(provider, time.monotonic() - started)
+            return result
+        done, _ = wait([first], timeout=delay)
+        if done:
+            result = first.result()
+            self.observe(provider, time.monotonic() - started)
+            return result
+
+        second = self._submit(backup)
+        if second is None:
+            result = first.result()
+            self.observe(provider, time.monotonic() - started)
+            return result
+        self._count_hedge()
+        pending: set[Future] = {first, second}
+        error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    if future is first or error is None:
+                        error = future.exception()
+                    continue
+                # A thread cannot be interrupted; the losing call finishes in the
+                # background and its result is dropped.
+                for other in pending:
+                    other.cancel()
+                self._settle(provider, started, hedge_won=future is second)
+                return future.result()
+        raise error
+
+    async def arun(
+        self,
+        provider: str,
+        primary: Callable[[], Awaitable[T]],
+        backup: Callable[[], Awaitable[T]],
+    ) -> T:
+        delay = self.delay(provider)
+        self._count_call()
+        started = time.monotonic()
+        if delay is None:
+            result = await primary()
+            self.observe(provider, time.monotonic() - started)
+            return result
+
+        first = asyncio.ensure_future(primary())
+        second: asyncio.Future | None = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                result = first.result()
+                self.observe(provider, time.monotonic() - started)
+                return result
+
+            self._count_hedge()
+            second = asyncio.ensure_future(backup())
+            pending = {first, second}
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        if task is first or error is None:
+                            error = task.exception()
+                        continue
+                    self._settle(provider, started, hedge_won=task is second)
+                    return task.result()
+            raise error
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "hedged": self._hedged,
+                "hedge_rate": round(self._hedged / self._calls, 4) if self._calls else 0.0,
+                "hedge_wins": self._hedge_wins,
+                "saturated": self._saturated,
+                "hedge_win_rate": (
+                    round(self._hedge_wins / self._hedged, 4) if self._hedged else 0.0
+                ),
+                "backups": dict(self.backups),
+                "delays": {
+                    provider: round(delay, 3)
+                    for provider in list(self._latencies)
+                    if (delay := self._delay_locked(provider)) is not None
+                },
+            }
+
+    def _delay_locked(self, provider: str) -> float | None:
+        samples = self._latencies.get(provider)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def _settle(self, provider: str, started: float, hedge_won: bool) -> None:
+        # When the hedge wins, the primary's elapsed time is only a lower bound
+        # of its latency, but it still keeps the percentile honest.
+        self.observe(provider, time.monotonic() - started)
+        if hedge_won:
+            with self._lock:
+                self._hedge_wins += 1
+
+    def _count_call(self) -> None:
+        with self._lock:
+            self._calls += 1
+
+    def _count_hedge(self) -> None:
+        with self._lock:
+            self._hedged += 1
+
+    def _submit(self, call: Callable[[], T]) -> Future | None:
+        with self._lock:
+            if self._in_flight >= self._max_workers:
+                self._saturated += 1
+                return None
+            self._in_flight += 1
+        future = self._get_executor().submit(contextvars.copy_context().run, call)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._max_workers,
+                        thread_name_prefix="hedge",
+                    )
+        return self._executor
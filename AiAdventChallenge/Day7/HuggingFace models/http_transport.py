@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import threading
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+if TYPE_CHECKING:
+    import httpx
+
+_log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_http_client: httpx.Client | None = None
+_settings = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "http2": True,
+}
+
+
+class LoopLocal(Generic[T]):
+    # One value per running event loop. Async clients keep pooled connections
+    # bound to the loop that opened them, so a later asyncio.run() must not
+    # reuse them; values of closed loops are dropped on the next lookup.
+    __slots__ = ("_lock", "_values")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._values: dict[asyncio.AbstractEventLoop, T] = {}
+
+    def get(self, factory: Callable[[], T]) -> T:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for closed in [key for key in self._values if key.is_closed()]:
+                del self._values[closed]
+            value = self._values.get(loop)
+            if value is None:
+                value = self._values[loop] = factory()
+            return value
+
+    def pop(self) -> T | None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            return self._values.pop(loop, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(1 for loop in self._values if not loop.is_closed())
+
+
+_async_http_clients: LoopLocal[httpx.AsyncClient] = LoopLocal()
+
+
+def configure_transport(
+    max_connections: int | None = None,
+    max_keepalive_connections: int | None = None,
+    keepalive_expiry: float | None = None,
+    http2: bool | None = None,
+) -> None:
+    with _lock:
+        if _http_client is not None or len(_async_http_clients):
+            raise RuntimeError("HTTP transport is already initialized")
+        for key, value in (
+            ("max_connections", max_connections),
+            ("max_keepalive_connections", max_keepalive_connections),
+            ("keepalive_expiry", keepalive_expiry),
+            ("http2", http2),
+        ):
+            if value is not None:
+                _settings[key] = value
+
+
+def _http2_enabled() -> bool:
+    if not _settings["http2"]:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        _log.info("h2 is not installed, HTTP/2 is disabled for provider clients")
+        return False
+    return True
+
+
+def _limits(module=None) -> httpx.Limits:
+    if module is None:
+        import httpx as module
+
+    return module.Limits(
+        max_connections=_settings["max_connections"],
+        max_keepalive_connections=_settings["max_keepalive_connections"],
+        keepalive_expiry=_settings["keepalive_expiry"],
+    )
+
+
+def get_http_client() -> httpx.Client:
+    import httpx
+
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    http2=_http2_enabled(),
+                    limits=_limits(),
+                    follow_redirects=True,
+                )
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    import httpx
+
+    return _async_http_clients.get(
+        lambda: httpx.AsyncClient(
+            http2=_http2_enabled(),
+            limits=_limits(),
+            follow_redirects=True,
+        )
+    )
+
+
+def _hub_client_factory():
+    from huggingface_hub.utils import _http as hub_http
+
+    # huggingface_hub 2.x talks httpx2 and 1.x plain httpx, so the client is built
+    # with whichever module the hub imported, keeping its request hook.
+    module = getattr(hub_http, "httpx2", None) or hub_http.httpx
+    hook = getattr(hub_http, "hf_request_event_hook", None)
+
+    def _factory():
+        return module.Client(
+            event_hooks={"request": [hook] if hook else []},
+            http2=_http2_enabled(),
+            limits=_limits(module),
+            follow_redirects=True,
+            timeout=None,
+        )
+
+    return _factory
+
+
+def install_huggingface_transport() -> None:
+    try:
+        import huggingface_hub
+    except ImportError:  # pragma: no cover - optional dependency
+        return
+    # huggingface_hub >= 1.0 accepts client factories; the hub caches the sync
+    # client and closes it itself, so it gets a pooled client of its own. The
+    # async factory is left alone: every AsyncInferenceClient enters and closes
+    # the client it gets, which a shared client cannot survive.
+    if hasattr(huggingface_hub, "set_client_factory"):
+        huggingface_hub.set_client_factory(_hub_client_factory())
+        return
+    if hasattr(huggingface_hub, "configure_http_backend"):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        def _session_factory() -> requests.Session:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=_settings["max_keepalive_connections"],
+                pool_maxsize=_settings["max_connections"],
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            return session
+
+        huggingface_hub.configure_http_backend(backend_factory=_session_factory)
+
+
+def transport_stats() -> dict:
+    return {
+        "initialized": _http_client is not None,
+        "async_clients": len(_async_http_clients),
+        **_settings,
+    }
+
+
+async def aclose_transport() -> None:
+    global _http_client
+    with _lock:
+        client = _http_client
+        _http_client = None
+    async_client = _async_http_clients.pop()
+    if async_client is not None:
+        await async_client.aclose()
+    if client is not None:
+        client.close()
@@ -0,0 +1,66 @@
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+DEFAULT_MODULES = ("web_app", "ai_client", "config")
+LAZY_MODULES = ("openai", "anthropic", "huggingface_hub", "httpx")
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> tuple[dict[str, tuple[int, int]], int]:
+    # A fresh interpreter per module, so nothing is already in sys.modules.
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    timings: dict[str, tuple[int, int]] = {}
+    total = 0
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        timings[name] = (int(self_us), int(cumulative_us))
+        if name == module and len(indent) == 1:
+            total = int(cumulative_us)
+    return timings, total
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time report for the web app modules")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if a module is slower")
+    parser.add_argument(
+        "--allow-eager",
+        action="store_true",
+        help=f"do not fail when {', '.join(LAZY_MODULES)} are imported eagerly",
+    )
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        timings, total = measure(module)
+        print(f"{module}: {total / 1000:.1f} ms cumulative, {len(timings)} modules")
+        slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (self_us, cumulative_us) in slowest[: args.top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:7.1f} ms self  {name}")
+        eager = [name for name in LAZY_MODULES if name in timings]
+        if eager and not args.allow_eager:
+            print(f"  FAIL: imported at startup: {', '.join(eager)}")
+            failed = True
+        if args.max_ms is not None and total / 1000 > args.max_ms:
+            print(f"  FAIL: {total / 1000:.1f} ms exceeds budget of {args.max_ms:.1f} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,33 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
 import json
+import logging
 import re
-from ai_client import chat_completion, DEFAULT_PROVIDER
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor, wait
+from ai_client import (
+    achat_completion,
+    astream_chat_completion,
+    chains_responses,
+    chat_completion,
+    DEFAULT_PROVIDER,
+    estimate_text_tokens,
+    generation_limits,
+    response_chain,
+)
+from config import settings
+from deadline import DeadlineExceeded, deadline_scope, hop_timeout
+from speculation import AsyncSpeculation, Speculation
 from prompts import (
     SYSTEM_PROMPT,
     SUMMARY_PROMPT,
+    DECIDE_PROMPT,
+    FOLD_PROMPT,
+    QUESTION_PROMPT,
     MATHEMATICIAN_PROMPT,
     PHILOSOPHER_PROMPT,
     CREATIVE_PROMPT,
@@ -12,6 +36,7 @@ from prompts import (
 
 
 CLARIFY_STATE_KEY = "clarify_state"
+RESPONSE_CHAIN_KEY = "response_chain"
 JSON_MODE_KEY = "json_mode"
 JSON_MODE_PRETTY = "pretty"
 JSON_MODE_CLEAN = "clean"
@@ -28,6 +53,35 @@ HUGGINGFACE_MAGNUM_TEMPERATURE = 0.6
 HUGGINGFACE_TINYLLAMA_TEMPERATURE = 0.6
 DISCUSSION_TEMPERATURE = 0.5
 REFEREE_TEMPERATURE = 0.5
+DISCUSSION_EXPERT_TIMEOUT_SECONDS = 60.0
+DISCUSSION_TIMEOUT_TEXT = "Эксперт не успел ответить."
+FOLD_CACHE_SIZE = 256
+PLAIN_QUESTION_MAX_CHARS = 300
+# Output cap and stop sequences per call site: (max tokens, stop sequences).
+# Only the question-only clarifier is short; calls that may produce the answer
+# itself keep the adapters' own limits.
+GENERATION_PROFILES = {
+    "clarifier": (300, ("Исходный запрос:", "Уже заданные вопросы:")),
+    "decider": (None, ()),
+    "summarizer": (None, ()),
+    "compactor": (512, ()),
+    "expert": (None, ()),
+    "referee": (None, ()),
+}
+
+_log = logging.getLogger(__name__)
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+_LIST_ITEM = re.compile(r"^\s*(\d+[\).]|[-–•])\s+")
+
+# Running summaries of folded clarification pairs, keyed by the pairs they cover.
+_fold_cache: OrderedDict[str, str] = OrderedDict()
+_fold_lock = threading.Lock()
+
+
+def _profile(name: str):
+    max_tokens, stop = GENERATION_PROFILES[name]
+    return generation_limits(max_tokens, stop)
 
 
 def _temperature_for_provider(provider: str) -> float:
@@ -57,42 +111,377 @@ def normalize_lines(text: str) -> list[str]:
     return lines
 
 
-def generate_next_question(
+def _role_messages(system_prompt: str, text: str) -> list[dict[str, str]]:
+    # Every request starts with its static prompt and nothing per-call before it,
+    # so DeepSeek context caching and Claude prompt caching can reuse the prefix.
+    return [
+        {
+            "role": "system",
+            "content": system_prompt,
+        },
+        {
+            "role": "user",
+            "content": text,
+        },
+    ]
+
+
+def _add_usage(usage: dict[str, int], extra: dict[str, int]) -> dict[str, int]:
+    if not extra:
+        return usage
+    return {key: usage.get(key, 0) + extra.get(key, 0) for key in {**usage, **extra}}
+
+
+def _history_messages(
     original: str,
     qas: list[dict[str, str]],
     asked: list[str],
+    system_prompt: str,
+    summary: str = "",
+) -> list[dict[str, str]]:
+    history = f"Ранее выяснено:\n{summary}\n" if summary else ""
+    return _role_messages(
+        system_prompt,
+        f"Исходный запрос: {original}\n"
+        f"{history}"
+        f"Диалог уточнений (вопрос/ответ): {json.dumps(qas, ensure_ascii=False)}\n"
+        f"Уже заданные вопросы: {json.dumps(asked, ensure_ascii=False)}",
+    )
+
+
+def _split_history(
+    qas: list[dict[str, str]],
     provider: str = DEFAULT_PROVIDER,
-    system_prompt: str = SYSTEM_PROMPT,
-    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
-) -> tuple[str | None, dict[str, int]]:
-    response_text, usage = chat_completion(
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {
-                "role": "user",
-                "content": (
-                    f"Исходный запрос: {original}\n"
-                    f"Диалог уточнений (вопрос/ответ): {json.dumps(qas, ensure_ascii=False)}\n"
-                    f"Уже заданные вопросы: {json.dumps(asked, ensure_ascii=False)}"
-                ),
-            },
-        ],
-        provider=provider,
-        temperature=temperature,
+) -> tuple[list[dict[str, str]], list[dict[str, str]]]:
+    # Returns (older pairs to fold into a summary, recent pairs sent verbatim).
+    # Nothing is folded while the whole history fits in CLARIFY_HISTORY_TOKENS.
+    budget = settings.CLARIFY_HISTORY_TOKENS
+
+    def _size(pairs: list[dict[str, str]]) -> int:
+        return estimate_text_tokens(json.dumps(pairs, ensure_ascii=False), provider)
+
+    if budget <= 0 or _size(qas) <= budget:
+        return [], list(qas)
+    split = max(0, len(qas) - max(1, settings.CLARIFY_HISTORY_PAIRS))
+    while split < len(qas) - 1 and _size(qas[split:]) > budget:
+        split += 1
+    return list(qas[:split]), list(qas[split:])
+
+
+def _fold_key(original: str, pairs: list[dict[str, str]]) -> str:
+    raw = json.dumps([original, pairs], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cached_fold(original: str, older: list[dict[str, str]]) -> tuple[str, int]:
+    # Returns the summary of the longest already folded prefix and how many pairs
+    # it covers, so each turn only folds the pairs that left the window since.
+    keys = [_fold_key(original, older[:end]) for end in range(len(older), 0, -1)]
+    with _fold_lock:
+        for index, key in enumerate(keys):
+            summary = _fold_cache.get(key)
+            if summary is not None:
+                _fold_cache.move_to_end(key)
+                return summary, len(older) - index
+    return "", 0
+
+
+def _store_fold(original: str, older: list[dict[str, str]], summary: str) -> None:
+    key = _fold_key(original, older)
+    with _fold_lock:
+        _fold_cache[key] = summary
+        _fold_cache.move_to_end(key)
+        while len(_fold_cache) > FOLD_CACHE_SIZE:
+            _fold_cache.popitem(last=False)
+
+
+def _fold_messages(
+    original: str,
+    summary: str,
+    pairs: list[dict[str, str]],
+) -> list[dict[str, str]]:
+    return _role_messages(
+        FOLD_PROMPT,
+        f"Исходный запрос: {original}\n"
+        f"Сводка: {summary or '—'}\n"
+        f"Новые уточнения (вопрос/ответ): {json.dumps(pairs, ensure_ascii=False)}",
     )
+
+
+def _fold_history(
+    original: str,
+    older: list[dict[str, str]],
+    provider: str,
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    summary, folded = _cached_fold(original, older)
+    if folded == len(older):
+        return summary, {}
+    with _profile("compactor"):
+        response_text, usage = chat_completion(
+            messages=_fold_messages(original, summary, older[folded:]),
+            provider=provider,
+            temperature=temperature,
+        )
+    summary = response_text.strip()
+    if summary:
+        _store_fold(original, older, summary)
+    return summary, usage
+
+
+async def _afold_history(
+    original: str,
+    older: list[dict[str, str]],
+    provider: str,
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    summary, folded = _cached_fold(original, older)
+    if folded == len(older):
+        return summary, {}
+    with _profile("compactor"):
+        response_text, usage = await achat_completion(
+            messages=_fold_messages(original, summary, older[folded:]),
+            provider=provider,
+            temperature=temperature,
+        )
+    summary = response_text.strip()
+    if summary:
+        _store_fold(original, older, summary)
+    return summary, usage
+
+
+def _dialog_messages(
+    original: str,
+    qas: list[dict[str, str]],
+    system_prompt: str,
+) -> list[dict[str, str]]:
+    # Providers that keep the conversation server-side get it turn by turn, so
+    # each request only has to carry the latest answer.
+    messages = _role_messages(system_prompt, f"Исходный запрос: {original}")
+    for qa in qas:
+        messages.append({"role": "assistant", "content": qa.get("question", "")})
+        messages.append({"role": "user", "content": qa.get("answer", "")})
+    return messages
+
+
+def _clarify_messages(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    provider: str,
+    system_prompt: str,
+) -> list[dict[str, str]]:
+    if chains_responses(provider):
+        return _dialog_messages(original, qas, system_prompt)
+    return _history_messages(original, qas, asked, system_prompt)
+
+
+def _questions_only(
+    messages: list[dict[str, str]],
+    system_prompt: str,
+) -> list[dict[str, str]]:
+    # The clarifier's short cap and stop sequences are only safe while the reply
+    # is limited to questions, whatever the system prompt would otherwise allow.
+    messages[0]["content"] = f"{system_prompt}\n\n{QUESTION_PROMPT}"
+    return messages
+
+
+def _next_question_messages(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    provider: str,
+    system_prompt: str,
+    temperature: float,
+) -> tuple[list[dict[str, str]], dict[str, int]]:
+    # Only the next-question prompt is compacted; decide and summary calls see every
+    # answer. Returns the messages and the usage of folding, if any.
+    older, recent = _split_history(qas, provider)
+    if chains_responses(provider) or not older:
+        messages, usage = _clarify_messages(original, qas, asked, provider, system_prompt), {}
+    else:
+        summary, usage = _fold_history(original, older, provider, temperature)
+        if not summary:
+            recent = list(qas)
+        messages = _history_messages(original, recent, asked, system_prompt, summary)
+    return _questions_only(messages, system_prompt), usage
+
+
+async def _anext_question_messages(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    provider: str,
+    system_prompt: str,
+    temperature: float,
+) -> tuple[list[dict[str, str]], dict[str, int]]:
+    older, recent = _split_history(qas, provider)
+    if chains_responses(provider) or not older:
+        messages, usage = _clarify_messages(original, qas, asked, provider, system_prompt), {}
+    else:
+        summary, usage = await _afold_history(original, older, provider, temperature)
+        if not summary:
+            recent = list(qas)
+        messages = _history_messages(original, recent, asked, system_prompt, summary)
+    return _questions_only(messages, system_prompt), usage
+
+
+def _parse_next_question(response_text: str) -> str | None:
     raw = response_text.strip()
     if not raw:
-        return None, usage
+        return None
     normalized = normalize_lines(raw)
     if not normalized:
         normalized = [raw.strip()]
     combined = "\n".join(normalized).strip()
     if combined.lower() in {"нет", "не нужно", "достаточно", "без вопросов"}:
-        return None, usage
-    return combined, usage
+        return None
+    return combined
+
+
+def generate_next_question(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    system_prompt: str = SYSTEM_PROMPT,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+    chain: dict | None = None,
+) -> tuple[str | None, dict[str, int]]:
+    messages, fold_usage = _next_question_messages(
+        original, qas, asked, provider, system_prompt, temperature
+    )
+    with response_chain(chain), _profile("clarifier"):
+        response_text, usage = chat_completion(
+            messages=messages,
+            provider=provider,
+            temperature=temperature,
+        )
+    return _parse_next_question(response_text), _add_usage(usage, fold_usage)
+
+
+async def agenerate_next_question(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    system_prompt: str = SYSTEM_PROMPT,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+    chain: dict | None = None,
+) -> tuple[str | None, dict[str, int]]:
+    messages, fold_usage = await _anext_question_messages(
+        original, qas, asked, provider, system_prompt, temperature
+    )
+    with response_chain(chain), _profile("clarifier"):
+        response_text, usage = await achat_completion(
+            messages=messages,
+            provider=provider,
+            temperature=temperature,
+        )
+    return _parse_next_question(response_text), _add_usage(usage, fold_usage)
+
+
+def _decide_messages(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    system_prompt: str,
+    provider: str = DEFAULT_PROVIDER,
+) -> list[dict[str, str]]:
+    messages = _clarify_messages(original, qas, asked, provider, system_prompt)
+    messages[0]["content"] = f"{system_prompt}\n\n{DECIDE_PROMPT}"
+    return messages
+
+
+def _looks_like_questions(text: str) -> bool:
+    # A long prose answer may still contain a rhetorical "?"; only short replies
+    # or lists whose items all ask something are taken as questions.
+    if "?" not in text:
+        return False
+    if len(text) <= PLAIN_QUESTION_MAX_CHARS:
+        return True
+    items = [line for line in text.splitlines() if _LIST_ITEM.match(line)]
+    return bool(items) and all("?" in line for line in items)
+
+
+def _parse_decision(response_text: str) -> tuple[str | None, str | None]:
+    raw = response_text.strip()
+    if not raw:
+        return None, None
+    match = _JSON_OBJECT.search(raw)
+    try:
+        decision = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError:
+        decision = None
+    if isinstance(decision, dict):
+        question = decision.get("question")
+        if isinstance(question, str) and question.strip():
+            return _parse_next_question(question), None
+        summary = decision.get("summary")
+        if isinstance(summary, str) and summary.strip():
+            return None, summary.strip()
+    # The model ignored the format; a reply with questions in it is still a question.
+    _log.warning("Clarify decision is not a JSON object, treating it as plain text")
+    question = _parse_next_question(raw)
+    if question is None or _looks_like_questions(raw):
+        return question, None
+    return None, raw
+
+
+def clarify_step(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    system_prompt: str = SYSTEM_PROMPT,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+    chain: dict | None = None,
+) -> tuple[str | None, str | None, dict[str, int]]:
+    # Returns (question, summary, usage). With CLARIFY_DECIDE one call yields either;
+    # when both are None the caller still has to summarize.
+    if not settings.CLARIFY_DECIDE:
+        question, usage = generate_next_question(
+            original, qas, asked, provider, system_prompt, temperature, chain=chain
+        )
+        return question, None, usage
+    with response_chain(chain), _profile("decider"):
+        response_text, usage = chat_completion(
+            messages=_decide_messages(original, qas, asked, system_prompt, provider),
+            provider=provider,
+            temperature=temperature,
+        )
+    return *_parse_decision(response_text), usage
+
+
+async def aclarify_step(
+    original: str,
+    qas: list[dict[str, str]],
+    asked: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    system_prompt: str = SYSTEM_PROMPT,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+    chain: dict | None = None,
+) -> tuple[str | None, str | None, dict[str, int]]:
+    if not settings.CLARIFY_DECIDE:
+        question, usage = await agenerate_next_question(
+            original, qas, asked, provider, system_prompt, temperature, chain=chain
+        )
+        return question, None, usage
+    with response_chain(chain), _profile("decider"):
+        response_text, usage = await achat_completion(
+            messages=_decide_messages(original, qas, asked, system_prompt, provider),
+            provider=provider,
+            temperature=temperature,
+        )
+    return *_parse_decision(response_text), usage
+
+
+def _summary_messages(original: str, answers: list[str]) -> list[dict[str, str]]:
+    return _role_messages(
+        SUMMARY_PROMPT,
+        f"Исходный запрос: {original}\n"
+        f"Уточнения: {json.dumps(answers, ensure_ascii=False)}",
+    )
 
 
 def summarize_with_answers(
@@ -101,24 +490,73 @@ def summarize_with_answers(
     provider: str = DEFAULT_PROVIDER,
     temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
 ) -> tuple[str, dict[str, int]]:
-    response_text, usage = chat_completion(
-        messages=[
-            {
-                "role": "system",
-                "content": SUMMARY_PROMPT,
-            },
-            {
-                "role": "user",
-                "content": (
-                    f"Исходный запрос: {original}\n"
-                    f"Уточнения: {json.dumps(answers, ensure_ascii=False)}"
-                ),
-            },
-        ],
+    with _profile("summarizer"):
+        response_text, usage = chat_completion(
+            messages=_summary_messages(original, answers),
+            provider=provider,
+            temperature=temperature,
+        )
+    return response_text.strip(), usage
+
+
+async def asummarize_with_answers(
+    original: str,
+    answers: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+) -> tuple[str, dict[str, int]]:
+    with _profile("summarizer"):
+        response_text, usage = await achat_completion(
+            messages=_summary_messages(original, answers),
+            provider=provider,
+            temperature=temperature,
+        )
+    return response_text.strip(), usage
+
+
+def astream_summarize_with_answers(
+    original: str,
+    answers: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    max_tokens, stop = GENERATION_PROFILES["summarizer"]
+    return astream_chat_completion(
+        messages=_summary_messages(original, answers),
         provider=provider,
         temperature=temperature,
+        max_tokens=max_tokens,
+        stop=stop,
+    )
+
+
+def _speculating() -> bool:
+    # A decide call already returns the summary when there is nothing left to ask.
+    return settings.SPECULATIVE_SUMMARY and not settings.CLARIFY_DECIDE
+
+
+def speculate_summary(
+    original: str,
+    answers: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+) -> Speculation:
+    return Speculation(
+        functools.partial(summarize_with_answers, original, list(answers), provider, temperature),
+        _speculating(),
+    )
+
+
+def aspeculate_summary(
+    original: str,
+    answers: list[str],
+    provider: str = DEFAULT_PROVIDER,
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+) -> AsyncSpeculation:
+    return AsyncSpeculation(
+        functools.partial(asummarize_with_answers, original, list(answers), provider, temperature),
+        _speculating(),
     )
-    return response_text.strip(), usage
 
 
 def generate_role_answer(
@@ -127,20 +565,27 @@ def generate_role_answer(
     provider: str = DEFAULT_PROVIDER,
     temperature: float = DISCUSSION_TEMPERATURE,
 ) -> tuple[str, dict[str, int]]:
-    response_text, usage = chat_completion(
-        messages=[
-            {
-                "role": "system",
-                "content": system_prompt,
-            },
-            {
-                "role": "user",
-                "content": text,
-            },
-        ],
-        provider=provider,
-        temperature=temperature,
-    )
+    with _profile("expert"):
+        response_text, usage = chat_completion(
+            messages=_role_messages(system_prompt, text),
+            provider=provider,
+            temperature=temperature,
+        )
+    return response_text.strip(), usage
+
+
+async def agenerate_role_answer(
+    system_prompt: str,
+    text: str,
+    provider: str = DEFAULT_PROVIDER,
+    temperature: float = DISCUSSION_TEMPERATURE,
+) -> tuple[str, dict[str, int]]:
+    with _profile("expert"):
+        response_text, usage = await achat_completion(
+            messages=_role_messages(system_prompt, text),
+            provider=provider,
+            temperature=temperature,
+        )
     return response_text.strip(), usage
 
 
@@ -160,40 +605,165 @@ def _discussion_provider_pairs() -> list[tuple[str, str]]:
     ]
 
 
-def generate_discussion_answers(
-    text: str,
-    temperature_by_provider: dict[str, float] | None = None,
-) -> list[tuple[str, str, str, dict[str, int]]]:
-    answers: list[tuple[str, str, str, dict[str, int]]] = []
+def _discussion_plan(
+    temperature_by_provider: dict[str, float] | None,
+) -> list[tuple[str, str, str, float]]:
+    plan: list[tuple[str, str, str, float]] = []
     for provider, label in _discussion_provider_pairs():
         _, prompt = _discussion_prompt_for_provider(provider)
         temperature = (temperature_by_provider or {}).get(
             provider, _temperature_for_provider(provider)
         )
-        content, usage = generate_role_answer(prompt, text, provider, temperature)
+        plan.append((provider, label, prompt, temperature))
+    return plan
+
+
+def _discussion_failure(
+    provider: str,
+    label: str,
+    exc: BaseException | None,
+) -> tuple[str, dict[str, int]]:
+    if exc is None or isinstance(exc, DeadlineExceeded):
+        _log.warning("Discussion expert %s (%s) timed out", label, provider)
+        content = DISCUSSION_TIMEOUT_TEXT
+    else:
+        _log.warning("Discussion expert %s (%s) failed: %s", label, provider, exc)
+        content = f"Ошибка: {str(exc)[:200]}"
+    return content, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+def _role_answer_within(
+    budget: float | None,
+    prompt: str,
+    text: str,
+    provider: str,
+    temperature: float,
+) -> tuple[str, dict[str, int]]:
+    # A running thread cannot be cancelled, so the expert carries the budget as its
+    # own deadline: its provider calls time out instead of outliving the discussion.
+    with deadline_scope(budget):
+        return generate_role_answer(prompt, text, provider, temperature)
+
+
+def generate_discussion_answers(
+    text: str,
+    temperature_by_provider: dict[str, float] | None = None,
+    timeout: float | None = DISCUSSION_EXPERT_TIMEOUT_SECONDS,
+) -> list[tuple[str, str, str, dict[str, int]]]:
+    plan = _discussion_plan(temperature_by_provider)
+    budget = hop_timeout(timeout, label="discussion")
+    executor = ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix="discussion")
+    try:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _role_answer_within,
+                budget,
+                prompt,
+                text,
+                provider,
+                temperature,
+            )
+            for provider, _, prompt, temperature in plan
+        ]
+        wait(futures, timeout=budget)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    answers: list[tuple[str, str, str, dict[str, int]]] = []
+    for (provider, label, _, _), future in zip(plan, futures):
+        if not future.done():
+            content, usage = _discussion_failure(provider, label, None)
+        elif future.exception() is not None:
+            content, usage = _discussion_failure(provider, label, future.exception())
+        else:
+            content, usage = future.result()
         answers.append((provider, label, content, usage))
     return answers
 
 
+async def _arole_answer_with_deadline(
+    provider: str,
+    label: str,
+    prompt: str,
+    text: str,
+    temperature: float,
+    timeout: float | None,
+) -> tuple[str, dict[str, int]]:
+    try:
+        # The budget is checked before the coroutine exists, so an expired deadline
+        # does not leave it unawaited.
+        budget = hop_timeout(timeout, label=f"discussion {provider}")
+        return await asyncio.wait_for(
+            agenerate_role_answer(prompt, text, provider, temperature),
+            budget,
+        )
+    except asyncio.TimeoutError:
+        return _discussion_failure(provider, label, None)
+    except Exception as exc:
+        return _discussion_failure(provider, label, exc)
+
+
+async def agenerate_discussion_answers(
+    text: str,
+    temperature_by_provider: dict[str, float] | None = None,
+    timeout: float | None = DISCUSSION_EXPERT_TIMEOUT_SECONDS,
+) -> list[tuple[str, str, str, dict[str, int]]]:
+    plan = _discussion_plan(temperature_by_provider)
+    results = await asyncio.gather(
+        *(
+            _arole_answer_with_deadline(provider, label, prompt, text, temperature, timeout)
+            for provider, label, prompt, temperature in plan
+        )
+    )
+    return [
+        (provider, label, content, usage)
+        for (provider, label, _, _), (content, usage) in zip(plan, results)
+    ]
+
+
+def _referee_messages(discussion_memory: dict[str, str]) -> list[dict[str, str]]:
+    return _role_messages(REFEREE_PROMPT, json.dumps(discussion_memory, ensure_ascii=False))
+
+
 def generate_referee_answer(
     discussion_memory: dict[str, str],
     temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
 ) -> tuple[str, dict[str, int]]:
-    response_text, usage = chat_completion(
-        messages=[
-            {
-                "role": "system",
-                "content": REFEREE_PROMPT,
-            },
-            {
-                "role": "user",
-                "content": json.dumps(discussion_memory, ensure_ascii=False),
-            },
-        ],
+    with _profile("referee"):
+        response_text, usage = chat_completion(
+            messages=_referee_messages(discussion_memory),
+            provider=DEFAULT_PROVIDER,
+            temperature=temperature,
+        )
+    return response_text.strip(), usage
+
+
+async def agenerate_referee_answer(
+    discussion_memory: dict[str, str],
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+) -> tuple[str, dict[str, int]]:
+    with _profile("referee"):
+        response_text, usage = await achat_completion(
+            messages=_referee_messages(discussion_memory),
+            provider=DEFAULT_PROVIDER,
+            temperature=temperature,
+        )
+    return response_text.strip(), usage
+
+
+def astream_referee_answer(
+    discussion_memory: dict[str, str],
+    temperature: float = _temperature_for_provider(DEFAULT_PROVIDER),
+) -> AsyncIterator[tuple[str, dict[str, int] | None]]:
+    max_tokens, stop = GENERATION_PROFILES["referee"]
+    return astream_chat_completion(
+        messages=_referee_messages(discussion_memory),
         provider=DEFAULT_PROVIDER,
         temperature=temperature,
+        max_tokens=max_tokens,
+        stop=stop,
     )
-    return response_text.strip(), usage
 
 
 def format_discussion(answers: dict[str, str]) -> str:
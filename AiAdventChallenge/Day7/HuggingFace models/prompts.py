@@ -180,3 +180,26 @@ SUMMARY_PROMPT = (
     "Запрещены приветствия и обращения от лица пользователя. "
     "Выводи только итоговый текст."
 )
+
+QUESTION_PROMPT = (
+    "Сейчас нужен только следующий шаг уточнения, а не ответ на запрос. "
+    "Выведи 1–5 коротких уточняющих вопросов, каждый с '?', без вступлений и пояснений. "
+    "Если данных уже достаточно, ответь одним словом: нет."
+)
+
+FOLD_PROMPT = (
+    "Обнови сводку уточнений пользователя: добавь к ней новые пары «вопрос/ответ». "
+    "Сохрани все факты, числа, ограничения и предпочтения пользователя, ничего не выдумывай. "
+    "Пиши кратко, по одному пункту на факт, без вопросов и без ответа на исходный запрос. "
+    "Выводи только текст сводки."
+)
+
+DECIDE_PROMPT = (
+    "Реши, что нужно дальше: задать следующий уточняющий вопрос или дать итоговый ответ. "
+    "Ответь строго одним JSON-объектом без markdown и пояснений. "
+    "Если без уточнения ответ будет бесполезен и такой вопрос ещё не задавался — "
+    '{"question": "текст вопроса"}. '
+    'Иначе — {"summary": "итоговый ответ"}: один краткий итоговый ответ на русском, '
+    "объединяющий исходный запрос и уточнения пользователя, "
+    "без приветствий и обращений от лица пользователя."
+)
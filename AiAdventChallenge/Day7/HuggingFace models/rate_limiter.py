@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(RuntimeError):
+    def __init__(self, message: str, wait: float | None = None) -> None:
+        super().__init__(message)
+        self.wait = wait
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, clock=time.monotonic) -> None:
+        self.capacity = float(per_minute)
+        self.refill_per_second = float(per_minute) / 60.0
+        self._clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill(self._clock())
+        # Requests larger than the whole bucket would never fit, so they only wait for a full one.
+        needed = min(amount, self.capacity) - self.tokens
+        if needed <= 0:
+            return 0.0
+        return needed / self.refill_per_second
+
+    def take(self, amount: float) -> None:
+        self._refill(self._clock())
+        self.tokens -= amount
+
+    def give(self, amount: float) -> None:
+        self._refill(self._clock())
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self) -> None:
+        self._refill(self._clock())
+        self.tokens = min(self.tokens, 0.0)
+
+
+def parse_rate_limits(raw: str | None) -> dict[str, tuple[float | None, float | None]]:
+    limits: dict[str, tuple[float | None, float | None]] = {}
+    if not raw:
+        return limits
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise RuntimeError(f"❌ Неверный формат RATE_LIMITS: {item} (ожидается provider=RPM/TPM)")
+        key, value = item.split("=", 1)
+        rpm_text, _, tpm_text = value.partition("/")
+        rpm = float(rpm_text) if rpm_text.strip() else None
+        tpm = float(tpm_text) if tpm_text.strip() else None
+        limits[key.strip()] = (rpm, tpm)
+    return limits
+
+
+class ProviderRateLimiter:
+    def __init__(
+        self,
+        limits: dict[str, tuple[float | None, float | None]],
+        max_wait_seconds: float = 10.0,
+        clock=time.monotonic,
+    ) -> None:
+        self.limits = dict(limits)
+        self.max_wait_seconds = float(max_wait_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[TokenBucket | None, TokenBucket | None]] = {}
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._rejected = 0
+        self._throttled = 0
+
+    def _limits_for(self, provider: str, model: str | None) -> tuple[str, tuple]:
+        if model and f"{provider}:{model}" in self.limits:
+            return f"{provider}:{model}", self.limits[f"{provider}:{model}"]
+        return f"{provider}:{model or '-'}", self.limits.get(provider, (None, None))
+
+    def _buckets_for(self, provider: str, model: str | None):
+        key, (rpm, tpm) = self._limits_for(provider, model)
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            buckets = (
+                TokenBucket(rpm, self._clock) if rpm else None,
+                TokenBucket(tpm, self._clock) if tpm else None,
+            )
+            self._buckets[key] = buckets
+        return buckets
+
+    def reserve(
+        self,
+        provider: str,
+        model: str | None,
+        estimated_tokens: int,
+        max_wait: float | None = None,
+    ) -> float:
+        limit = self.max_wait_seconds if max_wait is None else min(max_wait, self.max_wait_seconds)
+        with self._lock:
+            requests, tokens = self._buckets_for(provider, model)
+            if requests is None and tokens is None:
+                return 0.0
+            wait = max(
+                requests.wait_time(1) if requests else 0.0,
+                tokens.wait_time(estimated_tokens) if tokens else 0.0,
+            )
+            if wait > limit:
+                self._rejected += 1
+                raise RateLimitExceeded(
+                    f"{provider} rate limit: no capacity within {limit:.1f}s "
+                    f"(needs {wait:.1f}s)",
+                    wait=wait,
+                )
+            # Capacity is taken now, so callers queued behind this one wait longer.
+            if requests:
+                requests.take(1)
+            if tokens:
+                tokens.take(estimated_tokens)
+            if wait > 0:
+                self._waits += 1
+                self._wait_seconds += wait
+            return wait
+
+    def settle(
+        self,
+        provider: str,
+        model: str | None,
+        estimated_tokens: int,
+        actual_tokens: int,
+    ) -> None:
+        with self._lock:
+            _, tokens = self._buckets_for(provider, model)
+            if tokens is None:
+                return
+            delta = actual_tokens - estimated_tokens
+            if delta > 0:
+                tokens.take(delta)
+            elif delta < 0:
+                tokens.give(-delta)
+
+    def throttled(self, provider: str, model: str | None) -> None:
+        with self._lock:
+            requests, tokens = self._buckets_for(provider, model)
+            self._throttled += 1
+            for bucket in (requests, tokens):
+                if bucket is not None:
+                    bucket.drain()
+        _log.warning("%s/%s answered 429, draining its rate limit buckets", provider, model or "-")
+
+    def stats(self) -> dict:
+        with self._lock:
+            buckets = {}
+            for key, (requests, tokens) in self._buckets.items():
+                if requests is not None:
+                    requests._refill(self._clock())
+                if tokens is not None:
+                    tokens._refill(self._clock())
+                buckets[key] = {
+                    "requests_available": round(requests.tokens, 2) if requests else None,
+                    "tokens_available": round(tokens.tokens, 2) if tokens else None,
+                }
+            return {
+                "limits": {key: {"rpm": rpm, "tpm": tpm} for key, (rpm, tpm) in self.limits.items()},
+                "buckets": buckets,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_seconds, 3),
+                "rejected": self._rejected,
+                "throttled": self._throttled,
+            }
@@ -0,0 +1,146 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+_logger = logging.getLogger("ai_client.raw")
+_logger.propagate = False
+
+_lock = threading.Lock()
+_listener: QueueListener | None = None
+_settings = {
+    "sample_rate": 0.05,
+    "max_chars": 4000,
+    "path": None,
+    "queue_size": 1000,
+}
+_counters = {"captured": 0, "sampled_out": 0, "dropped": 0}
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Losing a sample is fine; blocking a request thread on log I/O is not.
+            with _lock:
+                _counters["dropped"] += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The payload is serialized by the listener thread, not here.
+        return record
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room instead of failing shutdown when the queue is full.
+        self.queue.put(self._sentinel)
+
+
+class RawResultFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        raw = getattr(record, "raw", {})
+        payload = _snapshot(raw.get("result"))
+        limit = _settings["max_chars"]
+        truncated = len(payload) > limit
+        entry = {
+            "ts": round(record.created, 3),
+            "provider": raw.get("provider"),
+            "model": raw.get("model"),
+            "type": type(raw.get("result")).__name__,
+            "payload": payload[:limit],
+            "truncated": truncated,
+        }
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _snapshot(result: object) -> str:
+    try:
+        if hasattr(result, "model_dump_json"):
+            return result.model_dump_json(exclude_none=True)
+        if isinstance(result, (dict, list)):
+            return json.dumps(result, ensure_ascii=False, default=repr)
+        return repr(result)
+    except Exception:
+        return "<unprintable>"
+
+
+def configure_raw_log(
+    sample_rate: float | None = None,
+    max_chars: int | None = None,
+    path: str | None = None,
+    queue_size: int | None = None,
+) -> None:
+    with _lock:
+        if _listener is not None:
+            raise RuntimeError("Raw result log is already running")
+        for key, value in (
+            ("sample_rate", sample_rate),
+            ("max_chars", max_chars),
+            ("path", path),
+            ("queue_size", queue_size),
+        ):
+            if value is not None:
+                _settings[key] = value
+
+
+def _start() -> None:
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        if _settings["path"]:
+            target: logging.Handler = logging.FileHandler(_settings["path"], encoding="utf-8")
+        else:
+            target = logging.StreamHandler()
+        target.setFormatter(RawResultFormatter())
+        records: queue.Queue = queue.Queue(maxsize=max(1, int(_settings["queue_size"])))
+        _logger.addHandler(_DroppingQueueHandler(records))
+        _listener = _Listener(records, target, respect_handler_level=False)
+        _listener.start()
+    atexit.register(stop_raw_log)
+
+
+def capture(provider: str, model: str | None, result: object) -> None:
+    rate = _settings["sample_rate"]
+    if rate <= 0 or not _logger.isEnabledFor(logging.INFO):
+        return
+    if rate < 1 and random.random() >= rate:
+        with _lock:
+            _counters["sampled_out"] += 1
+        return
+    if _listener is None:
+        _start()
+    with _lock:
+        _counters["captured"] += 1
+    _logger.info(
+        "raw result",
+        extra={"raw": {"provider": provider, "model": model or "-", "result": result}},
+    )
+
+
+def stop_raw_log() -> None:
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+        for handler in list(_logger.handlers):
+            if isinstance(handler, _DroppingQueueHandler):
+                _logger.removeHandler(handler)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def raw_log_stats() -> dict:
+    with _lock:
+        return {
+            "running": _listener is not None,
+            "sample_rate": _settings["sample_rate"],
+            "max_chars": _settings["max_chars"],
+            "path": _settings["path"],
+            **_counters,
+        }
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_log = logging.getLogger(__name__)
+
+
+def canonical_key(
+    provider: str,
+    model: str | None,
+    messages: list[dict[str, str]],
+    temperature: float,
+    **params,
+) -> str:
+    payload = {
+        "provider": provider,
+        "model": model,
+        "messages": [
+            {"role": message.get("role", "user"), "content": message.get("content", "")}
+            for message in messages
+        ],
+        "temperature": round(float(temperature), 4),
+        "params": {key: value for key, value in params.items() if value is not None},
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _DiskTier:
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, usage TEXT NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str, now: float) -> tuple[str, dict[str, int], float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, usage, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] <= now:
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def put(self, key: str, text: str, usage: dict[str, int], expires_at: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, text, usage, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, text, json.dumps(usage), expires_at),
+            )
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (now,)
+            ).rowcount
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        disk_path: str | None = None,
+        clock=time.time,
+    ) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[str, dict[str, int], float]] = OrderedDict()
+        self._disk: _DiskTier | None = None
+        if disk_path and self.enabled:
+            try:
+                self._disk = _DiskTier(disk_path)
+                self._disk.purge_expired(self._clock())
+            except sqlite3.Error as exc:
+                _log.warning("Response cache disk tier %s is unavailable: %s", disk_path, exc)
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: str) -> tuple[str, dict[str, int]] | None:
+        if not self.enabled:
+            return None
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0], dict(entry[1])
+            if entry is not None:
+                self._entries.pop(key, None)
+        if self._disk is not None:
+            try:
+                stored = self._disk.get(key, now)
+            except sqlite3.Error as exc:
+                _log.warning("Response cache disk read failed: %s", exc)
+                stored = None
+            if stored is not None:
+                with self._lock:
+                    self._remember(key, stored)
+                    self._disk_hits += 1
+                return stored[0], dict(stored[1])
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key: str, text: str, usage: dict[str, int]) -> None:
+        if not self.enabled or not text:
+            return
+        expires_at = self._clock() + self.ttl_seconds
+        entry = (text, dict(usage), expires_at)
+        with self._lock:
+            self._remember(key, entry)
+            self._stores += 1
+        if self._disk is not None:
+            try:
+                self._disk.put(key, text, entry[1], expires_at)
+            except sqlite3.Error as exc:
+                _log.warning("Response cache disk write failed: %s", exc)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk": self._disk is not None,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "stores": self._stores,
+                "evictions": self._evictions,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remember(self, key: str, entry: tuple[str, dict[str, int], float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
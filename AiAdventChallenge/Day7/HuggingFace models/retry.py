@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from deadline import DeadlineExceeded, remaining_budget
+
+T = TypeVar("T")
+
+_log = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+_RETRYABLE_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectError",
+    "ConnectTimeout",
+    "ReadError",
+    "ReadTimeout",
+    "RemoteProtocolError",
+    "ServerDisconnectedError",
+    "ClientConnectionError",
+    "WriteError",
+    "PoolTimeout",
+}
+
+
+def status_code(exc: BaseException) -> int | None:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    status = status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (ConnectionError, asyncio.TimeoutError)):
+        return True
+    return any(cls.__name__ in _RETRYABLE_NAMES for cls in type(exc).__mro__)
+
+
+def retry_after(exc: BaseException) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after")
+    except Exception:
+        return None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_attempts(raw: str | None) -> dict[str, int]:
+    attempts: dict[str, int] = {}
+    if not raw:
+        return attempts
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        provider, sep, value = item.partition("=")
+        if not sep or not value.strip().isdigit():
+            raise RuntimeError(
+                f"❌ Неверный формат RETRY_PROVIDER_ATTEMPTS: {item} (ожидается provider=N)"
+            )
+        attempts[provider.strip()] = int(value)
+    return attempts
+
+
+class RetryBudget:
+    # Every first attempt deposits `ratio` tokens and every retry spends one,
+    # so retries stay a bounded share of traffic however many callers fail at once.
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0) -> None:
+        self.ratio = float(ratio)
+        self.max_tokens = max(float(min_tokens), float(max_tokens))
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._tokens
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        budget: RetryBudget | None = None,
+        provider_attempts: dict[str, int] | None = None,
+    ) -> None:
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.budget = budget or RetryBudget()
+        self.provider_attempts = dict(provider_attempts or {})
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._retries = 0
+        self._fatal = 0
+        self._exhausted = 0
+        self._budget_denied = 0
+
+    def attempts_for(self, provider: str) -> int:
+        return max(1, self.provider_attempts.get(provider, self.max_attempts))
+
+    def call(self, provider: str, fn: Callable[[], T]) -> T:
+        self._count("_calls")
+        self.budget.deposit()
+        delay = self.base_delay
+        attempt = 1
+        while True:
+            try:
+                return fn()
+            except Exception as exc:
+                delay = self._next_delay(provider, attempt, delay, exc)
+            _log.warning("%s attempt %d failed, retrying in %.2fs", provider, attempt, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, provider: str, factory: Callable[[], Awaitable[T]]) -> T:
+        self._count("_calls")
+        self.budget.deposit()
+        delay = self.base_delay
+        attempt = 1
+        while True:
+            try:
+                return await factory()
+            except Exception as exc:
+                delay = self._next_delay(provider, attempt, delay, exc)
+            _log.warning("%s attempt %d failed, retrying in %.2fs", provider, attempt, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_attempts": self.max_attempts,
+                "provider_attempts": dict(self.provider_attempts),
+                "calls": self._calls,
+                "retries": self._retries,
+                "retry_rate": round(self._retries / self._calls, 4) if self._calls else 0.0,
+                "fatal": self._fatal,
+                "exhausted": self._exhausted,
+                "budget_denied": self._budget_denied,
+                "budget_tokens": round(self.budget.tokens, 2),
+            }
+
+    def _next_delay(self, provider: str, attempt: int, previous: float, exc: Exception) -> float:
+        if not is_retryable(exc):
+            self._count("_fatal")
+            raise exc
+        if attempt >= self.attempts_for(provider):
+            self._count("_exhausted")
+            raise exc
+        # Decorrelated jitter: spread retries out without synchronising callers.
+        delay = min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+        hinted = retry_after(exc)
+        if hinted is not None:
+            delay = max(delay, min(hinted, self.max_delay))
+        remaining = remaining_budget()
+        if remaining is not None and delay >= remaining:
+            self._count("_exhausted")
+            raise exc
+        if not self.budget.withdraw():
+            self._count("_budget_denied")
+            raise exc
+        self._count("_retries")
+        return delay
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
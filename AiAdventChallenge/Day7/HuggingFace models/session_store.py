@@ -0,0 +1,166 @@
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+_log = logging.getLogger(__name__)
+
+
+def _new_session() -> dict[str, dict]:
+    return {"user_data": {}, "chat_data": {}}
+
+
+def estimate_session_bytes(session: dict) -> int:
+    try:
+        return len(json.dumps(session, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return len(repr(session).encode("utf-8"))
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def get_or_create(self, session_id: str) -> dict[str, dict]: ...
+
+    @abstractmethod
+    def refresh(self, session_id: str) -> None: ...
+
+    @abstractmethod
+    def discard(self, session_id: str) -> None: ...
+
+    @abstractmethod
+    def stats(self) -> dict[str, int]: ...
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl_seconds: float = 6 * 3600,
+        clock=time.monotonic,
+    ) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.idle_ttl_seconds = float(idle_ttl_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # session_id -> [session, last_access, size_bytes]; ordered from least recently used.
+        self._entries: OrderedDict[str, list] = OrderedDict()
+        self._bytes = 0
+        self._evicted_lru = 0
+        self._evicted_ttl = 0
+        self._evicted_bytes = 0
+
+    def get_or_create(self, session_id: str) -> dict[str, dict]:
+        now = self._clock()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                session = _new_session()
+                size = estimate_session_bytes(session)
+                self._entries[session_id] = [session, now, size]
+                self._bytes += size
+                self._enforce_limits(keep=session_id)
+                return session
+            entry[1] = now
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def refresh(self, session_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            size = estimate_session_bytes(entry[0])
+            self._bytes += size - entry[2]
+            entry[2] = size
+            entry[1] = self._clock()
+            self._entries.move_to_end(session_id)
+            self._enforce_limits(keep=session_id)
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            self._evict_expired(self._clock())
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evicted_lru": self._evicted_lru,
+                "evicted_ttl": self._evicted_ttl,
+                "evicted_bytes": self._evicted_bytes,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, session_id: object) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def _pop_oldest(self) -> None:
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry[2]
+
+    def _evict_expired(self, now: float) -> None:
+        if self.idle_ttl_seconds <= 0:
+            return
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if now - oldest[1] < self.idle_ttl_seconds:
+                break
+            self._pop_oldest()
+            self._evicted_ttl += 1
+
+    def _enforce_limits(self, keep: str) -> None:
+        # The kept session was just moved to the end, so it is evicted last.
+        while len(self._entries) > self.max_entries:
+            self._pop_oldest()
+            self._evicted_lru += 1
+        if not self.max_bytes:
+            return
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._pop_oldest()
+            self._evicted_bytes += 1
+        if self._bytes > self.max_bytes:
+            _log.warning(
+                "Session %s alone exceeds the session byte budget (%s > %s)",
+                keep,
+                self._bytes,
+                self.max_bytes,
+            )
+
+
+_STORE_FACTORIES = {
+    "memory": MemorySessionStore,
+}
+
+
+def register_session_store(name: str, factory) -> None:
+    _STORE_FACTORIES[name] = factory
+
+
+def create_session_store(
+    kind: str = "memory",
+    max_entries: int = 1000,
+    max_bytes: int = 64 * 1024 * 1024,
+    idle_ttl_seconds: float = 6 * 3600,
+) -> SessionStore:
+    factory = _STORE_FACTORIES.get(kind)
+    if factory is None:
+        raise RuntimeError(f"Unknown session store: {kind}")
+    return factory(
+        max_entries=max_entries,
+        max_bytes=max_bytes,
+        idle_ttl_seconds=idle_ttl_seconds,
+    )
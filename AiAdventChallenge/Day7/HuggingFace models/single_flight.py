@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from deadline import DeadlineExceeded
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self._async_calls: dict[str, asyncio.Task] = {}
+        self._leaders = 0
+        self._followers = 0
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[[], T],
+        timeout: float | None = None,
+    ) -> tuple[T, bool]:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+            else:
+                self._followers += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as exc:
+                call.error = exc
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+            return call.result, True
+
+        if not call.event.wait(timeout):
+            raise DeadlineExceeded("Deadline exceeded while waiting for a shared upstream call")
+        if call.error is not None:
+            raise call.error
+        return call.result, False
+
+    async def ado(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[T]],
+        timeout: float | None = None,
+    ) -> tuple[T, bool]:
+        task = self._async_calls.get(key)
+        leader = task is None or task.done()
+        if leader:
+            # The upstream call runs as its own task, so one caller going away
+            # does not cancel the call the others are waiting on.
+            task = asyncio.ensure_future(factory())
+            self._async_calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self._leaders += 1
+        else:
+            self._followers += 1
+
+        shared = asyncio.shield(task)
+        if leader or timeout is None:
+            return await shared, leader
+        try:
+            return await asyncio.wait_for(shared, timeout), leader
+        except asyncio.TimeoutError as exc:
+            raise DeadlineExceeded(
+                "Deadline exceeded while waiting for a shared upstream call"
+            ) from exc
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "leaders": self._leaders,
+                "coalesced": self._followers,
+            }
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._async_calls.get(key) is task:
+            self._async_calls.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter has gone away.
+            task.exception()
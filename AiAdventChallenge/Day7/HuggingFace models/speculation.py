@@ -0,0 +1,149 @@
+import asyncio
+import atexit
+import contextvars
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_counters = {
+    "started": 0,
+    "used": 0,
+    "wasted": 0,
+    "cancelled": 0,
+    "failed": 0,
+    "used_tokens": 0,
+    "wasted_tokens": 0,
+}
+
+Result = tuple[str, dict[str, int]]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculation")
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _tokens(result: Result) -> int:
+    total = result[1].get("total_tokens") if result[1] else None
+    return total if isinstance(total, int) else 0
+
+
+def _count(name: str, tokens: int = 0) -> None:
+    with _lock:
+        _counters[name] += 1
+        if tokens and name in ("used", "wasted"):
+            _counters[f"{name}_tokens"] += tokens
+
+
+def _count_waste(future: Future | asyncio.Future) -> None:
+    if future.cancelled():
+        _count("cancelled")
+    elif future.exception() is not None:
+        _count("failed")
+    else:
+        _count("wasted", _tokens(future.result()))
+
+
+class _Speculation:
+    __slots__ = ("_future", "_settled")
+
+    def __init__(self, future: Future | asyncio.Future | None) -> None:
+        self._future = future
+        self._settled = future is None
+        if future is not None:
+            _count("started")
+
+    @property
+    def started(self) -> bool:
+        return self._future is not None
+
+    def _use(self, result: Result) -> Result:
+        self._settled = True
+        _count("used", _tokens(result))
+        return result
+
+    def discard(self) -> None:
+        if self._settled:
+            return
+        self._settled = True
+        if self._future.cancel():
+            _count("cancelled")
+            return
+        # Already running in a thread: its tokens are spent once it finishes.
+        self._future.add_done_callback(_count_waste)
+
+
+class Speculation(_Speculation):
+    # Runs `compute` in the background right away when enabled; otherwise
+    # `result()` simply calls it, so callers handle both cases the same way.
+    __slots__ = ("_compute",)
+
+    def __init__(self, compute: Callable[[], Result], enabled: bool) -> None:
+        self._compute = compute
+        future = None
+        if enabled:
+            future = _get_executor().submit(contextvars.copy_context().run, compute)
+        super().__init__(future)
+
+    def result(self) -> Result:
+        # Only a speculation that never ran is computed again; a real failure has
+        # already been through retries and is raised as is.
+        if self._future is None:
+            return self._compute()
+        self._settled = True
+        if self._future.cancelled():
+            _count("cancelled")
+            return self._compute()
+        try:
+            result = self._future.result()
+        except Exception:
+            _count("failed")
+            raise
+        return self._use(result)
+
+    def __enter__(self) -> "Speculation":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.discard()
+
+
+class AsyncSpeculation(_Speculation):
+    __slots__ = ("_factory",)
+
+    def __init__(self, factory: Callable[[], Awaitable[Result]], enabled: bool) -> None:
+        self._factory = factory
+        super().__init__(asyncio.ensure_future(factory()) if enabled else None)
+
+    async def result(self) -> Result:
+        if self._future is None:
+            return await self._factory()
+        self._settled = True
+        if self._future.cancelled():
+            _count("cancelled")
+            return await self._factory()
+        try:
+            result = await self._future
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _count("failed")
+            raise
+        return self._use(result)
+
+    async def __aenter__(self) -> "AsyncSpeculation":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.discard()
+
+
+def speculation_stats() -> dict:
+    with _lock:
+        return dict(_counters)
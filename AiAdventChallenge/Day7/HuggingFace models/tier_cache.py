@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+class TierCapabilityCache:
+    def __init__(self, ttl_seconds: float = 900.0, clock=time.monotonic) -> None:
+        self.ttl_seconds = float(ttl_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._known_good: dict[str, tuple[str, float]] = {}
+        self._unsupported: dict[tuple[str, str], float] = {}
+        self._hits = 0
+        self._skips = 0
+
+    def order(self, model: str, tiers: list[str]) -> list[str]:
+        if self.ttl_seconds <= 0:
+            return list(tiers)
+        now = self._clock()
+        with self._lock:
+            usable = [tier for tier in tiers if not self._is_unsupported(model, tier, now)]
+            self._skips += len(tiers) - len(usable)
+            if not usable:
+                # Every tier is marked unsupported: the marks may be stale, retry them all.
+                return list(tiers)
+            known = self._known_good.get(model)
+            if known is not None and known[1] <= now:
+                self._known_good.pop(model, None)
+                known = None
+            if known is not None and known[0] in usable:
+                self._hits += 1
+                usable.remove(known[0])
+                usable.insert(0, known[0])
+            return usable
+
+    def record_success(self, model: str, tier: str) -> None:
+        with self._lock:
+            self._known_good[model] = (tier, self._clock() + self.ttl_seconds)
+            self._unsupported.pop((model, tier), None)
+
+    def record_unsupported(self, model: str, tier: str) -> None:
+        with self._lock:
+            self._unsupported[(model, tier)] = self._clock() + self.ttl_seconds
+            known = self._known_good.get(model)
+            if known is not None and known[0] == tier:
+                self._known_good.pop(model, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._known_good.clear()
+            self._unsupported.clear()
+
+    def stats(self) -> dict:
+        now = self._clock()
+        with self._lock:
+            return {
+                "known_good": {
+                    model: tier
+                    for model, (tier, expires_at) in self._known_good.items()
+                    if expires_at > now
+                },
+                "unsupported": sorted(
+                    f"{model} {tier}"
+                    for (model, tier), expires_at in self._unsupported.items()
+                    if expires_at > now
+                ),
+                "preferred_hits": self._hits,
+                "skipped_tiers": self._skips,
+            }
+
+    def _is_unsupported(self, model: str, tier: str, now: float) -> bool:
+        expires_at = self._unsupported.get((model, tier))
+        if expires_at is None:
+            return False
+        if expires_at <= now:
+            self._unsupported.pop((model, tier), None)
+            return False
+        return True
@@ -0,0 +1,114 @@
+import json
+import re
+import threading
+
+# Rough BPE costs per character class; the per-model ratio corrects the rest.
+_WORD = re.compile(r"[A-Za-z]+|[А-Яа-яЁё]+|\d+|[^\sA-Za-zА-Яа-яЁё\d]")
+_LATIN_CHARS_PER_TOKEN = 4.0
+_CYRILLIC_CHARS_PER_TOKEN = 2.7
+_DIGITS_PER_TOKEN = 2.0
+_MESSAGE_OVERHEAD = 4
+
+
+def _content_text(content: object) -> str:
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, ensure_ascii=False) if content else ""
+
+
+def base_estimate(text: str) -> float:
+    tokens = 0.0
+    for match in _WORD.finditer(text):
+        piece = match.group(0)
+        first = piece[0]
+        if first.isdigit():
+            tokens += max(1.0, len(piece) / _DIGITS_PER_TOKEN)
+        elif first.isascii() and first.isalpha():
+            tokens += max(1.0, len(piece) / _LATIN_CHARS_PER_TOKEN)
+        elif first.isalpha():
+            tokens += max(1.0, len(piece) / _CYRILLIC_CHARS_PER_TOKEN)
+        else:
+            tokens += 1.0
+    return tokens
+
+
+def base_messages_estimate(messages: list[dict[str, str]]) -> float:
+    return sum(
+        base_estimate(_content_text(message.get("content"))) + _MESSAGE_OVERHEAD
+        for message in messages
+    )
+
+
+class _Calibration:
+    __slots__ = ("ratio", "samples", "error")
+
+    def __init__(self) -> None:
+        self.ratio = 1.0
+        self.samples = 0
+        self.error = 0.0
+
+
+class TokenEstimator:
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        min_ratio: float = 0.25,
+        max_ratio: float = 4.0,
+    ) -> None:
+        self.alpha = float(alpha)
+        self.min_ratio = float(min_ratio)
+        self.max_ratio = float(max_ratio)
+        self._lock = threading.Lock()
+        self._calibrations: dict[str, _Calibration] = {}
+
+    @staticmethod
+    def _key(provider: str, model: str | None) -> str:
+        return f"{provider}:{model}" if model else provider
+
+    def ratio(self, provider: str, model: str | None = None) -> float:
+        with self._lock:
+            calibration = self._calibrations.get(self._key(provider, model))
+            return calibration.ratio if calibration is not None else 1.0
+
+    def estimate_text(self, provider: str, model: str | None, text: str) -> int:
+        return max(0, round(base_estimate(text) * self.ratio(provider, model)))
+
+    def estimate(self, provider: str, model: str | None, messages: list[dict[str, str]]) -> int:
+        return max(1, round(base_messages_estimate(messages) * self.ratio(provider, model)))
+
+    def observe(
+        self,
+        provider: str,
+        model: str | None,
+        messages: list[dict[str, str]],
+        prompt_tokens: int,
+    ) -> None:
+        # Some HF tiers report zero usage; those calls carry nothing to learn from.
+        if not isinstance(prompt_tokens, int) or prompt_tokens <= 0:
+            return
+        base = base_messages_estimate(messages)
+        if base <= 0:
+            return
+        observed = min(self.max_ratio, max(self.min_ratio, prompt_tokens / base))
+        with self._lock:
+            calibration = self._calibrations.setdefault(self._key(provider, model), _Calibration())
+            predicted = base * calibration.ratio
+            error = abs(predicted - prompt_tokens) / prompt_tokens
+            if calibration.samples == 0:
+                calibration.ratio = observed
+                calibration.error = error
+            else:
+                calibration.ratio += self.alpha * (observed - calibration.ratio)
+                calibration.error += self.alpha * (error - calibration.error)
+            calibration.samples += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                key: {
+                    "ratio": round(calibration.ratio, 3),
+                    "samples": calibration.samples,
+                    "error_pct": round(calibration.error * 100, 1),
+                }
+                for key, calibration in self._calibrations.items()
+            }
@@ -1,17 +1,29 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
+import threading
 import uuid
+from contextlib import asynccontextmanager
 
 import html
 
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from pydantic import BaseModel
 
-from config import HF_MODEL_ID, HF_MODEL_MAGNUM_ID, HF_MODEL_TLAMA_ID
-from web_logic import TEMPERATURE_KEY, normalize_temperatures, process_text
+from config import settings
+from ai_client import provider_stats
+from http_transport import aclose_transport
+from raw_log import stop_raw_log
+from session_store import SessionStore, create_session_store
+from web_logic import (
+    TEMPERATURE_KEY,
+    aprocess_text,
+    astream_process_text,
+    normalize_temperatures,
+)
 
 _log_level = os.getenv("PYTHONLOGLEVEL", "INFO").upper()
 logging.basicConfig(
@@ -22,8 +34,33 @@ logging.basicConfig(
 logging.getLogger("ai_client").setLevel(_log_level)
 
 
-app = FastAPI()
-_SESSIONS: dict[str, dict[str, dict]] = {}
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    logging.info("🚀 Сервис запускается...")
+    settings.validate()
+    yield
+    await aclose_transport()
+    stop_raw_log()
+
+
+app = FastAPI(lifespan=_lifespan)
+_SESSIONS: SessionStore | None = None
+_sessions_lock = threading.Lock()
+
+
+def _sessions() -> SessionStore:
+    global _SESSIONS
+    if _SESSIONS is None:
+        # /api/stats runs in the threadpool, so two threads can get here at once.
+        with _sessions_lock:
+            if _SESSIONS is None:
+                _SESSIONS = create_session_store(
+                    settings.SESSION_STORE,
+                    max_entries=settings.SESSION_MAX_ENTRIES,
+                    max_bytes=settings.SESSION_MAX_BYTES,
+                    idle_ttl_seconds=settings.SESSION_IDLE_TTL_SECONDS,
+                )
+    return _SESSIONS
 
 
 class MessageIn(BaseModel):
@@ -36,15 +73,26 @@ class MessageIn(BaseModel):
 def _get_session(session_id: str | None) -> tuple[str, dict, dict]:
     if not session_id:
         session_id = str(uuid.uuid4())
-    session = _SESSIONS.setdefault(session_id, {"user_data": {}, "chat_data": {}})
+    session = _sessions().get_or_create(session_id)
     return session_id, session["user_data"], session["chat_data"]
 
 
+def _apply_message_settings(payload: MessageIn, user_data: dict) -> None:
+    if payload.temperatures:
+        user_data[TEMPERATURE_KEY] = normalize_temperatures(payload.temperatures)
+    if payload.provider:
+        user_data["ai_provider"] = payload.provider
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @app.get("/", response_class=HTMLResponse)
 def index() -> str:
-    hf_model_label = html.escape((HF_MODEL_ID or "Hugging Face").split("/")[-1])
-    hf_magnum_label = html.escape((HF_MODEL_MAGNUM_ID or "Magnum").split("/")[-1])
-    hf_tinyllama_label = html.escape((HF_MODEL_TLAMA_ID or "TinyLlama").split("/")[-1])
+    hf_model_label = html.escape((settings.HF_MODEL_ID or "Hugging Face").split("/")[-1])
+    hf_magnum_label = html.escape((settings.HF_MODEL_MAGNUM_ID or "Magnum").split("/")[-1])
+    hf_tinyllama_label = html.escape((settings.HF_MODEL_TLAMA_ID or "TinyLlama").split("/")[-1])
     return """
 <!doctype html>
 <html lang="ru">
@@ -798,11 +846,56 @@ def index() -> str:
           });
       }
 
+      function parseSseEvent(raw) {
+        var event = "message";
+        var data = "";
+        raw.split("\\n").forEach(function (line) {
+          if (line.indexOf("event:") === 0) {
+            event = line.slice(6).trim();
+          } else if (line.indexOf("data:") === 0) {
+            data += line.slice(5).trim();
+          }
+        });
+        try {
+          return { event: event, data: data ? JSON.parse(data) : {} };
+        } catch (error) {
+          return { event: event, data: {} };
+        }
+      }
+
       function send(text) {
         if (!text.trim()) return Promise.resolve();
         addMessage(text, "user");
         inputEl.value = "";
-        return fetch("/api/message", {
+        var pendingItem = null;
+        var pendingText = "";
+
+        function handleEvent(parsed) {
+          var data = parsed.data || {};
+          if (parsed.event === "session") {
+            if (data.session_id && data.session_id !== sessionId) {
+              sessionId = data.session_id;
+              localStorage.setItem(SESSION_KEY, sessionId);
+            }
+          } else if (parsed.event === "delta") {
+            if (!pendingItem) {
+              pendingItem = createMessage("", "bot");
+              messagesEl.appendChild(pendingItem);
+            }
+            pendingText += data.text || "";
+            pendingItem.textContent = pendingText;
+            messagesEl.scrollTop = messagesEl.scrollHeight;
+          } else if (parsed.event === "message") {
+            if (pendingItem) {
+              messagesEl.removeChild(pendingItem);
+              pendingItem = null;
+              pendingText = "";
+            }
+            addMessage(data.text || "", "bot");
+          }
+        }
+
+        return fetch("/api/message/stream", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -812,13 +905,36 @@ def index() -> str:
             provider: currentProvider,
           }),
         })
-          .then(function (response) { return response.json(); })
-          .then(function (data) {
-            if (data.session_id && data.session_id !== sessionId) {
-              sessionId = data.session_id;
-              localStorage.setItem(SESSION_KEY, sessionId);
+          .then(function (response) {
+            if (!response.ok) {
+              return response.text().then(function (body) {
+                var detail = body || response.statusText;
+                try {
+                  var payload = JSON.parse(body);
+                  detail = typeof payload.detail === "string"
+                    ? payload.detail
+                    : JSON.stringify(payload.detail || payload);
+                } catch (parseError) {}
+                throw new Error(response.status + " " + detail);
+              });
             }
-            (data.messages || []).forEach(function (msg) { addMessage(msg, "bot"); });
+            var reader = response.body.getReader();
+            var decoder = new TextDecoder("utf-8");
+            var buffer = "";
+            function pump() {
+              return reader.read().then(function (result) {
+                if (result.done) return;
+                buffer += decoder.decode(result.value, { stream: true });
+                var boundary = buffer.indexOf("\\n\\n");
+                while (boundary !== -1) {
+                  handleEvent(parseSseEvent(buffer.slice(0, boundary)));
+                  buffer = buffer.slice(boundary + 2);
+                  boundary = buffer.indexOf("\\n\\n");
+                }
+                return pump();
+              });
+            }
+            return pump();
           })
           .catch(function (error) {
             addMessage("Ошибка: " + error, "bot");
@@ -1283,11 +1399,36 @@ def index() -> str:
 
 
 @app.post("/api/message")
-def message(payload: MessageIn):
+async def message(payload: MessageIn):
     session_id, user_data, chat_data = _get_session(payload.session_id)
-    if payload.temperatures:
-        user_data[TEMPERATURE_KEY] = normalize_temperatures(payload.temperatures)
-    if payload.provider:
-        user_data["ai_provider"] = payload.provider
-    messages = process_text(payload.text, user_data, chat_data)
+    _apply_message_settings(payload, user_data)
+    messages = await aprocess_text(payload.text, user_data, chat_data)
+    _sessions().refresh(session_id)
     return {"session_id": session_id, "messages": messages}
+
+
+@app.post("/api/message/stream")
+async def message_stream(payload: MessageIn):
+    session_id, user_data, chat_data = _get_session(payload.session_id)
+    _apply_message_settings(payload, user_data)
+
+    async def events():
+        try:
+            yield _sse_event("session", {"session_id": session_id})
+            async for event, text in astream_process_text(payload.text, user_data, chat_data):
+                yield _sse_event(event, {"text": text})
+        finally:
+            # A disconnect or a failed stream may still have changed the session.
+            _sessions().refresh(session_id)
+        yield _sse_event("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/stats")
+def stats():
+    return {"sessions": _sessions().stats(), **provider_stats()}
@@ -3,6 +3,7 @@ import logging
 import json
 import uuid
 import re
+from collections.abc import AsyncIterator
 from datetime import datetime, timedelta, timezone
 from message_logic import (
     AI_PROVIDER_KEY,
@@ -15,10 +16,19 @@ from message_logic import (
     JSON_MODE_PRETTY,
     JSON_MODE_CLEAN,
     JSON_MODE_OFF,
-    generate_next_question,
+    RESPONSE_CHAIN_KEY,
+    clarify_step,
+    speculate_summary,
     summarize_with_answers,
     generate_discussion_answers,
     generate_referee_answer,
+    aclarify_step,
+    aspeculate_summary,
+    asummarize_with_answers,
+    agenerate_discussion_answers,
+    agenerate_referee_answer,
+    astream_summarize_with_answers,
+    astream_referee_answer,
 )
 from prompts import (
     SYSTEM_PROMPT,
@@ -27,9 +37,12 @@ from prompts import (
     PHILOSOPHER_PROMPT,
     CREATIVE_PROMPT,
 )
-from config import HF_MODEL_ID, HF_MODEL_MAGNUM_ID, HF_MODEL_TLAMA_ID
+from config import settings
+from deadline import DeadlineExceeded, deadline_scope
 
 SYSTEM_PROMPT_KEY = "system_prompt"
+STREAM_DELTA = "delta"
+STREAM_MESSAGE = "message"
 TEMPERATURE_KEY = "temperature_by_provider"
 
 _DEFAULT_TEMPERATURES = {
@@ -93,15 +106,16 @@ def _build_payload(
     processing_time_ms: int,
     usage: dict[str, int] | None = None,
     temperature: float | None = None,
+    status: str = "success",
 ) -> dict:
     timestamp = datetime.now(timezone(timedelta(hours=3))).strftime("%H:%M:%S - %d.%m.%Y")
     model_label = provider
     if provider == "huggingface":
-        model_label = (HF_MODEL_ID or "huggingface").split("/")[-1]
+        model_label = (settings.HF_MODEL_ID or "huggingface").split("/")[-1]
     if provider == "huggingface-magnum":
-        model_label = (HF_MODEL_MAGNUM_ID or "magnum").split("/")[-1]
+        model_label = (settings.HF_MODEL_MAGNUM_ID or "magnum").split("/")[-1]
     if provider == "huggingface-tinyllama":
-        model_label = (HF_MODEL_TLAMA_ID or "tinyllama").split("/")[-1]
+        model_label = (settings.HF_MODEL_TLAMA_ID or "tinyllama").split("/")[-1]
     return {
         "id": str(uuid.uuid4()),
         "time": timestamp,
@@ -109,7 +123,7 @@ def _build_payload(
         "model": model_label,
         "language": _detect_language_code(answer),
         "processing_time_ms": processing_time_ms,
-        "status": "success",
+        "status": status,
         "usage": usage
         or {
             "prompt_tokens": 0,
@@ -127,10 +141,11 @@ def _format_payload(
     processing_time_ms: int,
     usage: dict[str, int] | None = None,
     temperature: float | None = None,
+    status: str = "success",
 ) -> str:
     if json_mode == JSON_MODE_OFF:
         return answer
-    payload = _build_payload(answer, provider, processing_time_ms, usage, temperature)
+    payload = _build_payload(answer, provider, processing_time_ms, usage, temperature, status)
     if json_mode == JSON_MODE_CLEAN:
         return json.dumps(payload, ensure_ascii=False)
     return json.dumps(payload, ensure_ascii=False, indent=2)
@@ -203,6 +218,7 @@ def _handle_command(text: str, user_data: dict, chat_data: dict) -> list[str] |
     if command == "/drop_context":
         had_context = CLARIFY_STATE_KEY in user_data
         user_data.pop(CLARIFY_STATE_KEY, None)
+        user_data.pop(RESPONSE_CHAIN_KEY, None)
         return ["Контекст уточнений сброшен." if had_context else "Контекст уточнений уже пуст."]
     if command == "/reset_chat":
         user_data.clear()
@@ -211,7 +227,157 @@ def _handle_command(text: str, user_data: dict, chat_data: dict) -> list[str] |
     return None
 
 
-def process_text(text: str, user_data: dict, chat_data: dict) -> list[str]:
+_EMPTY_SUMMARY_FALLBACK = "Не фортануло, смог сформировать ответ. Попробуй перефразировать."
+
+
+def _elapsed_ms(start_time: float) -> int:
+    return int((time.perf_counter() - start_time) * 1000)
+
+
+def _discussion_payloads(
+    answers: list[tuple[str, str, str, dict[str, int]]],
+    user_data: dict,
+    chat_data: dict,
+    json_mode: str,
+    start_time: float,
+) -> tuple[dict[str, str], list[str]]:
+    discussion_memory = {label: content for _, label, content, _ in answers}
+    chat_data[DISCUSSION_MEMORY_KEY] = discussion_memory
+    output = []
+    for answer_provider, role, content, usage in answers:
+        answer_temperature = _get_temperature(user_data, answer_provider, 0.6)
+        output.append(
+            _format_payload(
+                f"{role}:\n{(content or '...').strip()}",
+                json_mode,
+                answer_provider,
+                _elapsed_ms(start_time),
+                usage,
+                answer_temperature,
+            )
+        )
+    return discussion_memory, output
+
+
+def _referee_payload(
+    referee_text: str,
+    referee_usage: dict[str, int],
+    user_data: dict,
+    json_mode: str,
+    start_time: float,
+) -> str:
+    return _format_payload(
+        f"REFEREE:\n{(referee_text or '...').strip()}",
+        json_mode,
+        DEFAULT_PROVIDER,
+        _elapsed_ms(start_time),
+        referee_usage,
+        _get_temperature(user_data, DEFAULT_PROVIDER, 0.6),
+    )
+
+
+def _record_clarify_answer(clarify_state: dict, text: str) -> None:
+    last_question = clarify_state.get("last_question")
+    if last_question:
+        clarify_state.setdefault("qas", []).append(
+            {"question": last_question, "answer": text}
+        )
+
+
+def _accept_question(clarify_state: dict, question: str | None) -> str | None:
+    if not question:
+        return None
+    asked = clarify_state.setdefault("asked", [])
+    normalized_question = question.strip().lower()
+    if any(q.strip().lower() == normalized_question for q in asked):
+        return None
+    asked.append(question)
+    clarify_state["last_question"] = question
+    return question
+
+
+def _start_clarify_state(user_data: dict, text: str, question: str) -> None:
+    user_data[CLARIFY_STATE_KEY] = {
+        "original": text,
+        "qas": [],
+        "asked": [question],
+        "last_question": question,
+    }
+
+
+def _provider_payload(
+    answer: str,
+    user_data: dict,
+    provider: str,
+    json_mode: str,
+    start_time: float,
+    usage: dict[str, int] | None,
+) -> str:
+    return _format_payload(
+        answer,
+        json_mode,
+        provider,
+        _elapsed_ms(start_time),
+        usage,
+        _get_temperature(user_data, provider, 0.6),
+    )
+
+
+def _summary_payload(
+    summary: str,
+    user_data: dict,
+    provider: str,
+    json_mode: str,
+    start_time: float,
+    usage: dict[str, int] | None,
+) -> str:
+    return _provider_payload(
+        summary or _EMPTY_SUMMARY_FALLBACK,
+        user_data,
+        provider,
+        json_mode,
+        start_time,
+        usage,
+    )
+
+
+def _error_payload(
+    exc: Exception,
+    user_data: dict,
+    provider: str,
+    json_mode: str,
+    start_time: float,
+) -> list[str]:
+    processing_time_ms = _elapsed_ms(start_time)
+    logging.error("Ошибка в process_text (%s ms): %s", processing_time_ms, exc)
+    if isinstance(exc, DeadlineExceeded):
+        answer = f"Ошибка: превышено время ожидания ответа ({processing_time_ms} ms)."
+        status = "timeout"
+    else:
+        answer = f"Ошибка: {str(exc)[:200]}"
+        status = "error"
+    return [
+        _format_payload(
+            answer,
+            json_mode,
+            provider,
+            processing_time_ms,
+            None,
+            _get_temperature(user_data, provider, 0.6),
+            status,
+        )
+    ]
+
+
+def _session_settings(user_data: dict) -> tuple[str, str, str, dict[str, float]]:
+    provider = user_data.get(AI_PROVIDER_KEY, DEFAULT_PROVIDER)
+    json_mode = user_data.get(JSON_MODE_KEY, JSON_MODE_PRETTY)
+    system_prompt = user_data.get(SYSTEM_PROMPT_KEY, SYSTEM_PROMPT)
+    temperature_by_provider = user_data.get(TEMPERATURE_KEY, _DEFAULT_TEMPERATURES)
+    return provider, json_mode, system_prompt, temperature_by_provider
+
+
+def _process_text(text: str, user_data: dict, chat_data: dict) -> list[str]:
     if not text:
         return []
 
@@ -220,158 +386,333 @@ def process_text(text: str, user_data: dict, chat_data: dict) -> list[str]:
         return command_result
 
     start_time = time.perf_counter()
-    provider = user_data.get(AI_PROVIDER_KEY, DEFAULT_PROVIDER)
-    json_mode = user_data.get(JSON_MODE_KEY, JSON_MODE_PRETTY)
-    system_prompt = user_data.get(SYSTEM_PROMPT_KEY, SYSTEM_PROMPT)
-    temperature_by_provider = user_data.get(TEMPERATURE_KEY, _DEFAULT_TEMPERATURES)
+    provider, json_mode, system_prompt, temperature_by_provider = _session_settings(user_data)
+    temperature = _get_temperature(user_data, provider, 0.6)
 
     try:
         discussion_mode = user_data.get(DISCUSSION_MODE_KEY, False)
         if discussion_mode:
             answers = generate_discussion_answers(text, temperature_by_provider)
-            discussion_memory = {label: content for _, label, content, _ in answers}
-            chat_data[DISCUSSION_MEMORY_KEY] = discussion_memory
-            output = []
-            for answer_provider, role, content, usage in answers:
-                answer_temperature = _get_temperature(user_data, answer_provider, 0.6)
-                output.append(
-                    _format_payload(
-                        f"{role}:\n{(content or '...').strip()}",
-                        json_mode,
-                        answer_provider,
-                        int((time.perf_counter() - start_time) * 1000),
-                        usage,
-                        answer_temperature,
-                    )
-                )
+            discussion_memory, output = _discussion_payloads(
+                answers, user_data, chat_data, json_mode, start_time
+            )
             referee_text, referee_usage = generate_referee_answer(
                 discussion_memory,
                 _get_temperature(user_data, DEFAULT_PROVIDER, 0.6),
             )
             output.append(
-                _format_payload(
-                    f"REFEREE:\n{(referee_text or '...').strip()}",
-                    json_mode,
-                    DEFAULT_PROVIDER,
-                    int((time.perf_counter() - start_time) * 1000),
-                    referee_usage,
-                    _get_temperature(user_data, DEFAULT_PROVIDER, 0.6),
-                )
+                _referee_payload(referee_text, referee_usage, user_data, json_mode, start_time)
             )
             return output
 
         clarify_state = user_data.get(CLARIFY_STATE_KEY)
         if clarify_state:
-            last_question = clarify_state.get("last_question")
-            if last_question:
-                clarify_state.setdefault("qas", []).append(
-                    {"question": last_question, "answer": text}
-                )
-            question, question_usage = generate_next_question(
-                clarify_state["original"],
-                clarify_state.get("qas", []),
-                clarify_state.get("asked", []),
-                provider,
-                system_prompt,
-                _get_temperature(user_data, provider, 0.6),
-            )
-            if question:
-                asked = clarify_state.setdefault("asked", [])
-                normalized_question = question.strip().lower()
-                if any(q.strip().lower() == normalized_question for q in asked):
-                    question = None
-                else:
-                    asked.append(question)
-            if question:
-                clarify_state["last_question"] = question
-                return [
-                    _format_payload(
-                        question,
-                        json_mode,
-                        provider,
-                        int((time.perf_counter() - start_time) * 1000),
-                        question_usage,
-                        _get_temperature(user_data, provider, 0.6),
-                    )
-                ]
-
-            summary, summary_usage = summarize_with_answers(
+            _record_clarify_answer(clarify_state, text)
+            with speculate_summary(
                 clarify_state["original"],
                 [qa["answer"] for qa in clarify_state.get("qas", [])],
                 provider,
-                _get_temperature(user_data, provider, 0.6),
-            )
-            if not summary:
-                summary = "Не фортануло, смог сформировать ответ. Попробуй перефразировать."
+                temperature,
+            ) as pending_summary:
+                question, summary, question_usage = clarify_step(
+                    clarify_state["original"],
+                    clarify_state.get("qas", []),
+                    clarify_state.get("asked", []),
+                    provider,
+                    system_prompt,
+                    temperature,
+                    chain=user_data.setdefault(RESPONSE_CHAIN_KEY, {}),
+                )
+                question = _accept_question(clarify_state, question)
+                if question:
+                    return [
+                        _provider_payload(
+                            question, user_data, provider, json_mode, start_time, question_usage
+                        )
+                    ]
 
+                summary_usage = question_usage
+                if summary is None:
+                    summary, summary_usage = pending_summary.result()
             user_data.pop(CLARIFY_STATE_KEY, None)
             return [
-                _format_payload(
-                    summary,
-                    json_mode,
-                    provider,
-                    int((time.perf_counter() - start_time) * 1000),
-                    summary_usage,
-                    _get_temperature(user_data, provider, 0.6),
+                _summary_payload(
+                    summary, user_data, provider, json_mode, start_time, summary_usage
                 )
             ]
 
-        question, question_usage = generate_next_question(
+        question, summary, question_usage = clarify_step(
             text,
             [],
             [],
             provider,
             system_prompt,
-            _get_temperature(user_data, provider, 0.6),
+            temperature,
+            chain=user_data.setdefault(RESPONSE_CHAIN_KEY, {}),
         )
         if question:
-            user_data[CLARIFY_STATE_KEY] = {
-                "original": text,
-                "qas": [],
-                "asked": [question],
-                "last_question": question,
-            }
+            _start_clarify_state(user_data, text, question)
             return [
-                _format_payload(
-                    question,
-                    json_mode,
+                _provider_payload(
+                    question, user_data, provider, json_mode, start_time, question_usage
+                )
+            ]
+
+        summary_usage = question_usage
+        if summary is None:
+            summary, summary_usage = summarize_with_answers(
+                text,
+                [],
+                provider,
+                temperature,
+            )
+        return [
+            _summary_payload(summary, user_data, provider, json_mode, start_time, summary_usage)
+        ]
+
+    except Exception as exc:
+        return _error_payload(exc, user_data, provider, json_mode, start_time)
+
+
+async def _aprocess_text(text: str, user_data: dict, chat_data: dict) -> list[str]:
+    if not text:
+        return []
+
+    command_result = _handle_command(text, user_data, chat_data)
+    if command_result is not None:
+        return command_result
+
+    start_time = time.perf_counter()
+    provider, json_mode, system_prompt, temperature_by_provider = _session_settings(user_data)
+    temperature = _get_temperature(user_data, provider, 0.6)
+
+    try:
+        discussion_mode = user_data.get(DISCUSSION_MODE_KEY, False)
+        if discussion_mode:
+            answers = await agenerate_discussion_answers(text, temperature_by_provider)
+            discussion_memory, output = _discussion_payloads(
+                answers, user_data, chat_data, json_mode, start_time
+            )
+            referee_text, referee_usage = await agenerate_referee_answer(
+                discussion_memory,
+                _get_temperature(user_data, DEFAULT_PROVIDER, 0.6),
+            )
+            output.append(
+                _referee_payload(referee_text, referee_usage, user_data, json_mode, start_time)
+            )
+            return output
+
+        clarify_state = user_data.get(CLARIFY_STATE_KEY)
+        if clarify_state:
+            _record_clarify_answer(clarify_state, text)
+            async with aspeculate_summary(
+                clarify_state["original"],
+                [qa["answer"] for qa in clarify_state.get("qas", [])],
+                provider,
+                temperature,
+            ) as pending_summary:
+                question, summary, question_usage = await aclarify_step(
+                    clarify_state["original"],
+                    clarify_state.get("qas", []),
+                    clarify_state.get("asked", []),
                     provider,
-                    int((time.perf_counter() - start_time) * 1000),
-                    question_usage,
-                    _get_temperature(user_data, provider, 0.6),
+                    system_prompt,
+                    temperature,
+                    chain=user_data.setdefault(RESPONSE_CHAIN_KEY, {}),
+                )
+                question = _accept_question(clarify_state, question)
+                if question:
+                    return [
+                        _provider_payload(
+                            question, user_data, provider, json_mode, start_time, question_usage
+                        )
+                    ]
+
+                summary_usage = question_usage
+                if summary is None:
+                    summary, summary_usage = await pending_summary.result()
+            user_data.pop(CLARIFY_STATE_KEY, None)
+            return [
+                _summary_payload(
+                    summary, user_data, provider, json_mode, start_time, summary_usage
                 )
             ]
 
-        summary, summary_usage = summarize_with_answers(
+        question, summary, question_usage = await aclarify_step(
             text,
             [],
+            [],
             provider,
-            _get_temperature(user_data, provider, 0.6),
+            system_prompt,
+            temperature,
+            chain=user_data.setdefault(RESPONSE_CHAIN_KEY, {}),
         )
-        if not summary:
-            summary = "Не фортануло, смог сформировать ответ. Попробуй перефразировать."
+        if question:
+            _start_clarify_state(user_data, text, question)
+            return [
+                _provider_payload(
+                    question, user_data, provider, json_mode, start_time, question_usage
+                )
+            ]
 
-        return [
-            _format_payload(
-                summary,
-                json_mode,
+        summary_usage = question_usage
+        if summary is None:
+            summary, summary_usage = await asummarize_with_answers(
+                text,
+                [],
                 provider,
-                int((time.perf_counter() - start_time) * 1000),
-                summary_usage,
-                _get_temperature(user_data, provider, 0.6),
+                temperature,
             )
+        return [
+            _summary_payload(summary, user_data, provider, json_mode, start_time, summary_usage)
         ]
 
     except Exception as exc:
-        processing_time_ms = int((time.perf_counter() - start_time) * 1000)
-        logging.error("Ошибка в process_text (%s ms): %s", processing_time_ms, exc)
-        return [
-            _format_payload(
-                f"Ошибка: {str(exc)[:200]}",
+        return _error_payload(exc, user_data, provider, json_mode, start_time)
+
+
+async def _astream_process_text(
+    text: str,
+    user_data: dict,
+    chat_data: dict,
+) -> AsyncIterator[tuple[str, str]]:
+    if not text:
+        return
+
+    command_result = _handle_command(text, user_data, chat_data)
+    if command_result is not None:
+        for item in command_result:
+            yield STREAM_MESSAGE, item
+        return
+
+    start_time = time.perf_counter()
+    provider, json_mode, system_prompt, temperature_by_provider = _session_settings(user_data)
+    temperature = _get_temperature(user_data, provider, 0.6)
+
+    pending_summary = None
+    try:
+        discussion_mode = user_data.get(DISCUSSION_MODE_KEY, False)
+        if discussion_mode:
+            answers = await agenerate_discussion_answers(text, temperature_by_provider)
+            discussion_memory, output = _discussion_payloads(
+                answers, user_data, chat_data, json_mode, start_time
+            )
+            for item in output:
+                yield STREAM_MESSAGE, item
+            referee_parts: list[str] = []
+            referee_usage = None
+            async for delta, usage in astream_referee_answer(
+                discussion_memory,
+                _get_temperature(user_data, DEFAULT_PROVIDER, 0.6),
+            ):
+                if usage is not None:
+                    referee_usage = usage
+                if delta:
+                    referee_parts.append(delta)
+                    yield STREAM_DELTA, delta
+            yield STREAM_MESSAGE, _referee_payload(
+                "".join(referee_parts),
+                referee_usage,
+                user_data,
                 json_mode,
+                start_time,
+            )
+            return
+
+        clarify_state = user_data.get(CLARIFY_STATE_KEY)
+        if clarify_state:
+            _record_clarify_answer(clarify_state, text)
+            pending_summary = aspeculate_summary(
+                clarify_state["original"],
+                [qa["answer"] for qa in clarify_state.get("qas", [])],
                 provider,
-                int((time.perf_counter() - start_time) * 1000),
-                _get_temperature(user_data, provider, 0.6),
+                temperature,
             )
-        ]
-
+            question, summary, question_usage = await aclarify_step(
+                clarify_state["original"],
+                clarify_state.get("qas", []),
+                clarify_state.get("asked", []),
+                provider,
+                system_prompt,
+                temperature,
+                chain=user_data.setdefault(RESPONSE_CHAIN_KEY, {}),
+            )
+            question = _accept_question(clarify_state, question)
+            original = clarify_state["original"]
+            answers = [qa["answer"] for qa in clarify_state.get("qas", [])]
+        else:
+            question, summary, question_usage = await aclarify_step(
+                text,
+                [],
+                [],
+                provider,
+                system_prompt,
+                temperature,
+                chain=user_data.setdefault(RESPONSE_CHAIN_KEY, {}),
+            )
+            if question:
+                _start_clarify_state(user_data, text, question)
+            original = text
+            answers = []
+
+        if question:
+            yield STREAM_MESSAGE, _provider_payload(
+                question, user_data, provider, json_mode, start_time, question_usage
+            )
+            return
+
+        if summary is None and pending_summary is not None and pending_summary.started:
+            summary, question_usage = await pending_summary.result()
+
+        summary_parts: list[str] = []
+        summary_usage = None
+        if summary is not None:
+            summary_parts.append(summary)
+            summary_usage = question_usage
+            yield STREAM_DELTA, summary
+        else:
+            async for delta, usage in astream_summarize_with_answers(
+                original, answers, provider, temperature
+            ):
+                if usage is not None:
+                    summary_usage = usage
+                if delta:
+                    summary_parts.append(delta)
+                    yield STREAM_DELTA, delta
+        if clarify_state:
+            user_data.pop(CLARIFY_STATE_KEY, None)
+        yield STREAM_MESSAGE, _summary_payload(
+            "".join(summary_parts).strip(),
+            user_data,
+            provider,
+            json_mode,
+            start_time,
+            summary_usage,
+        )
+
+    except Exception as exc:
+        for item in _error_payload(exc, user_data, provider, json_mode, start_time):
+            yield STREAM_MESSAGE, item
+    finally:
+        if pending_summary is not None:
+            pending_summary.discard()
+
+
+def process_text(text: str, user_data: dict, chat_data: dict) -> list[str]:
+    with deadline_scope(settings.REQUEST_DEADLINE_SECONDS):
+        return _process_text(text, user_data, chat_data)
+
+
+async def aprocess_text(text: str, user_data: dict, chat_data: dict) -> list[str]:
+    with deadline_scope(settings.REQUEST_DEADLINE_SECONDS):
+        return await _aprocess_text(text, user_data, chat_data)
+
+
+async def astream_process_text(
+    text: str,
+    user_data: dict,
+    chat_data: dict,
+) -> AsyncIterator[tuple[str, str]]:
+    with deadline_scope(settings.REQUEST_DEADLINE_SECONDS):
+        async for item in _astream_process_text(text, user_data, chat_data):
+            yield item